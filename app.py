@@ -1,13 +1,17 @@
 """FastAPI server for AI Mediator with LangGraph multi-agent system."""
-import json
+import asyncio
+import bisect
+import logging
 import os
+import secrets
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
@@ -15,16 +19,90 @@ from pydantic import BaseModel
 load_dotenv()
 
 # Import new agent system
-from src.agents.graph import process_message
+from src.agents.branches import BranchTree, get_regenerate_candidates
+from src.agents.graph import process_message, warm_up
+from src.agents.checkpointed import (
+    checkpointing_enabled,
+    clear_thread,
+    close_checkpointer,
+    process_turn,
+    regenerate_turn,
+)
 from src.models.schemas import ConflictClassification
+from src.models.serialization import dumps, dumps_bytes
+from src.observability.capture import traffic_capture
+from src.observability.memory import (
+    SessionCaps,
+    approx_size,
+    archive_messages,
+    enforce_history_cap,
+    history_bytes,
+    memory_report,
+)
+from src.observability.metrics import metrics
+from src.observability.profiling import parse_profile_flag, profile_turn, request_profiling_allowed
+from src.observability.tracing import tracer
+from src.llm.http_pool import close_http_pool
+from src.llm.quotas import QuotaScope, get_spend_quotas
+from src.llm.routing import endpoints_snapshot
+from src.prompts.registry import prompt_registry
 
 BASE_DIR = Path(__file__).parent
+MAX_REMOVED_LOG = 1000
+WS_QUEUE_SIZE = 100
 STATIC_DIR = BASE_DIR / "static"
 PROMPTS_DIR = BASE_DIR / "prompts"
 
-app = FastAPI(title="AI Mediator")
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up, watch prompts/ for edits and persist spend quotas while the server runs."""
+    # Requests are accepted only after startup, so the first user does not pay for setup
+    await warm_up()
+    prompt_registry.start_watching()
+    get_spend_quotas().start_persisting()
+    yield
+    await get_spend_quotas().stop_persisting()
+    await prompt_registry.stop_watching()
+    await close_checkpointer()
+    await close_http_pool()
+    await asyncio.to_thread(tracer.flush)
+    await asyncio.to_thread(traffic_capture.flush)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by the shared serializer (orjson when installed)."""
+
+    def render(self, content) -> bytes:
+        return dumps_bytes(content)
+
+
+# Hot endpoints return FastJSONResponse directly, which also skips jsonable_encoder
+app = FastAPI(title="AI Mediator", lifespan=lifespan, default_response_class=FastJSONResponse)
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
+# Endpoints that run a mediator turn get a root span each
+TRACED_PATHS = {"/api/chat": "http.chat", "/api/regenerate": "http.regenerate"}
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    span_name = TRACED_PATHS.get(request.url.path)
+    if span_name is None:
+        return await call_next(request)
+    # Opt-in profiling of this single request: X-Profile header or ?profile= (1/cpu or sampling)
+    profile_mode = parse_profile_flag(request.headers.get("x-profile") or request.query_params.get("profile"))
+    if profile_mode and not request_profiling_allowed(request.headers.get("x-admin-token")):
+        metrics.inc("profile_requests_rejected_total")
+        profile_mode = None
+    with tracer.span(span_name, method=request.method) as span:
+        async with profile_turn(profile_mode, label=span_name, path=request.url.path):
+            response = await call_next(request)
+        span.set(status_code=response.status_code)
+        return response
+
 MODEL_OPTIONS = [
     {"id": "gpt-4.1", "name": "GPT-4.1", "supports_reasoning": False},
     {"id": "gpt-4o", "name": "GPT-4o", "supports_reasoning": False},
@@ -59,6 +137,11 @@ class RegenerateRequest(BaseModel):
     model: Optional[str] = None
 
 
+class BranchRequest(BaseModel):
+    session_id: str
+    index: int
+
+
 class ClearRequest(BaseModel):
     session_id: str
 
@@ -94,6 +177,11 @@ def create_session(session_id: str) -> Dict:
         "current_agent": "onboarding",
         "messages": [],  # Full conversation history
         "ui_messages": {"user_1": [], "user_2": []},  # UI messages per user
+        # History cursor: every UI add/remove bumps seq; epoch changes when the session is recreated
+        "history_epoch": secrets.token_hex(4),
+        "seq": 0,
+        "removed": [],  # [(event seq, removed message seq)] for incremental clients
+        "branches": BranchTree(),  # kept/prefetched alternatives of assistant turns
         "classification": None,
         "settings": get_default_settings(),
         "created_at": datetime.now().isoformat(),
@@ -101,6 +189,11 @@ def create_session(session_id: str) -> Dict:
     return session
 
 
+def web_quota_scope(session_id: str, user_role: str) -> QuotaScope:
+    """Web sessions have no accounts: a pane is the user, the session is the partnership."""
+    return QuotaScope(user=f"{session_id}:{user_role}", partnership=session_id)
+
+
 def parse_agent_response(response_data: Dict, fallback_recipient: str) -> List[Dict]:
     """Parse response from agent into UI messages."""
     responses = []
@@ -119,13 +212,102 @@ def parse_agent_response(response_data: Dict, fallback_recipient: str) -> List[D
     return responses
 
 
+class SessionHub:
+    """
+    WebSocket subscribers per (session, role).
+
+    `publish` is synchronous and never blocks a turn: events go to a bounded
+    queue per connection, drained by that connection's sender task. A client
+    that falls behind gets a single "resync" event instead and refetches
+    /api/history.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Dict[str, List[asyncio.Queue]]] = {}
+
+    def subscribe(self, session_id: str, role: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+        self._subscribers.setdefault(session_id, {}).setdefault(role, []).append(queue)
+        return queue
+
+    def unsubscribe(self, session_id: str, role: str, queue: asyncio.Queue):
+        roles = self._subscribers.get(session_id, {})
+        if queue in roles.get(role, []):
+            roles[role].remove(queue)
+        if not any(roles.values()):
+            self._subscribers.pop(session_id, None)
+
+    def publish(self, session_id: str, role: str, event: Dict):
+        for queue in self._subscribers.get(session_id, {}).get(role, []):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+                metrics.inc("ws_resyncs_total")
+
+    def connections(self) -> int:
+        return sum(len(queues) for roles in self._subscribers.values() for queues in roles.values())
+
+
+session_hub = SessionHub()
+
+
+def add_ui_message(session: Dict, recipient: str, entry: Dict) -> int:
+    """Append a UI message with the next sequence number and push it; returns the seq."""
+    session["seq"] += 1
+    message = {**entry, "seq": session["seq"]}
+    session["ui_messages"][recipient].append(message)
+    session_hub.publish(session["session_id"], recipient, {
+        "type": "message", "recipient": recipient, "message": message, "cursor": history_cursor(session),
+    })
+    return session["seq"]
+
+
+def find_ui_message(session: Dict, seq: int) -> Optional[tuple]:
+    """(recipient, index) of the UI message with this seq, or None."""
+    for recipient, msgs in session["ui_messages"].items():
+        for idx in range(len(msgs) - 1, -1, -1):
+            if msgs[idx]["seq"] == seq:
+                return recipient, idx
+    return None
+
+
+def remove_ui_message(session: Dict, recipient: str, idx: int) -> int:
+    """Remove a UI message and log it so incremental clients drop it too."""
+    removed = session["ui_messages"][recipient].pop(idx)
+    session["seq"] += 1
+    session["removed"].append((session["seq"], removed["seq"]))
+    del session["removed"][:-MAX_REMOVED_LOG]
+    session_hub.publish(session["session_id"], recipient, {
+        "type": "removed", "recipient": recipient, "seq": removed["seq"], "cursor": history_cursor(session),
+    })
+    return removed["seq"]
+
+
+def trim_ui_messages(session: Dict, recipient: str, keep: int) -> List[Dict]:
+    """Drop all but the last `keep` UI messages of a pane, logged like removals; returns the dropped ones."""
+    msgs = session["ui_messages"][recipient]
+    trimmed = msgs[:max(0, len(msgs) - keep)]
+    if not trimmed:
+        return []
+    session["ui_messages"][recipient] = msgs[len(trimmed):]
+    session["seq"] += 1
+    session["removed"].extend((session["seq"], m["seq"]) for m in trimmed)
+    del session["removed"][:-MAX_REMOVED_LOG]
+    # One event instead of one per message: the client refetches and gets the removals
+    session_hub.publish(session["session_id"], recipient, {"type": "resync"})
+    return trimmed
+
+
 def append_ui_messages(session: Dict, responses: List[Dict]):
-    """Append agent responses to UI messages."""
+    """Append agent responses to UI messages (sets "seq" on each response)."""
     timestamp = datetime.now().isoformat()
     for resp in responses:
         recipient = resp.get("recipient", "user_1")
         if recipient in session["ui_messages"]:
-            session["ui_messages"][recipient].append({
+            resp["seq"] = add_ui_message(session, recipient, {
                 "role": "assistant",
                 "content": resp.get("text", ""),
                 "type": resp.get("type", "other"),
@@ -133,6 +315,36 @@ def append_ui_messages(session: Dict, responses: List[Dict]):
             })
 
 
+def enforce_session_cap(session: Dict):
+    """Compact/archive a web session that grew over SESSION_MAX_BYTES."""
+    caps = SessionCaps.from_env()
+    ui_bytes = sum(history_bytes(msgs) for msgs in session["ui_messages"].values())
+    archived = enforce_history_cap(session["session_id"], session["messages"], extra_bytes=ui_bytes, caps=caps)
+    if archived or history_bytes(session["messages"]) + ui_bytes > caps.max_bytes > 0:
+        # UI copies duplicate the dialogue: keep the same tail per pane
+        for role, msgs in session["ui_messages"].items():
+            if len(msgs) > caps.keep_messages:
+                try:
+                    archive_messages(session["session_id"], msgs[:-caps.keep_messages], caps.archive_dir, kind=f"ui_{role}")
+                except OSError as e:
+                    metrics.inc("session_archive_failures_total")
+                    logger.warning("Could not archive UI messages of %s, keeping them: %s", session["session_id"], e)
+                    continue
+                trim_ui_messages(session, role, caps.keep_messages)
+
+
+def session_memory_usage() -> Dict[str, Dict[str, int]]:
+    """Approximate bytes per web session."""
+    return {
+        session_id: {
+            "bytes": approx_size(session),
+            "messages": len(session["messages"]),
+            "ui_messages": sum(len(msgs) for msgs in session["ui_messages"].values()),
+        }
+        for session_id, session in list(sessions.items())
+    }
+
+
 @app.get("/")
 async def index():
     """Serve main UI."""
@@ -166,24 +378,26 @@ async def list_prompts():
 async def get_prompt(prompt_path: str):
     """Get prompt content."""
     path = resolve_prompt_path(prompt_path)
-    with open(path, "r", encoding="utf-8") as f:
-        content = f.read()
-    return {"content": content, "path": prompt_path}
+    prompt = await prompt_registry.reload(str(path.relative_to(PROMPTS_DIR.resolve())))
+    return {"content": prompt.content, "path": prompt_path, "version": prompt.version}
 
 
 @app.post("/api/prompts/{prompt_path:path}")
 async def update_prompt(prompt_path: str, request: PromptUpdateRequest):
     """Update prompt content."""
     path = resolve_prompt_path(prompt_path)
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(request.content)
-    return {"status": "updated", "path": prompt_path}
+    prompt = await prompt_registry.write(str(path.relative_to(PROMPTS_DIR.resolve())), request.content)
+    return {"status": "updated", "path": prompt_path, "version": prompt.version}
 
 
 @app.post("/api/chat")
 async def chat(request: ChatRequest):
     """Process chat message through multi-agent system."""
     session_id = request.session_id or f"session_{datetime.now().timestamp()}"
+    span = tracer.current_span()
+    if span is not None:
+        span.set(session_id=session_id, user_role=request.user_role)
+    traffic_capture.record("web", session_id, request.user_role, request.message)
     
     # Get or create session
     if session_id not in sessions:
@@ -197,12 +411,19 @@ async def chat(request: ChatRequest):
     if request.model is not None:
         session["settings"]["model"] = request.model
     
-    # Add user message to history
+    # Add user message to history (in checkpointed mode the graph keeps it)
     user_message = f"[{request.user_role}]: {request.message}"
-    session["messages"].append({"role": "user", "content": user_message})
+    checkpointed = checkpointing_enabled()
+    tree = session["branches"]
+    tree.close()
+    before = {"current_agent": session["current_agent"], "classification": session["classification"]}
+    candidates = get_regenerate_candidates()
+    quota_scope = web_quota_scope(session_id, request.user_role)
+    if not checkpointed:
+        session["messages"].append({"role": "user", "content": user_message})
     
     # Add to UI messages
-    session["ui_messages"][request.user_role].append({
+    user_seq = add_ui_message(session, request.user_role, {
         "role": "user",
         "content": request.message,
         "timestamp": datetime.now().isoformat(),
@@ -210,12 +431,20 @@ async def chat(request: ChatRequest):
     
     try:
         # Process through LangGraph
-        result = await process_message(
-            session_id=session_id,
-            messages=session["messages"],
-            current_agent=session["current_agent"],
-            classification=session["classification"],
-        )
+        if checkpointed:
+            # Graph owns the history: send only the new message
+            result = await process_turn(
+                session_id, {"role": "user", "content": user_message}, candidates=candidates, quota_scope=quota_scope,
+            )
+        else:
+            result = await process_message(
+                session_id=session_id,
+                messages=session["messages"],
+                current_agent=session["current_agent"],
+                classification=session["classification"],
+                candidates=candidates,
+                quota_scope=quota_scope,
+            )
         
         response_data = result.get("response")
         
@@ -235,19 +464,26 @@ async def chat(request: ChatRequest):
         responses = parse_agent_response(response_data, request.user_role)
         
         # Debug: log if no responses were parsed
-        if not responses:
+        if not responses and not result.get("deferred"):
             print(f"WARNING: No responses parsed from response_data: {response_data}")
         
-        # Add assistant message to history
-        if response_data:
+        # Serialized once: history, raw_response and the turn's branch share the string
+        response_json = result.get("response_json") or dumps(response_data)
+        
+        # Add assistant message to history (deadline fallbacks are not part of the dialogue)
+        if response_data and not result.get("fallback") and not checkpointed:
             # Store raw JSON response
             session["messages"].append({
                 "role": "assistant",
-                "content": json.dumps(response_data, ensure_ascii=False)
+                "content": response_json
             })
         
         # Add to UI messages
         append_ui_messages(session, responses)
+        enforce_session_cap(session)
+        if response_data and not result.get("fallback"):
+            turn = tree.new_turn(before, BranchTree.branches_from_result({**result, "response_json": response_json}))
+            turn.current.ui_seqs = [r["seq"] for r in responses if "seq" in r]
         
         # Calculate usage (mock for now)
         usage = {
@@ -256,14 +492,19 @@ async def chat(request: ChatRequest):
             "total_tokens": 0,
         }
         
-        return {
+        return FastJSONResponse({
             "session_id": session_id,
             "responses": responses,
-            "raw_response": json.dumps(response_data, ensure_ascii=False),
+            "raw_response": response_json,
             "usage": usage,
             "agent_status": session["current_agent"],
+            "deferred": bool(result.get("deferred")),  # waiting for the partner, nothing to show
             "conflict_type": session["classification"]["domain"] if session.get("classification") else None,
-        }
+            "prompt_versions": result.get("prompt_versions", {}),
+            "user_seq": user_seq,
+            "cursor": history_cursor(session),
+            "branch": tree.open.snapshot() if tree.open else None,
+        })
         
     except Exception as exc:
         import traceback
@@ -279,54 +520,149 @@ async def chat(request: ChatRequest):
         }
 
 
+def show_branch(session: Dict, branch, fallback_recipient: str = "user_1") -> List[Dict]:
+    """Make `branch` the session's current reply: agent state and UI messages."""
+    session["current_agent"] = branch.current_agent
+    session["classification"] = branch.classification
+    responses = parse_agent_response(branch.response, fallback_recipient)
+    append_ui_messages(session, responses)
+    branch.ui_seqs = [r["seq"] for r in responses if "seq" in r]
+    return responses
+
+
+def hide_branch(session: Dict, branch) -> List[int]:
+    """Remove the UI messages of a branch that is being replaced; returns their seqs."""
+    removed = []
+    for seq in branch.ui_seqs:
+        found = find_ui_message(session, seq)
+        if found is not None:
+            removed.append(remove_ui_message(session, *found))
+    return removed
+
+
+async def store_branch(session: Dict, branch):
+    """Replace the last assistant reply in the stored history with `branch`."""
+    if checkpointing_enabled():
+        await regenerate_turn(session["session_id"], replacement=branch.as_result())
+        return
+    for idx in range(len(session["messages"]) - 1, -1, -1):
+        if session["messages"][idx]["role"] == "assistant":
+            session["messages"].pop(idx)
+            break
+    session["messages"].append({"role": "assistant", "content": branch.encoded()})
+
+
 @app.post("/api/regenerate")
 async def regenerate(request: RegenerateRequest):
-    """Regenerate last response."""
+    """
+    Regenerate last response.
+
+    The replaced reply stays as a branch of the turn (see /api/branch). A
+    candidate prefetched with REGENERATE_CANDIDATES > 1 is served without an
+    LLM call.
+    """
     if request.session_id not in sessions:
         raise HTTPException(status_code=404, detail="Session not found")
     
     session = sessions[request.session_id]
+    checkpointed = checkpointing_enabled()
+    turn = session["branches"].open
+
+    # Remove the shown reply from UI messages (both users)
+    removed_seqs = []
+    if turn is not None:
+        removed_seqs = hide_branch(session, turn.current)
+    else:
+        for user_key in ["user_1", "user_2"]:
+            if session["ui_messages"][user_key]:
+                for idx in range(len(session["ui_messages"][user_key]) - 1, -1, -1):
+                    if session["ui_messages"][user_key][idx]["role"] == "assistant":
+                        removed_seqs.append(remove_ui_message(session, user_key, idx))
+                        break
+
+    cached = turn.take_cached() if turn is not None else None
+    if cached is not None:
+        metrics.inc("regenerate_cache_hits_total")
+        await store_branch(session, cached)
+        responses = show_branch(session, cached, request.user_role)
+        enforce_session_cap(session)
+        return FastJSONResponse({
+            "session_id": request.session_id,
+            "responses": responses,
+            "raw_response": cached.encoded(),
+            "prompt_versions": {},
+            "removed_seqs": removed_seqs,
+            "cursor": history_cursor(session),
+            "branch": turn.snapshot(),
+            "cached": True,
+        })
+    metrics.inc("regenerate_llm_calls_total")
+
+    # Rerun the turn from the state it started in
+    before = turn.before if turn is not None else {
+        "current_agent": session["current_agent"],
+        "classification": session["classification"],
+    }
+    candidates = get_regenerate_candidates()
+    quota_scope = web_quota_scope(request.session_id, request.user_role)
     
-    # Remove last assistant message
-    for idx in range(len(session["messages"]) - 1, -1, -1):
-        if session["messages"][idx]["role"] == "assistant":
-            session["messages"].pop(idx)
-            break
-    
-    # Remove from UI messages (both users)
-    for user_key in ["user_1", "user_2"]:
-        if session["ui_messages"][user_key]:
-            for idx in range(len(session["ui_messages"][user_key]) - 1, -1, -1):
-                if session["ui_messages"][user_key][idx]["role"] == "assistant":
-                    session["ui_messages"][user_key].pop(idx)
-                    break
+    # Remove last assistant message (in checkpointed mode regenerate_turn does it)
+    if not checkpointed:
+        for idx in range(len(session["messages"]) - 1, -1, -1):
+            if session["messages"][idx]["role"] == "assistant":
+                session["messages"].pop(idx)
+                break
     
     try:
         # Process through LangGraph
-        result = await process_message(
-            session_id=request.session_id,
-            messages=session["messages"],
-            current_agent=session["current_agent"],
-            classification=session["classification"],
-        )
+        if checkpointed:
+            result = await regenerate_turn(
+                request.session_id, candidates=candidates, restore=before if turn is not None else None,
+                quota_scope=quota_scope,
+            )
+        else:
+            result = await process_message(
+                session_id=request.session_id,
+                messages=session["messages"],
+                current_agent=before["current_agent"],
+                classification=before["classification"],
+                candidates=candidates,
+                quota_scope=quota_scope,
+            )
         
         response_data = result.get("response")
-        responses = parse_agent_response(response_data, request.user_role)
+        response_json = result.get("response_json") or dumps(response_data)
         
-        # Add new messages
-        if response_data:
-            session["messages"].append({
-                "role": "assistant",
-                "content": json.dumps(response_data, ensure_ascii=False)
-            })
-        
-        append_ui_messages(session, responses)
+        if not response_data or result.get("fallback"):
+            # Nothing was stored for the turn: show the placeholder, keep no branch
+            session["branches"].close()
+            responses = parse_agent_response(response_data, request.user_role)
+            append_ui_messages(session, responses)
+        else:
+            if not checkpointed:
+                session["messages"].append({
+                    "role": "assistant",
+                    "content": response_json
+                })
+            branches = BranchTree.branches_from_result({**result, "response_json": response_json})
+            if turn is not None:
+                turn.add(branches[0])
+                turn.cached = branches[1:]
+            else:
+                turn = session["branches"].new_turn(before, branches)
+            responses = show_branch(session, turn.current, request.user_role)
+        enforce_session_cap(session)
         
-        return {
+        return FastJSONResponse({
             "session_id": request.session_id,
             "responses": responses,
-            "raw_response": json.dumps(response_data, ensure_ascii=False),
-        }
+            "raw_response": response_json,
+            "prompt_versions": result.get("prompt_versions", {}),
+            "removed_seqs": removed_seqs,
+            "cursor": history_cursor(session),
+            "branch": session["branches"].open.snapshot() if session["branches"].open else None,
+            "cached": False,
+        })
         
     except Exception as exc:
         return {
@@ -340,20 +676,161 @@ async def regenerate(request: RegenerateRequest):
         }
 
 
+@app.post("/api/branch")
+async def switch_branch(request: BranchRequest):
+    """Show another already generated reply of the latest turn (no LLM call)."""
+    if request.session_id not in sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+    session = sessions[request.session_id]
+    turn = session["branches"].open
+    if turn is None or not 0 <= request.index < len(turn.branches):
+        raise HTTPException(status_code=404, detail="Branch not found")
+
+    removed_seqs, responses = [], []
+    if request.index != turn.active:
+        removed_seqs = hide_branch(session, turn.current)
+        branch = turn.select(request.index)
+        await store_branch(session, branch)
+        responses = show_branch(session, branch)
+        metrics.inc("branch_switches_total")
+    return FastJSONResponse({
+        "session_id": request.session_id,
+        "responses": responses,
+        "removed_seqs": removed_seqs,
+        "cursor": history_cursor(session),
+        "branch": turn.snapshot(),
+    })
+
+
 @app.post("/api/clear")
 async def clear_history(request: ClearRequest):
     """Clear session history."""
     if request.session_id in sessions:
         del sessions[request.session_id]
+    for role in ("user_1", "user_2"):
+        session_hub.publish(request.session_id, role, {"type": "cleared"})
+    if checkpointing_enabled():
+        await clear_thread(request.session_id)
     return {"status": "cleared", "session_id": request.session_id}
 
 
+def history_cursor(session: Dict) -> str:
+    return f"{session['history_epoch']}.{session['seq']}"
+
+
+def parse_history_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    """"<epoch>.<seq>" -> (epoch, seq); None if absent or malformed."""
+    if not cursor:
+        return None
+    epoch, _, seq = cursor.partition(".")
+    return (epoch, int(seq)) if seq.isdigit() else None
+
+
 @app.get("/api/history/{session_id}")
-async def get_history(session_id: str):
-    """Get session history."""
+async def get_history(session_id: str, request: Request, since: Optional[str] = None):
+    """
+    Get session history, optionally only what changed after cursor `since`.
+
+    Each UI message carries a session-wide "seq". With `since`, only messages
+    with a larger seq are returned plus "removed" (seqs deleted by regenerate);
+    "reset": true means the cursor is unusable and the client should replace
+    its history. The ETag is the cursor plus the delta's starting point, so
+    If-None-Match answers 304 while nothing changed for the same request.
+    """
     if session_id not in sessions:
-        return {"messages": {"user_1": [], "user_2": []}}
-    return {"messages": sessions[session_id]["ui_messages"]}
+        return {"messages": {"user_1": [], "user_2": []}, "cursor": None, "exists": False}
+    session = sessions[session_id]
+    cursor = history_cursor(session)
+
+    parsed = parse_history_cursor(since)
+    oldest_removal = session["removed"][0][0] if session["removed"] else 0
+    reset = (
+        parsed is None
+        or parsed[0] != session["history_epoch"]
+        or parsed[1] > session["seq"]
+        # removals older than the retained log can't be replayed
+        or (len(session["removed"]) >= MAX_REMOVED_LOG and parsed[1] < oldest_removal)
+    )
+    after = 0 if reset else parsed[1]
+    etag = f'W/"{cursor}-{"full" if reset else after}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    body = {
+        "messages": {
+            role: msgs[bisect.bisect_right(msgs, after, key=lambda m: m["seq"]):]
+            for role, msgs in session["ui_messages"].items()
+        },
+        "removed": [] if reset else [seq for event, seq in session["removed"] if event > after],
+        "cursor": cursor,
+        "reset": reset,
+        "exists": True,
+    }
+    return FastJSONResponse(body, headers={"ETag": etag})
+
+
+@app.websocket("/ws/{session_id}/{role}")
+async def session_updates(websocket: WebSocket, session_id: str, role: str):
+    """
+    Live updates for one pane: messages addressed to `role` as soon as they
+    are added, removals by regenerate and session clears. An agent produces
+    all messages of a reply in one completion, so they are pushed together
+    when the turn's reply is stored, not one by one.
+
+    Events: {"type": "message", "recipient", "message", "cursor"},
+    {"type": "removed", "recipient", "seq", "cursor"}, {"type": "cleared"},
+    {"type": "resync"} (client fell behind - refetch /api/history).
+    """
+    if role not in ("user_1", "user_2"):
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    queue = session_hub.subscribe(session_id, role)
+
+    async def send_events():
+        try:
+            while True:
+                await websocket.send_text(dumps(await queue.get()))
+        except Exception:
+            pass  # connection gone; the receive loop notices and cleans up
+
+    sender = asyncio.create_task(send_events())
+    try:
+        # Client messages are only keep-alives
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        session_hub.unsubscribe(session_id, role, queue)
+        sender.cancel()
+
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Get in-process metrics (LLM hedges, timeouts, fallbacks) and LLM endpoint health."""
+    return {
+        **metrics.snapshot(),
+        "llm_endpoints": endpoints_snapshot(),
+        "ws_connections": session_hub.connections(),
+        "quotas": get_spend_quotas().stats(),
+    }
+
+
+@app.get("/api/admin/memory")
+async def memory_usage(top: int = 10, x_admin_token: Optional[str] = Header(default=None)):
+    """Approximate memory per session, heaviest sessions and process totals."""
+    # Session ids in the report are credentials for their sessions: never serve it without a token
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token or not x_admin_token or not secrets.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+    return memory_report(session_memory_usage(), top_n=top)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Metrics in Prometheus text format (stage latency histograms, counters)."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/api/settings/{session_id}")
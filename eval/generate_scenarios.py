@@ -0,0 +1,259 @@
+"""Synthetic long-session scenarios for scaling tests.
+
+Generates scenarios in the `eval/scenarios.json` format (usable with
+`run_eval.py --scenarios`) with a chosen number of turns, role interleaving
+and message-size distribution:
+
+    python eval/generate_scenarios.py --turns 200 500 2000 --interleave bursty
+
+With --run every generated scenario is also driven through
+`run_scenario_once` against the local stub LLM (started on --stub-port),
+recording per turn: latency, process RSS, history size and the prompt tokens
+the agent sent. Results go to eval/out/scaling_<ts>.{json,csv}, plus a PNG
+with one chart per measure when matplotlib is installed.
+"""
+import argparse
+import asyncio
+import csv
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Ensure project root is on sys.path so `import src...` works when running as a script.
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from replay_traffic import synth_text  # noqa: E402
+
+from src.models.serialization import dumps  # noqa: E402
+
+INTERLEAVINGS = ("alternate", "bursty", "random", "dominant")
+
+
+def next_role(prev: str, interleave: str, rng: random.Random, burst: float) -> str:
+    """Role of the next turn given the previous one."""
+    other = "user_2" if prev == "user_1" else "user_1"
+    if interleave == "alternate":
+        return other
+    if interleave == "bursty":
+        # Runs of one partner with geometric length, mean `burst` messages
+        return prev if rng.random() < 1.0 - 1.0 / burst else other
+    if interleave == "dominant":
+        return "user_1" if rng.random() < 0.8 else "user_2"
+    return rng.choice(("user_1", "user_2"))
+
+
+def message_chars(rng: random.Random, median: float, sigma: float, max_chars: int) -> int:
+    """Log-normal message length: most messages short, a long tail of paragraphs."""
+    return max(2, min(max_chars, int(rng.lognormvariate(math.log(median), sigma))))
+
+
+def generate_scenario(
+    turns: int,
+    interleave: str = "alternate",
+    median_chars: float = 60,
+    size_sigma: float = 0.8,
+    max_chars: int = 2000,
+    burst: float = 3.0,
+    question_rate: float = 0.2,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    role = "user_2"
+    scenario_turns = []
+    for _ in range(turns):
+        role = next_role(role, interleave, rng, burst)
+        chars = message_chars(rng, median_chars, size_sigma, max_chars)
+        shape = {"c": chars, "w": max(1, chars // 7), "l": 1 + chars // 400, "q": int(rng.random() < question_rate)}
+        scenario_turns.append({"user_role": role, "text": synth_text(shape, rng)})
+    return {
+        "id": f"long_{interleave}_{turns}_s{seed}",
+        "description": (
+            f"Синтетическая длинная сессия: {turns} ходов, чередование {interleave}, "
+            f"медиана {median_chars:g} символов (sigma {size_sigma:g})"
+        ),
+        "turns": scenario_turns,
+    }
+
+
+class TurnProbe:
+    """Wraps process_message: per-turn latency, memory, history and prompt size."""
+
+    def __init__(self, process_message):
+        from src.observability.tracing import tracer
+
+        self.process_message = process_message
+        self.tracer = tracer
+        self.rows: List[Dict[str, Any]] = []
+        self._prompt_tokens = 0
+
+    def _on_span(self, span):
+        if span.name == "prompt.build":
+            self._prompt_tokens = max(self._prompt_tokens, span.attributes.get("prompt_tokens", 0))
+
+    async def __call__(self, **kwargs):
+        from src.observability.memory import history_bytes, process_memory
+
+        self._prompt_tokens = 0
+        self.tracer.add_listener(self._on_span)
+        t0 = time.perf_counter()
+        try:
+            return await self.process_message(**kwargs)
+        finally:
+            latency = time.perf_counter() - t0
+            self.tracer.remove_listener(self._on_span)
+            messages = kwargs.get("messages") or []
+            self.rows.append({
+                "turn": len(self.rows) + 1,
+                "latency_ms": round(latency * 1000, 2),
+                "rss_mb": round(process_memory().get("rss_bytes", 0) / 2**20, 2),
+                "history_messages": len(messages),
+                "history_kb": round(history_bytes(messages) / 1024, 2),
+                "prompt_tokens": self._prompt_tokens,
+            })
+
+
+def start_stub(port: int, latency: float) -> subprocess.Popen:
+    """Run eval/stub_llm_server.py and point the LLM router at it."""
+    proc = subprocess.Popen(
+        [sys.executable, str(PROJECT_ROOT / "eval" / "stub_llm_server.py"), "--port", str(port), "--latency", str(latency)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    os.environ["LLM_ENDPOINTS"] = dumps([{"name": "stub", "base_url": f"http://127.0.0.1:{port}/v1", "api_key_env": "STUB_KEY"}])
+    os.environ.setdefault("STUB_KEY", "stub")
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ.setdefault("LLM_HEDGE_ENABLED", "0")
+
+    import httpx
+
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs", timeout=0.5)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise SystemExit(f"Stub LLM server did not start on port {port}")
+
+
+def plot(rows_by_scenario: Dict[str, List[Dict[str, Any]]], path: Path) -> Optional[Path]:
+    try:
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("Warning: matplotlib not installed, skipping the plot (CSV/JSON still written)", file=sys.stderr)
+        return None
+    measures = [("latency_ms", "latency, ms"), ("rss_mb", "process RSS, MB"), ("prompt_tokens", "prompt tokens")]
+    fig, axes = plt.subplots(len(measures), 1, figsize=(10, 3.2 * len(measures)), sharex=True)
+    for ax, (key, label) in zip(axes, measures):
+        for scenario_id, rows in rows_by_scenario.items():
+            ax.plot([r["turn"] for r in rows], [r[key] for r in rows], label=scenario_id, linewidth=0.8)
+        ax.set_ylabel(label)
+        ax.grid(alpha=0.3)
+    axes[0].legend(fontsize="small")
+    axes[-1].set_xlabel("turn")
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    return path
+
+
+def summarize(rows: List[Dict[str, Any]]) -> str:
+    """Latency/prompt size at a few points along the session."""
+    points = sorted({1, *(max(1, len(rows) * k // 4) for k in range(1, 5))})
+    return "  ".join(
+        f"t{p}: {rows[p - 1]['latency_ms']:.0f}ms/{rows[p - 1]['prompt_tokens']}tok/{rows[p - 1]['rss_mb']:.0f}MB"
+        for p in points
+    )
+
+
+async def run_scaling(scenarios: List[Dict[str, Any]], out_dir: Path, executor: Optional[str]) -> int:
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path=PROJECT_ROOT / ".env")
+    if executor:
+        os.environ["MEDIATOR_EXECUTOR"] = executor
+
+    from run_eval import run_scenario_once
+    from src.agents.graph import process_message
+    from src.models.schemas import AgentResponse
+
+    rows_by_scenario: Dict[str, List[Dict[str, Any]]] = {}
+    for scenario in scenarios:
+        probe = TurnProbe(process_message)
+        metrics, _ = await run_scenario_once(scenario, "1", probe, AgentResponse)
+        rows_by_scenario[scenario["id"]] = probe.rows
+        print(f"{scenario['id']}: p50 {metrics.latency_ms_p50:.0f}ms p95 {metrics.latency_ms_p95:.0f}ms")
+        print(f"  {summarize(probe.rows)}")
+
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    json_path = out_dir / f"scaling_{ts}.json"
+    json_path.write_text(dumps(rows_by_scenario, indent=True), encoding="utf-8")
+    csv_path = out_dir / f"scaling_{ts}.csv"
+    with csv_path.open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["scenario_id", "turn", "latency_ms", "rss_mb", "history_messages", "history_kb", "prompt_tokens"])
+        for scenario_id, rows in rows_by_scenario.items():
+            for r in rows:
+                writer.writerow([scenario_id, r["turn"], r["latency_ms"], r["rss_mb"], r["history_messages"], r["history_kb"], r["prompt_tokens"]])
+    print(f"Wrote {json_path}\nWrote {csv_path}")
+    png = plot(rows_by_scenario, out_dir / f"scaling_{ts}.png")
+    if png:
+        print(f"Wrote {png}")
+    return 0
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Generate long synthetic sessions; optionally run them against the stub LLM.")
+    p.add_argument("--turns", type=int, nargs="+", default=[200, 500, 2000], help="Session lengths (one scenario each)")
+    p.add_argument("--interleave", choices=INTERLEAVINGS, nargs="+", default=["alternate"])
+    p.add_argument("--median-chars", type=float, default=60, help="Median message length")
+    p.add_argument("--size-sigma", type=float, default=0.8, help="Log-normal sigma of message length")
+    p.add_argument("--max-chars", type=int, default=2000)
+    p.add_argument("--burst", type=float, default=3.0, help="Mean run length for --interleave bursty")
+    p.add_argument("--question-rate", type=float, default=0.2)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default=str(PROJECT_ROOT / "eval" / "out" / "long_scenarios.json"))
+    p.add_argument("--run", action="store_true", help="Run the scenarios and record per-turn measures")
+    p.add_argument("--stub-port", type=int, default=9401, help="Port for the stub LLM (--run); 0 = use configured LLM")
+    p.add_argument("--stub-latency", type=float, default=0.05)
+    p.add_argument("--executor", choices=["langgraph", "direct"], default=None)
+    p.add_argument("--out-dir", default=str(PROJECT_ROOT / "eval" / "out"))
+    args = p.parse_args()
+
+    scenarios = [
+        generate_scenario(
+            turns, interleave, args.median_chars, args.size_sigma, args.max_chars,
+            args.burst, args.question_rate, seed=args.seed + i,
+        )
+        for i, (interleave, turns) in enumerate((il, t) for il in args.interleave for t in args.turns)
+    ]
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(dumps({"scenarios": scenarios}, indent=True), encoding="utf-8")
+    print(f"Wrote {len(scenarios)} scenarios to {out}")
+    if not args.run:
+        return 0
+
+    stub = start_stub(args.stub_port, args.stub_latency) if args.stub_port else None
+    try:
+        return asyncio.run(run_scaling(scenarios, Path(args.out_dir), args.executor))
+    finally:
+        if stub is not None:
+            stub.terminate()
+            stub.wait()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
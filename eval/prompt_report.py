@@ -0,0 +1,156 @@
+import argparse
+import fnmatch
+import itertools
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+# Ensure project root is on sys.path so `import src...` works when running as a script.
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# Whole playbooks: the report covers the worst case, not what retrieval picks for a dialogue
+os.environ["PLAYBOOK_RETRIEVAL"] = "0"
+
+from src.llm.tokens import estimate_tokens  # noqa: E402
+from src.models.schemas import (  # noqa: E402
+    ConflictClassification,
+    Domain,
+    Form,
+    Nature,
+    Resolvability,
+    ThreatLevel,
+)
+from src.playbooks.loader import select_playbooks  # noqa: E402
+from src.prompts.compiler import compile_prompt, minify_enabled  # noqa: E402
+from src.prompts.registry import PROMPTS_DIR  # noqa: E402
+
+DEFAULT_BUDGETS = PROJECT_ROOT / "eval" / "prompt_budgets.json"
+
+
+def get_tokenizer(encoding: str) -> Tuple[str, Callable[[str], int]]:
+    """Local tiktoken encoding if it can be loaded, otherwise the runtime estimate."""
+    try:
+        import tiktoken
+
+        enc = tiktoken.get_encoding(encoding)
+        return f"tiktoken/{encoding}", lambda text: len(enc.encode(text))
+    except Exception as e:  # not installed, or the encoding file is not cached and there is no network
+        print(f"Warning: tiktoken unavailable ({type(e).__name__}), using estimate_tokens", file=sys.stderr)
+        return "estimate", estimate_tokens
+
+
+def file_report(count: Callable[[str], int]) -> Dict[str, Dict[str, int]]:
+    """Tokens per prompt file: as written, as compiled and as sent (PROMPT_MINIFY)."""
+    report = {}
+    for path in sorted(PROMPTS_DIR.rglob("*.md")):
+        name = str(path.relative_to(PROMPTS_DIR))
+        raw = path.read_text(encoding="utf-8")
+        raw_tokens, compiled_tokens = count(raw), count(compile_prompt(raw))
+        report[name] = {
+            "raw_tokens": raw_tokens,
+            "compiled_tokens": compiled_tokens,
+            "saved_tokens": raw_tokens - compiled_tokens,
+            "sent_tokens": compiled_tokens if minify_enabled() else raw_tokens,
+        }
+    return report
+
+
+def all_classifications() -> List[ConflictClassification]:
+    return [
+        ConflictClassification(
+            resolvability=r, domain=d, nature=n, form=f, threat_level=t, confidence=1.0,
+        )
+        for r, d, n, f, t in itertools.product(Resolvability, Domain, Nature, Form, ThreatLevel)
+    ]
+
+
+def classification_report(count: Callable[[str], int]) -> List[Dict]:
+    """Therapy system prompt tokens for every classification (whole playbooks)."""
+    from src.agents.therapy import TherapyAgent
+
+    agent = TherapyAgent()
+    rows = []
+    for c in all_classifications():
+        rows.append({
+            "classification": {axis: getattr(c, axis).value for axis in (
+                "resolvability", "domain", "nature", "form", "threat_level",
+            )},
+            "playbooks": select_playbooks(c),
+            "tokens": count(agent._build_system_prompt(c)),
+        })
+    return rows
+
+
+def check_budgets(files: Dict[str, Dict[str, int]], rows: List[Dict], budgets: Dict) -> List[str]:
+    """Human-readable budget violations (empty = all within budget)."""
+    violations = []
+    for name, stats in files.items():
+        for pattern, budget in budgets.get("files", {}).items():
+            if fnmatch.fnmatch(name, pattern) and stats["sent_tokens"] > budget:
+                violations.append(f"{name}: {stats['sent_tokens']} tokens > budget {budget} ({pattern})")
+                break
+    therapy_budget = budgets.get("therapy_system_prompt")
+    if therapy_budget:
+        worst = max(rows, key=lambda r: r["tokens"])
+        if worst["tokens"] > therapy_budget:
+            violations.append(
+                f"therapy system prompt: {worst['tokens']} tokens > budget {therapy_budget} "
+                f"(playbooks {', '.join(worst['playbooks']) or 'none'})"
+            )
+    return violations
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Token report for compiled prompts; fails when a budget is exceeded.")
+    p.add_argument("--budgets", default=str(DEFAULT_BUDGETS))
+    p.add_argument("--encoding", default="o200k_base", help="tiktoken encoding (gpt-4.1 uses o200k_base)")
+    p.add_argument("--out", help="Also write the full report as JSON to this path")
+    args = p.parse_args()
+
+    tokenizer, count = get_tokenizer(args.encoding)
+    files = file_report(count)
+    rows = classification_report(count)
+    budgets = json.loads(Path(args.budgets).read_text(encoding="utf-8"))
+
+    print(f"Tokenizer: {tokenizer}, minification {'on' if minify_enabled() else 'off'} (PROMPT_MINIFY)\n")
+    print(f"{'file':40s} {'raw':>7s} {'compiled':>9s} {'saved':>7s}")
+    for name, stats in files.items():
+        print(f"{name:40s} {stats['raw_tokens']:7d} {stats['compiled_tokens']:9d} {stats['saved_tokens']:7d}")
+
+    # Many classifications select the same playbooks; show one line per playbook set
+    by_playbooks: Dict[Tuple[str, ...], List[Dict]] = {}
+    for row in rows:
+        by_playbooks.setdefault(tuple(row["playbooks"]), []).append(row)
+    print(f"\n{'therapy playbooks':50s} {'classifications':>15s} {'tokens':>7s}")
+    for playbooks, group in sorted(by_playbooks.items(), key=lambda kv: -max(r["tokens"] for r in kv[1])):
+        print(f"{', '.join(playbooks) or '(none)':50s} {len(group):15d} {max(r['tokens'] for r in group):7d}")
+
+    violations = check_budgets(files, rows, budgets)
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps({
+            "tokenizer": tokenizer,
+            "minify": minify_enabled(),
+            "files": files,
+            "classifications": rows,
+            "budgets": budgets,
+            "violations": violations,
+        }, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nWrote {out}")
+
+    if violations:
+        print("\nOVER BUDGET:")
+        for v in violations:
+            print(f"  {v}")
+        return 1
+    print("All prompts within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,225 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Ensure project root is on sys.path so `import src...` works when running as a script.
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from dotenv import load_dotenv  # noqa: E402
+
+from src.models.serialization import dumps, loads  # noqa: E402
+
+# Filler vocabulary: replayed messages have the captured shape, not the captured text
+WORDS = (
+    "я ты он она мы не да но что как когда почему опять снова всегда никогда дом работа деньги "
+    "время дети родители отпуск выходные уборка ужин разговор обида помощь просто очень хочу "
+    "могу кажется думаю чувствую говорю слышу понимаю устала устал вместе сама сам"
+).split()
+
+
+def load_capture(path: Path) -> List[Dict[str, Any]]:
+    records = []
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append(loads(line))
+    return sorted(records, key=lambda r: r["t"])
+
+
+def synth_text(record: Dict[str, Any], rng: random.Random) -> str:
+    """Filler text with the captured number of characters, words and lines."""
+    words = [rng.choice(WORDS) for _ in range(max(1, record.get("w", 1)))]
+    lines = max(1, min(record.get("l", 1), len(words)))
+    per_line = -(-len(words) // lines)
+    text = "\n".join(" ".join(words[i:i + per_line]) for i in range(0, len(words), per_line))
+    chars = max(1, record.get("c", len(text)) - record.get("q", 0))
+    if len(text) < chars:
+        text += " " + " ".join(rng.choice(WORDS) for _ in range(chars))
+    text = text[:chars].rstrip() or words[0]
+    return text + ("?" if record.get("q") else "")
+
+
+def build_workload(
+    records: List[Dict[str, Any]],
+    speed: float,
+    scale: int,
+    max_gap: Optional[float],
+    seed: int,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Sessions -> turns with replay offsets (seconds from start).
+
+    Gaps are divided by `speed` after idle gaps longer than `max_gap` are cut
+    down to it; `scale` replays every session that many times in parallel.
+    """
+    rng = random.Random(seed)
+    sessions: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    offset, prev_t = 0.0, None
+    for r in records:
+        gap = 0.0 if prev_t is None else r["t"] - prev_t
+        if max_gap is not None:
+            gap = min(gap, max_gap)
+        offset += gap / speed
+        prev_t = r["t"]
+        text = synth_text(r, rng)
+        for copy in range(scale):
+            session_id = f"replay_{r['src']}_{r['s']}" + (f"_{copy}" if scale > 1 else "")
+            sessions[session_id].append({"at": offset, "user_role": r["r"], "text": text})
+    return dict(sessions)
+
+
+class InProcessTarget:
+    """Runs turns through the mediator graph in this process (like run_eval.py)."""
+
+    def __init__(self):
+        from src.agents.graph import process_message
+
+        self.process_message = process_message
+        self.state: Dict[str, Dict[str, Any]] = {}
+
+    async def send(self, session_id: str, user_role: str, text: str):
+        state = self.state.setdefault(session_id, {"messages": [], "current_agent": "onboarding", "classification": None})
+        state["messages"].append({"role": "user", "content": f"[{user_role}]: {text}"})
+        result = await self.process_message(
+            session_id=session_id,
+            messages=state["messages"],
+            current_agent=state["current_agent"],
+            classification=state["classification"],
+        )
+        state["current_agent"] = result.get("current_agent") or state["current_agent"]
+        state["classification"] = result.get("classification") or state["classification"]
+        response = result.get("response")
+        if response and not result.get("fallback"):
+            state["messages"].append({"role": "assistant", "content": result.get("response_json") or dumps(response)})
+
+    async def close(self):
+        pass
+
+
+class HttpTarget:
+    """Posts turns to /api/chat of a running server (python app.py)."""
+
+    def __init__(self, base_url: str, timeout: float):
+        import httpx
+
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=timeout)
+
+    async def send(self, session_id: str, user_role: str, text: str):
+        r = await self.client.post("/api/chat", json={"session_id": session_id, "user_role": user_role, "message": text})
+        r.raise_for_status()
+
+    async def close(self):
+        await self.client.aclose()
+
+
+async def replay_session(target, session_id: str, turns: List[Dict[str, Any]], start: float, results: List[Dict]):
+    """
+    Send a session's turns at their offsets.
+
+    A turn is never sent before the previous one of the same session finished
+    (the Telegram job queue and the web UI serialize a session the same way);
+    how far it fell behind its schedule is reported as lag.
+    """
+    for turn in turns:
+        delay = start + turn["at"] - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        t0 = time.monotonic()
+        error = None
+        try:
+            await target.send(session_id, turn["user_role"], turn["text"])
+        except Exception as e:
+            error = repr(e)
+        results.append({
+            "session_id": session_id,
+            "at": turn["at"],
+            "lag_s": t0 - (start + turn["at"]),
+            "latency_s": time.monotonic() - t0,
+            "error": error,
+        })
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    xs = sorted(values)
+    return xs[min(len(xs) - 1, int(p * len(xs)))]
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    load_dotenv(dotenv_path=PROJECT_ROOT / ".env")
+    records = load_capture(Path(args.capture))
+    if not records:
+        raise SystemExit(f"No records in {args.capture}")
+    workload = build_workload(records, args.speed, args.scale, args.max_gap, args.seed)
+    if args.sessions:
+        workload = dict(list(workload.items())[: args.sessions])
+    n_turns = sum(len(turns) for turns in workload.values())
+    duration = max(turn["at"] for turns in workload.values() for turn in turns)
+    print(f"Replaying {n_turns} turns in {len(workload)} sessions over ~{duration:.1f}s (speed x{args.speed}, scale x{args.scale})")
+
+    target = HttpTarget(args.url, args.timeout) if args.url else InProcessTarget()
+    results: List[Dict[str, Any]] = []
+    start = time.monotonic()
+    try:
+        await asyncio.gather(*(replay_session(target, sid, turns, start, results) for sid, turns in workload.items()))
+    finally:
+        await target.close()
+    wall = time.monotonic() - start
+
+    ok = [r for r in results if r["error"] is None]
+    latencies = [r["latency_s"] * 1000 for r in ok]
+    lags = [max(r["lag_s"], 0.0) * 1000 for r in results]
+    summary = {
+        "capture": str(args.capture),
+        "target": args.url or "in-process",
+        "speed": args.speed,
+        "scale": args.scale,
+        "sessions": len(workload),
+        "turns": len(results),
+        "errors": len(results) - len(ok),
+        "wall_s": round(wall, 3),
+        "scheduled_s": round(duration, 3),
+        "turns_per_s": round(len(results) / wall, 3) if wall else 0.0,
+        "latency_ms_p50": round(percentile(latencies, 0.50), 1),
+        "latency_ms_p95": round(percentile(latencies, 0.95), 1),
+        "latency_ms_p99": round(percentile(latencies, 0.99), 1),
+        "lag_ms_p50": round(percentile(lags, 0.50), 1),
+        "lag_ms_p95": round(percentile(lags, 0.95), 1),
+    }
+    out = Path(args.out_dir) / f"replay_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(dumps({"summary": summary, "turns": results}, indent=True), encoding="utf-8")
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    print(f"Wrote {out}")
+    return 0
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Replay captured traffic (TRAFFIC_CAPTURE_PATH) against a local build.")
+    p.add_argument("capture", help="JSONL written by the traffic capture")
+    p.add_argument("--speed", type=float, default=1.0, help="Time compression: 1 = original pace, 10 = ten times faster")
+    p.add_argument("--scale", type=int, default=1, help="Replay every captured session this many times in parallel")
+    p.add_argument("--max-gap", type=float, default=None, help="Cut idle gaps longer than this (seconds, before --speed)")
+    p.add_argument("--sessions", type=int, default=None, help="Replay only the first N sessions")
+    p.add_argument("--url", default=None, help="Base URL of a running app.py (default: run turns in-process)")
+    p.add_argument("--timeout", type=float, default=120.0, help="HTTP timeout per turn (--url only)")
+    p.add_argument("--seed", type=int, default=0, help="Seed for the filler text")
+    p.add_argument("--out-dir", default=str(PROJECT_ROOT / "eval" / "out"))
+    args = p.parse_args()
+    if args.speed <= 0 or args.scale < 1:
+        p.error("--speed must be > 0 and --scale >= 1")
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,9 +1,10 @@
 import argparse
 import asyncio
 import json
+import os
 import sys
 import time
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
@@ -15,6 +16,12 @@ if str(PROJECT_ROOT) not in sys.path:
 
 from dotenv import load_dotenv
 
+# Cheap to import: agents and the graph are created on first process_message call.
+from src.agents.graph import process_message  # noqa: E402
+from src.agents.checkpointed import process_turn  # noqa: E402
+from src.models.schemas import AgentResponse  # noqa: E402
+from src.models.serialization import dumps  # noqa: E402
+
 
 @dataclass
 class TurnRecord:
@@ -26,6 +33,8 @@ class TurnRecord:
     handoff_detected: bool
     agent_messages: List[Dict[str, Any]]
     raw_response: Dict[str, Any]
+    classification: Optional[Dict[str, Any]] = None
+    prompt_versions: Optional[Dict[str, str]] = None
 
 
 @dataclass
@@ -43,6 +52,7 @@ class RunMetrics:
     turn_to_handoff: Optional[int]
     latency_ms_p50: float
     latency_ms_p95: float
+    deferred_turns: int = 0  # turns held back by the turn-taking gate (no LLM call)
 
 
 def percentile(values: List[float], p: float) -> float:
@@ -92,6 +102,7 @@ async def run_scenario_once(
     run_id: str,
     process_message,
     AgentResponse,
+    process_turn=None,
 ) -> Tuple[RunMetrics, List[TurnRecord]]:
     session_id = f"eval_{scenario['id']}_{run_id}"
     current_agent = "onboarding"
@@ -105,6 +116,7 @@ async def run_scenario_once(
     recipient_ok_msgs = 0
     recipient_total_msgs = 0
     double_messaging_violations = 0
+    deferred_turns = 0
     latencies_ms: List[float] = []
     transcript: List[TurnRecord] = []
 
@@ -115,20 +127,26 @@ async def run_scenario_once(
         # user replied -> allow next assistant message to that user
         waiting_for_reply[user_role] = False
 
-        messages.append({"role": "user", "content": normalize_user_message(user_role, user_text)})
+        user_message = {"role": "user", "content": normalize_user_message(user_role, user_text)}
+        messages.append(user_message)
 
         agent_before = current_agent
         t0 = time.perf_counter()
-        result = await process_message(
-            session_id=session_id,
-            messages=messages,
-            current_agent=current_agent,
-            classification=classification,
-        )
+        if process_turn is not None:
+            # Checkpointed mode: the graph keeps the history, send only the delta
+            result = await process_turn(thread_id=session_id, message=user_message)
+        else:
+            result = await process_message(
+                session_id=session_id,
+                messages=messages,
+                current_agent=current_agent,
+                classification=classification,
+            )
         t1 = time.perf_counter()
         latencies_ms.append((t1 - t0) * 1000.0)
 
         response_data = result.get("response") or {}
+        deferred_turns += bool(result.get("deferred"))
         agent_status = result.get("current_agent") or current_agent
         handoff_detected = agent_before != "therapy" and agent_status == "therapy"
 
@@ -147,6 +165,11 @@ async def run_scenario_once(
 
         agent_messages = response_data.get("messages", []) if isinstance(response_data, dict) else []
 
+        # Record classification at handoff so transcripts can train the local pre-classifier
+        turn_classification = result.get("classification") if handoff_detected else None
+        if hasattr(turn_classification, "model_dump"):
+            turn_classification = turn_classification.model_dump(mode="json")
+
         ok, total = compute_recipient_correctness(agent_messages)
         recipient_ok_msgs += ok
         recipient_total_msgs += total
@@ -163,14 +186,16 @@ async def run_scenario_once(
                 handoff_detected=handoff_detected,
                 agent_messages=agent_messages,
                 raw_response=response_data,
+                classification=turn_classification,
+                prompt_versions=result.get("prompt_versions"),
             )
         )
 
         # update rolling state for next turn
         current_agent = agent_status
         classification = result.get("classification") or classification
-        if response_data:
-            messages.append({"role": "assistant", "content": json.dumps(response_data, ensure_ascii=False)})
+        if response_data and not result.get("fallback"):
+            messages.append({"role": "assistant", "content": result.get("response_json") or dumps(response_data)})
 
     total_turns = len(scenario.get("turns", []))
     schema_rate = (schema_valid_turns / total_turns) if total_turns else 0.0
@@ -190,6 +215,7 @@ async def run_scenario_once(
         turn_to_handoff=handoff_turn_idx,
         latency_ms_p50=percentile(latencies_ms, 0.50),
         latency_ms_p95=percentile(latencies_ms, 0.95),
+        deferred_turns=deferred_turns,
     )
 
     return metrics, transcript
@@ -200,15 +226,15 @@ async def main_async(args: argparse.Namespace) -> int:
     load_dotenv(dotenv_path=PROJECT_ROOT / ".env")
     if not (PROJECT_ROOT / ".env").exists():
         print(f"WARNING: .env not found at {PROJECT_ROOT / '.env'}")
-    if not __import__("os").getenv("OPENAI_API_KEY"):
+    if args.executor:
+        os.environ["MEDIATOR_EXECUTOR"] = args.executor
+    if args.checkpointed and not os.getenv("MEDIATOR_CHECKPOINTER"):
+        os.environ["MEDIATOR_CHECKPOINTER"] = "memory"
+    if not os.getenv("OPENAI_API_KEY"):
         raise SystemExit(
             "OPENAI_API_KEY is not set. Put it into project-root .env or export it in your shell."
         )
 
-    # Import after env is loaded: graph.py initializes agents at import time.
-    from src.agents.graph import process_message  # noqa: WPS433
-    from src.models.schemas import AgentResponse  # noqa: WPS433
-
     scenarios = load_scenarios(Path(args.scenarios))
     if not scenarios:
         raise SystemExit(f"No scenarios found in {args.scenarios}")
@@ -220,48 +246,50 @@ async def main_async(args: argparse.Namespace) -> int:
     summary_path = out_dir / f"summary_{ts}.json"
     transcript_path = out_dir / f"transcript_{ts}.jsonl"
 
-    all_metrics: List[Dict[str, Any]] = []
+    all_metrics: List[RunMetrics] = []
     with transcript_path.open("w", encoding="utf-8") as tf:
         for s in scenarios:
             for i in range(args.runs):
                 run_id = f"{i+1}"
                 try:
-                    metrics, transcript = await run_scenario_once(s, run_id, process_message, AgentResponse)
-                    all_metrics.append(asdict(metrics))
+                    metrics, transcript = await run_scenario_once(
+                        s,
+                        run_id,
+                        process_message,
+                        AgentResponse,
+                        process_turn=process_turn if args.checkpointed else None,
+                    )
+                    all_metrics.append(metrics)
 
                     # Write transcript entries as JSONL for manual scoring later
+                    # (dataclasses are serialized directly, without asdict copies)
                     tf.write(
-                        json.dumps(
+                        dumps(
                             {
                                 "scenario_id": s["id"],
                                 "run_id": run_id,
                                 "description": s.get("description", ""),
-                                "turns": [asdict(t) for t in transcript],
-                            },
-                            ensure_ascii=False,
+                                "turns": transcript,
+                            }
                         )
                         + "\n"
                     )
                 except Exception as e:
                     # Persist partial results and continue
                     tf.write(
-                        json.dumps(
+                        dumps(
                             {
                                 "scenario_id": s.get("id"),
                                 "run_id": run_id,
                                 "description": s.get("description", ""),
                                 "error": repr(e),
-                            },
-                            ensure_ascii=False,
+                            }
                         )
                         + "\n"
                     )
 
                 # Write summary incrementally so crashes still leave a usable report
-                summary_path.write_text(
-                    json.dumps({"metrics": all_metrics}, ensure_ascii=False, indent=2),
-                    encoding="utf-8",
-                )
+                summary_path.write_text(dumps({"metrics": all_metrics}, indent=True), encoding="utf-8")
 
     print(f"Wrote summary: {summary_path}")
     print(f"Wrote transcripts (for manual helpfulness scoring): {transcript_path}")
@@ -273,6 +301,17 @@ def main() -> int:
     p.add_argument("--scenarios", default=str(PROJECT_ROOT / "eval" / "scenarios.json"))
     p.add_argument("--runs", type=int, default=3)
     p.add_argument("--out-dir", default=str(PROJECT_ROOT / "eval" / "out"))
+    p.add_argument(
+        "--executor",
+        choices=["langgraph", "direct"],
+        default=None,
+        help="Workflow runtime (default: MEDIATOR_EXECUTOR or langgraph)",
+    )
+    p.add_argument(
+        "--checkpointed",
+        action="store_true",
+        help="Send only new messages via process_turn (graph keeps per-session state)",
+    )
     args = p.parse_args()
     return asyncio.run(main_async(args))
 
@@ -0,0 +1,116 @@
+"""Local OpenAI-compatible stub server for testing LLM routing and failover.
+
+Example: two endpoints, the first slow and flaky
+
+    python eval/stub_llm_server.py --port 9001 --latency 3 --error-rate 0.3 &
+    python eval/stub_llm_server.py --port 9002 --latency 0.2 &
+    export LLM_ENDPOINTS='[
+      {"name": "a", "base_url": "http://127.0.0.1:9001/v1", "api_key_env": "STUB_KEY"},
+      {"name": "b", "base_url": "http://127.0.0.1:9002/v1", "api_key_env": "STUB_KEY", "fallback": true}
+    ]'
+    STUB_KEY=stub python eval/run_eval.py ...
+
+Requests with "n" > 1 get that many choices (numbered variants of the reply).
+
+Latency and error rate can be changed at runtime:
+
+    curl -X POST 'http://127.0.0.1:9001/control?latency=0.1&error_rate=0'
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+
+
+def _last_user_role(messages: List[Dict[str, Any]]) -> str:
+    for msg in reversed(messages):
+        if msg.get("role") == "user":
+            return "user_2" if str(msg.get("content", "")).startswith("[user_2]") else "user_1"
+    return "user_1"
+
+
+def build_app(latency: float, error_rate: float, handoff_after: int, name: str) -> FastAPI:
+    app = FastAPI(title=f"stub-llm-{name}")
+    state = {"latency": latency, "error_rate": error_rate, "requests": 0}
+
+    @app.post("/control")
+    async def control(latency: Optional[float] = None, error_rate: Optional[float] = None):
+        if latency is not None:
+            state["latency"] = latency
+        if error_rate is not None:
+            state["error_rate"] = error_rate
+        return state
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(body: Dict[str, Any]):
+        state["requests"] += 1
+        await asyncio.sleep(state["latency"])
+        if random.random() < state["error_rate"]:
+            raise HTTPException(status_code=503, detail="stub: injected failure")
+
+        messages = body.get("messages", [])
+        user_turns = sum(1 for m in messages if m.get("role") == "user")
+        reply: Dict[str, Any] = {
+            "messages": [{
+                "recipient": _last_user_role(messages),
+                "type": "other",
+                "text": f"[{name}] ответ на сообщение {user_turns}",
+            }],
+            "handoff": False,
+        }
+        if user_turns >= handoff_after:
+            reply["handoff"] = True
+            reply["classification"] = {
+                "resolvability": "resolvable", "domain": "household", "nature": "emotional",
+                "form": "open", "threat_level": "surface", "confidence": 0.9,
+            }
+
+        contents = []
+        for i in range(max(1, int(body.get("n") or 1))):
+            variant = json.loads(json.dumps(reply))
+            if i:
+                variant["messages"][0]["text"] += f" (вариант {i + 1})"
+            contents.append(json.dumps(variant, ensure_ascii=False))
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 3 + 1 for m in messages)
+        completion_tokens = sum(len(content) // 3 + 1 for content in contents)
+        return {
+            "id": f"stub-{state['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": i,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            } for i, content in enumerate(contents)],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    return app
+
+
+def main():
+    p = argparse.ArgumentParser(description="OpenAI-compatible stub LLM with injectable latency/errors.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=9001)
+    p.add_argument("--latency", type=float, default=0.2, help="Seconds per response")
+    p.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    p.add_argument("--handoff-after", type=int, default=6, help="User turns before onboarding hands off")
+    p.add_argument("--name", default=None)
+    args = p.parse_args()
+
+    app = build_app(args.latency, args.error_rate, args.handoff_after, args.name or str(args.port))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import json
+import random
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Ensure project root is on sys.path so `import src...` works when running as a script.
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.classification.preclassifier import (  # noqa: E402
+    AXES,
+    DEFAULT_MODEL_PATH,
+    PreClassifier,
+    build_training_examples,
+)
+
+
+def load_records(paths: List[Path]) -> List[Dict[str, Any]]:
+    """Read eval transcripts / exported sessions (JSONL, one conversation per line)."""
+    records = []
+    for path in paths:
+        with path.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    return records
+
+
+def holdout_accuracy(model: PreClassifier, examples) -> Dict[str, float]:
+    hits = Counter()
+    for text, labels in examples:
+        proba = model.predict_proba(text)
+        for axis, gold in labels.items():
+            predicted = max(proba[axis].items(), key=lambda kv: kv[1])[0]
+            hits[axis] += int(predicted == gold)
+    return {axis: hits[axis] / len(examples) for axis in AXES} if examples else {}
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Train the local conflict pre-classifier.")
+    p.add_argument(
+        "--data",
+        nargs="+",
+        default=[str(x) for x in sorted((PROJECT_ROOT / "eval" / "out").glob("transcript_*.jsonl"))],
+        help="Transcript/session JSONL files with classification labels",
+    )
+    p.add_argument("--out", default=str(DEFAULT_MODEL_PATH))
+    p.add_argument("--epochs", type=int, default=15)
+    p.add_argument("--holdout", type=float, default=0.2, help="Share of conversations used for evaluation")
+    args = p.parse_args()
+
+    records = load_records([Path(x) for x in args.data])
+    random.Random(13).shuffle(records)
+    split = int(len(records) * (1 - args.holdout))
+    train_examples = build_training_examples(records[:split])
+    test_examples = build_training_examples(records[split:])
+    if not train_examples:
+        raise SystemExit(
+            f"No labeled conversations found in {len(records)} records. Transcripts written before run_eval.py "
+            "recorded the handoff classification (e.g. the bundled transcript_20251213_151338.jsonl) have no labels: "
+            "run eval/run_eval.py first, then pass its transcript with --data."
+        )
+
+    model = PreClassifier.fit(train_examples, epochs=args.epochs)
+    model.save(Path(args.out))
+
+    print(f"Trained on {len(train_examples)} examples from {split} conversations")
+    for axis, acc in holdout_accuracy(model, test_examples).items():
+        print(f"  holdout accuracy {axis}: {acc:.2f}")
+    print(f"Wrote model: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,11 +3,22 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+import argparse
 import asyncio
 import logging
 import os
+import time
+from telegram import BotCommand
 from telegram.ext import Application, CommandHandler, MessageHandler, filters
 
+from src.agents.checkpointed import close_checkpointer
+from src.agents.graph import warm_up
+from src.llm.http_pool import close_http_pool
+from src.llm.quotas import get_spend_quotas
+from src.observability.capture import traffic_capture
+from src.observability.tracing import tracer
+from src.prompts.registry import prompt_registry
+from src.transport.job_queue import JobWorkerPool, SQLiteJobQueue
 from src.transport.session_manager import SessionManager
 from src.transport.telegram_handlers import TelegramHandlers
 
@@ -19,8 +30,48 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    """Start Telegram bot for AI Mediator."""
+BOT_COMMANDS = [
+    ("start", "Начать работу с ботом"),
+    ("invite", "Создать приглашение для партнера"),
+    ("help", "Показать справку"),
+]
+
+BOT_DESCRIPTION = (
+    "AI Mediator помогает парам находить решения в конфликтных ситуациях.\n\n"
+    "🗣️ Каждый общается в своем чате\n"
+    "💡 Бот помогает понять друг друга\n"
+    "🤝 Вместе находим компромисс"
+)
+
+
+async def sync_bot_commands(bot):
+    """Set bot commands (visible in Telegram menu) unless Telegram already has them."""
+    try:
+        current = await bot.get_my_commands()
+        if [(c.command, c.description) for c in current] == BOT_COMMANDS:
+            logger.info("Bot commands unchanged")
+            return
+        await bot.set_my_commands([BotCommand(command, text) for command, text in BOT_COMMANDS])
+        logger.info("Bot commands set successfully")
+    except Exception as e:
+        logger.warning("Could not set bot commands: %s", e)
+
+
+async def sync_bot_description(bot):
+    """Set bot description unless it is already current."""
+    try:
+        current = await bot.get_my_description()
+        if current.description == BOT_DESCRIPTION:
+            logger.info("Bot description unchanged")
+            return
+        await bot.set_my_description(BOT_DESCRIPTION)
+        logger.info("Bot description set successfully")
+    except Exception as e:
+        logger.warning("Could not set bot description: %s", e)
+
+
+async def main(worker_only: bool = False):
+    """Start Telegram bot for AI Mediator (or only job workers with worker_only)."""
     telegram_token = os.getenv("TELEGRAM_BOT_TOKEN")
     telegram_username = os.getenv("TELEGRAM_BOT_USERNAME")
 
@@ -35,12 +86,30 @@ async def main():
     # In-memory state
     session_manager = SessionManager()
 
+    # Durable queue between polling and mediator turns (optional)
+    job_queue = SQLiteJobQueue.from_env()
+    if worker_only and job_queue is None:
+        raise ValueError("--worker requires TELEGRAM_JOB_QUEUE to be set in .env file")
+    if worker_only and not os.getenv("MEDIATOR_CHECKPOINTER", "").startswith("sqlite:"):
+        # The worker's SessionManager is empty: without a shared checkpointer every turn starts from scratch
+        raise ValueError("--worker requires MEDIATOR_CHECKPOINTER=sqlite:<path> to be set in .env file")
+
     # Handlers
-    handlers = TelegramHandlers(session_manager, telegram_username)
+    handlers = TelegramHandlers(session_manager, telegram_username, job_queue=job_queue)
 
     # Build application
     app = Application.builder().token(telegram_token).build()
 
+    pool = None
+    workers = int(os.getenv("TELEGRAM_JOB_WORKERS", "4"))
+    if job_queue is not None and (workers > 0 or worker_only):
+        pool = JobWorkerPool(job_queue, lambda job: handlers.process_job(job, app.bot), concurrency=max(1, workers))
+        handlers.on_enqueue = pool.notify
+
+    if worker_only:
+        await run_workers(app, pool)
+        return
+
     async def error_handler(update, context):
         logger.error("Update %s caused error %s", update, context.error)
 
@@ -50,67 +119,81 @@ async def main():
     app.add_handler(CommandHandler("start", handlers.start_command))
     app.add_handler(CommandHandler("invite", handlers.invite_command))
     app.add_handler(CommandHandler("help", handlers.help_command))
+    # Admin-only commands, not in the menu
+    app.add_handler(CommandHandler("profile", handlers.profile_command))
+    app.add_handler(CommandHandler("memory", handlers.memory_command))
 
     # Messages
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.handle_message))
 
     logger.info("Bot initialized with commands: /start, /invite, /help")
 
-    # Clear webhook to avoid conflicts with polling
-    try:
-        await app.bot.delete_webhook(drop_pending_updates=True)
-        logger.info("Webhook cleared successfully")
-    except Exception as e:
-        logger.warning("Could not clear webhook: %s", e)
-
-    # Set bot commands (visible in Telegram menu)
-    try:
-        from telegram import BotCommand
-
-        commands = [
-            BotCommand("start", "Начать работу с ботом"),
-            BotCommand("invite", "Создать приглашение для партнера"),
-            BotCommand("help", "Показать справку"),
-        ]
-        await app.bot.set_my_commands(commands)
-        logger.info("Bot commands set successfully")
-    except Exception as e:
-        logger.warning("Could not set bot commands: %s", e)
-
-    # Set bot description
-    try:
-        description = (
-            "AI Mediator помогает парам находить решения в конфликтных ситуациях.\n\n"
-            "🗣️ Каждый общается в своем чате\n"
-            "💡 Бот помогает понять друг друга\n"
-            "🤝 Вместе находим компромисс"
-        )
-        await app.bot.set_my_description(description)
-        logger.info("Bot description set successfully")
-    except Exception as e:
-        logger.warning("Could not set bot description: %s", e)
-
-    # Start polling
+    # Start polling once warm: setup, first LLM connections and bot metadata run concurrently
     logger.info("Starting polling...")
+    started = time.monotonic()
     await app.initialize()
+    await asyncio.gather(warm_up(), sync_bot_commands(app.bot), sync_bot_description(app.bot))
     await app.start()
-    await app.updater.start_polling()
+    # Polling clears the webhook itself, which avoids conflicts with a previous webhook setup
+    await app.updater.start_polling(drop_pending_updates=True)
+    prompt_registry.start_watching()
+    get_spend_quotas().start_persisting()
+    if pool is not None:
+        pool.start()
 
-    logger.info("Bot is now running. Press Ctrl+C to stop.")
+    logger.info("Bot is now running (ready in %.2fs). Press Ctrl+C to stop.", time.monotonic() - started)
 
     try:
         await asyncio.Future()  # Run forever
     except KeyboardInterrupt:
         logger.info("Received interrupt signal")
     finally:
+        if pool is not None:
+            await pool.stop()
+        await prompt_registry.stop_watching()
+        await get_spend_quotas().stop_persisting()
         await app.updater.stop()
         await app.stop()
         await app.shutdown()
+        await close_checkpointer()
+        await close_http_pool()
+        await asyncio.to_thread(tracer.flush)
+        await asyncio.to_thread(traffic_capture.flush)
+
+
+async def run_workers(app: Application, pool: JobWorkerPool):
+    """Process queued turns only; another process polls Telegram and enqueues them."""
+    await app.initialize()
+    await warm_up()
+    prompt_registry.start_watching()
+    get_spend_quotas().start_persisting()
+    pool.start()
+    logger.info("Job workers running on %s. Press Ctrl+C to stop.", pool.queue.path)
+
+    try:
+        await asyncio.Future()  # Run forever
+    except KeyboardInterrupt:
+        logger.info("Received interrupt signal")
+    finally:
+        # Unfinished jobs are released back to the queue
+        await pool.stop()
+        await prompt_registry.stop_watching()
+        await get_spend_quotas().stop_persisting()
+        await app.shutdown()
+        await close_checkpointer()
+        await close_http_pool()
+        await asyncio.to_thread(tracer.flush)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AI Mediator Telegram bot")
+    parser.add_argument(
+        "--worker", action="store_true",
+        help="only process jobs from TELEGRAM_JOB_QUEUE (no polling)",
+    )
+    args = parser.parse_args()
     try:
-        asyncio.run(main())
+        asyncio.run(main(worker_only=args.worker))
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
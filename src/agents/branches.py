@@ -0,0 +1,125 @@
+"""Branching assistant turns: kept alternatives and prefetched candidates.
+
+Every assistant turn of a session is a node holding all replies generated
+for it (branches) together with the agent state each one leads to. The
+dialogue is the path through the active branch of each turn, so switching
+back to an earlier answer of the latest turn is a local operation - no LLM
+call.
+
+With REGENERATE_CANDIDATES=n > 1 a turn asks the LLM for n completions in
+the same request; the spares are cached on the turn and the next regenerate
+is served from the cache instantly.
+
+Only the latest turn can be regenerated or switched: later turns were
+generated against its active branch.
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from src.models.serialization import dumps
+
+MAX_TURNS = 50  # turn nodes kept per session (older ones only hold stale alternatives)
+
+
+def get_regenerate_candidates() -> int:
+    """Completions requested per turn (1 = no prefetching)."""
+    return max(1, int(os.getenv("REGENERATE_CANDIDATES", "1")))
+
+
+def _plain(classification: Any) -> Optional[Dict[str, Any]]:
+    if classification is None or isinstance(classification, dict):
+        return classification
+    return classification.model_dump()
+
+
+@dataclass
+class Branch:
+    """One reply to a turn and the agent state it leads to."""
+    response: Dict[str, Any]
+    current_agent: str
+    classification: Optional[Dict[str, Any]] = None
+    ui_seqs: List[int] = field(default_factory=list)  # UI messages showing it (web)
+    response_json: Optional[str] = field(default=None, repr=False)  # serialized once, on first use
+
+    def encoded(self) -> str:
+        if self.response_json is None:
+            self.response_json = dumps(self.response)
+        return self.response_json
+
+    def as_result(self) -> Dict[str, Any]:
+        return {
+            "response": self.response,
+            "current_agent": self.current_agent,
+            "classification": self.classification,
+            "response_json": self.encoded(),
+        }
+
+
+@dataclass
+class TurnNode:
+    """One assistant turn: the state it started from, its branches and cached spares."""
+    before: Dict[str, Any]  # {"current_agent", "classification"} before the turn
+    branches: List[Branch] = field(default_factory=list)
+    active: int = 0
+    cached: List[Branch] = field(default_factory=list)
+
+    @property
+    def current(self) -> Branch:
+        return self.branches[self.active]
+
+    def add(self, branch: Branch) -> Branch:
+        self.branches.append(branch)
+        self.active = len(self.branches) - 1
+        return branch
+
+    def take_cached(self) -> Optional[Branch]:
+        """Next prefetched candidate as a new active branch, or None if the cache is empty."""
+        return self.add(self.cached.pop(0)) if self.cached else None
+
+    def select(self, index: int) -> Branch:
+        if not 0 <= index < len(self.branches):
+            raise IndexError(f"Turn has {len(self.branches)} branches, no branch {index}")
+        self.active = index
+        return self.current
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"index": self.active, "count": len(self.branches), "cached": len(self.cached)}
+
+
+class BranchTree:
+    """Turn nodes of one session along the active path."""
+
+    def __init__(self):
+        self.turns: List[TurnNode] = []
+        self.open: Optional[TurnNode] = None  # latest turn, while it can still be regenerated
+
+    @staticmethod
+    def branches_from_result(result: Dict[str, Any]) -> List[Branch]:
+        """Primary reply and spares of a process_message/process_turn result."""
+        agent, classification = result.get("current_agent"), _plain(result.get("classification"))
+        branches = [
+            Branch(response, agent, classification)
+            for response in [result.get("response"), *(result.get("alternatives") or [])]
+            if response
+        ]
+        if branches and result.get("response") and result.get("response_json"):
+            branches[0].response_json = result["response_json"]
+        return branches
+
+    def close(self):
+        """A new user message arrived: the latest turn is history now."""
+        if self.open is not None:
+            self.open.cached = []  # spares were generated for a context that no longer exists
+        self.open = None
+
+    def new_turn(self, before: Dict[str, Any], branches: List[Branch]) -> TurnNode:
+        """Record a freshly answered turn; `branches[0]` is the reply shown."""
+        self.close()
+        node = TurnNode(before={**before, "classification": _plain(before.get("classification"))})
+        node.add(branches[0])
+        node.cached = list(branches[1:])
+        self.turns.append(node)
+        del self.turns[:-MAX_TURNS]
+        self.open = node
+        return node
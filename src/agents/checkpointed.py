@@ -0,0 +1,276 @@
+"""Checkpointed mediator mode: the graph owns per-session state.
+
+Callers send only the new user message for a thread id and get back only
+the new response; history, current agent and classification live in a
+LangGraph checkpointer (in memory or SQLite) instead of being copied across
+every transport boundary.
+
+Enable with MEDIATOR_CHECKPOINTER:
+    memory              - in-process InMemorySaver
+    sqlite:<path>       - AsyncSqliteSaver (needs langgraph-checkpoint-sqlite)
+"""
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from src.agents.graph import (
+    BUSY_TEXT,
+    FALLBACK_TEXT,
+    QUOTA_TEXT,
+    build_fallback_response,
+    build_mediator_graph,
+    deferred_result,
+)
+from src.agents.turn_gate import defer_reason, record_deferred
+from src.llm.admission import AdmissionRejected
+from src.llm.hedging import LLMDeadlineExceeded, get_turn_deadline_seconds
+from src.llm.quotas import QuotaExceeded, QuotaScope, get_spend_quotas, spending
+from src.models.serialization import dumps
+from src.observability.metrics import metrics
+from src.observability.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+_checkpointer = None
+_sqlite_conn = None
+_graph = None
+
+
+def checkpointing_enabled() -> bool:
+    """True if transports should send deltas through process_turn."""
+    return bool(os.getenv("MEDIATOR_CHECKPOINTER"))
+
+
+# Our types stored in checkpoints (classification, message types in last_response)
+CHECKPOINT_TYPES = [
+    ("src.models.schemas", name)
+    for name in (
+        "ConflictClassification", "Resolvability", "Domain", "Nature", "Form", "ThreatLevel", "MessageType",
+    )
+]
+
+
+def _serializer():
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+    try:
+        return JsonPlusSerializer(allowed_msgpack_modules=CHECKPOINT_TYPES)
+    except TypeError:
+        # Older langgraph has no msgpack allowlist
+        return JsonPlusSerializer()
+
+
+async def _create_checkpointer(spec: str):
+    global _sqlite_conn
+    if spec == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        return InMemorySaver(serde=_serializer())
+    if spec.startswith("sqlite:"):
+        try:
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except ImportError as e:
+            raise RuntimeError(
+                "MEDIATOR_CHECKPOINTER=sqlite:... requires `pip install langgraph-checkpoint-sqlite`"
+            ) from e
+        _sqlite_conn = await aiosqlite.connect(spec[len("sqlite:"):])
+        return AsyncSqliteSaver(_sqlite_conn, serde=_serializer())
+    raise ValueError(f"Unknown MEDIATOR_CHECKPOINTER: {spec!r} (expected 'memory' or 'sqlite:<path>')")
+
+
+async def get_checkpointed_graph():
+    """Compile the graph with a checkpointer on first use."""
+    global _checkpointer, _graph
+    if _graph is None:
+        _checkpointer = await _create_checkpointer(os.getenv("MEDIATOR_CHECKPOINTER") or "memory")
+        _graph = build_mediator_graph(checkpointer=_checkpointer)
+    return _graph
+
+
+async def close_checkpointer():
+    """Release the SQLite connection (no-op for the memory saver)."""
+    global _sqlite_conn, _checkpointer, _graph
+    if _sqlite_conn is not None:
+        await _sqlite_conn.close()
+    _sqlite_conn = _checkpointer = _graph = None
+
+
+def _config(thread_id: str) -> Dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+async def _run(
+    graph,
+    thread_id: str,
+    update: Dict,
+    deadline_s: Optional[float],
+    candidates: int = 1,
+    quota_scope: Optional[QuotaScope] = None,
+) -> Dict:
+    """Run one turn from the checkpointed state and store the response as a delta."""
+    config = _config(thread_id)
+    snapshot = await graph.aget_state(config)
+    state = snapshot.values or {}
+    current_agent = state.get("current_agent", "onboarding")
+
+    new_messages = [m for m in update.get("messages", []) if m]
+    if new_messages:
+        history = list(state.get("messages", [])) + new_messages
+        reason = defer_reason(history)
+        if reason is not None:
+            # Keep the message in the thread; the next turn answers it together with the partner's reply
+            await graph.aupdate_state(config, {"messages": new_messages}, as_node=current_agent)
+            record_deferred(thread_id, current_agent, reason, history)
+            return deferred_result(current_agent, state.get("classification"))
+
+    budget = deadline_s if deadline_s is not None else get_turn_deadline_seconds()
+    turn_input: Dict = {
+        **update,
+        "session_id": thread_id,
+        "last_response": None,
+        "deadline": time.monotonic() + budget,
+        "prompt_versions": {},
+        "candidates": candidates,
+        "alternatives": None,
+    }
+    if not state:
+        turn_input.update(current_agent="onboarding", classification=None)
+
+    try:
+        spend = await get_spend_quotas().admit(quota_scope, turn_input["deadline"])
+        with spending(spend):
+            result = await graph.ainvoke(turn_input, config)
+    except (LLMDeadlineExceeded, AdmissionRejected, QuotaExceeded) as exc:
+        if isinstance(exc, QuotaExceeded):
+            kind, counter, text = "quota", "turn_quota_limited_total", QUOTA_TEXT
+            # Refused before the graph ran, so nothing stored the new message yet
+            stored = [m for m in new_messages if isinstance(m, dict)]
+            if stored:
+                await graph.aupdate_state(config, {"messages": stored}, as_node=current_agent)
+        elif isinstance(exc, AdmissionRejected):
+            kind, counter, text = "busy", "turn_busy_total", BUSY_TEXT
+        else:
+            kind, counter, text = "fallback", "turn_fallbacks_total", FALLBACK_TEXT
+        logger.warning("Thread %s: %s, sending %s reply", thread_id, exc, kind)
+        metrics.inc(counter, agent=current_agent)
+        history = list(state.get("messages", [])) + [m for m in update["messages"] if isinstance(m, dict)]
+        return {
+            "response": build_fallback_response(history, text).model_dump(),
+            "current_agent": current_agent,
+            "classification": state.get("classification"),
+            "fallback": True,
+            "prompt_versions": {},
+            "alternatives": [],
+        }
+
+    response = result.get("last_response")
+    response_json = dumps(response) if response else None
+    if response:
+        # Store the assistant turn in the thread, as if the last node wrote it
+        await graph.aupdate_state(
+            config,
+            {"messages": [{"role": "assistant", "content": response_json}]},
+            as_node="therapy" if result.get("current_agent") == "therapy" else "onboarding",
+        )
+
+    return {
+        "response": response,
+        "current_agent": result.get("current_agent"),
+        "classification": result.get("classification"),
+        "fallback": False,
+        "prompt_versions": result.get("prompt_versions") or {},
+        "alternatives": result.get("alternatives") or [],
+        "response_json": response_json,  # the stored text, reusable by callers
+    }
+
+
+async def process_turn(
+    thread_id: str,
+    message: Optional[Dict[str, str]],
+    deadline_s: Optional[float] = None,
+    candidates: int = 1,
+    quota_scope: Optional[QuotaScope] = None,
+) -> Dict:
+    """
+    Process only the new message for a thread.
+
+    Args:
+        thread_id: Session identifier (checkpointer thread)
+        message: The new history entry, e.g. {"role": "user", "content": "[user_1]: ..."};
+            None answers the thread as it is (a retried turn whose message is already stored)
+        deadline_s: Per-turn budget in seconds (default: TURN_DEADLINE_SECONDS)
+        candidates: Completions to request; spares are returned as "alternatives"
+        quota_scope: User and partnership charged for the LLM calls (None = no quota)
+
+    Returns:
+        Same dict as process_message; the response is already stored in the thread.
+    """
+    with tracer.span("mediator.process_turn", session_id=thread_id):
+        graph = await get_checkpointed_graph()
+        return await _run(
+            graph, thread_id, {"messages": [message] if message else []}, deadline_s, candidates, quota_scope,
+        )
+
+
+async def regenerate_turn(
+    thread_id: str,
+    deadline_s: Optional[float] = None,
+    candidates: int = 1,
+    restore: Optional[Dict] = None,
+    replacement: Optional[Dict] = None,
+    quota_scope: Optional[QuotaScope] = None,
+) -> Dict:
+    """
+    Drop the last assistant message of a thread and answer again.
+
+    Args:
+        restore: Agent state to rerun the turn from ({"current_agent", "classification"})
+        replacement: An already generated alternative ({"response", "current_agent",
+            "classification", optional "response_json"}) to store instead of calling the LLM
+        quota_scope: User and partnership charged for the LLM calls (None = no quota)
+    """
+    from langchain_core.messages import RemoveMessage
+
+    with tracer.span("mediator.regenerate_turn", session_id=thread_id, cached=replacement is not None):
+        graph = await get_checkpointed_graph()
+        config = _config(thread_id)
+        snapshot = await graph.aget_state(config)
+        messages = (snapshot.values or {}).get("messages", [])
+        last_ai = next((m for m in reversed(messages) if getattr(m, "type", None) == "ai"), None)
+        removal = [RemoveMessage(id=last_ai.id)] if last_ai is not None else []
+
+        if replacement is not None:
+            response_json = replacement.get("response_json") or dumps(replacement["response"])
+            assistant = {"role": "assistant", "content": response_json}
+            await graph.aupdate_state(
+                config,
+                {
+                    "messages": removal + [assistant],
+                    "current_agent": replacement["current_agent"],
+                    "classification": replacement["classification"],
+                },
+                as_node="therapy" if replacement["current_agent"] == "therapy" else "onboarding",
+            )
+            return {
+                **replacement, "response_json": response_json,
+                "fallback": False, "prompt_versions": {}, "alternatives": [],
+            }
+
+        return await _run(
+            graph, thread_id, {"messages": removal, **(restore or {})}, deadline_s, candidates, quota_scope,
+        )
+
+
+async def get_thread_messages(thread_id: str):
+    """Full history stored for a thread (LangChain messages)."""
+    graph = await get_checkpointed_graph()
+    snapshot = await graph.aget_state(_config(thread_id))
+    return (snapshot.values or {}).get("messages", [])
+
+
+async def clear_thread(thread_id: str):
+    """Forget all checkpoints of a thread."""
+    await get_checkpointed_graph()
+    await _checkpointer.adelete_thread(thread_id)
@@ -0,0 +1,45 @@
+"""Conversation history as the LLM sees it.
+
+Stored assistant turns are the agent's full JSON answer: handoff flag,
+classification with its reasoning, recipient, type and text of every
+message. Later turns only need what was said to whom, so assistant turns
+are re-encoded compactly when the history is sent back to the model:
+
+    {"messages":[{"recipient":"user_1","type":"ack","text":"..."}]}
+
+Still the output schema (the model keeps answering in it), without the
+handoff/classification payload. Storage, transcripts and the UI keep the
+full structured data.
+
+Disable with COMPACT_HISTORY=0.
+"""
+import os
+from functools import lru_cache
+
+from src.models.serialization import dumps, loads
+
+
+def compact_history_enabled() -> bool:
+    return os.getenv("COMPACT_HISTORY", "1") != "0"
+
+
+@lru_cache(maxsize=4096)
+def encode_assistant_turn(content: str) -> str:
+    """
+    Compact form of a stored assistant turn (cached: the same turns are re-sent every turn).
+
+    Content that is not an agent JSON answer is returned unchanged.
+    """
+    try:
+        data = loads(content)
+    except ValueError:
+        return content
+    if not isinstance(data, dict) or not isinstance(data.get("messages"), list):
+        return content
+    messages = [
+        {"recipient": m.get("recipient"), "type": m.get("type"), "text": m.get("text")}
+        for m in data["messages"]
+        if isinstance(m, dict) and m.get("text")
+    ]
+    compact = dumps({"messages": messages})
+    return compact if len(compact) < len(content) else content
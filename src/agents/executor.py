@@ -0,0 +1,34 @@
+"""Minimal state-machine executor: an alternative to the LangGraph runtime."""
+from typing import Awaitable, Callable, Dict
+
+
+Node = Callable[[Dict], Awaitable[Dict]]
+
+
+class DirectExecutor:
+    """
+    Runs the mediator workflow (onboarding -> optional handoff -> therapy)
+    by calling the node functions directly.
+
+    The history is passed through as-is: no add_messages reducer, no message
+    conversion or ID assignment, so a turn costs O(1) in history size apart
+    from what the agents themselves do.
+    """
+
+    def __init__(
+        self,
+        onboarding: Node,
+        therapy: Node,
+        route_after_onboarding: Callable[[Dict], str],
+    ):
+        self.onboarding = onboarding
+        self.therapy = therapy
+        self.route_after_onboarding = route_after_onboarding
+
+    async def ainvoke(self, state: Dict) -> Dict:
+        """Same contract as the compiled graph's ainvoke."""
+        if state.get("current_agent") != "therapy":
+            state = await self.onboarding(state)
+            if self.route_after_onboarding(state) != "therapy":
+                return state
+        return await self.therapy(state)
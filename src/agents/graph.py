@@ -1,35 +1,158 @@
-"""LangGraph workflow for multi-agent mediation system."""
-from typing import Dict, List, Annotated, TypedDict
-from langgraph.graph import StateGraph, END
-from langgraph.graph.message import add_messages
+"""LangGraph workflow for multi-agent mediation system.
 
-from src.models.schemas import GraphState, ConflictClassification
-from src.agents.onboarding import OnboardingAgent
-from src.agents.therapy import TherapyAgent
+Importing this module is cheap: langgraph/langchain are imported, agents are
+created and the graph is compiled on first use (see get_mediator_graph).
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Annotated, Optional, TypedDict
+
+from src.models.schemas import ConflictClassification, AgentResponse, Message, MessageType
+from src.classification.preclassifier import extract_user_texts, get_preclassifier
+from src.playbooks.loader import playbook_versions
+from src.prompts.registry import PromptVersion, prompt_registry
+from src.agents.turn_gate import defer_reason, record_deferred
+from src.llm.admission import AdmissionRejected, Priority
+from src.llm.hedging import LLMDeadlineExceeded, get_turn_deadline_seconds
+from src.llm.quotas import QuotaExceeded, QuotaScope, get_spend_quotas, spending
+from src.llm.turn_routing import record_turn_route, route_turn
+from src.observability.metrics import metrics
+from src.observability.tracing import traced, tracer
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_TEXT = (
+    "Мне нужно чуть больше времени, чтобы обдумать ответ 🤍\n\n"
+    "Пожалуйста, напишите ещё раз через минуту."
+)
+
+BUSY_TEXT = (
+    "Сейчас у меня очень много разговоров, и я не успеваю ответить сразу 🤍\n\n"
+    "Пожалуйста, подождите немного и напишите ещё раз."
+)
+
+QUOTA_TEXT = (
+    "Мы сегодня очень много успели обсудить, и мне нужна небольшая пауза 🤍\n\n"
+    "Пожалуйста, вернитесь к разговору немного позже."
+)
 
 
 class MediatorState(TypedDict):
     """State for mediator workflow."""
     session_id: str
-    messages: Annotated[List[Dict[str, str]], add_messages]
+    messages: List[Dict[str, str]]  # reduced with add_messages inside the graph
     current_agent: str
     classification: ConflictClassification | None
     last_response: Dict | None
+    deadline: float | None  # absolute time.monotonic() deadline for this turn
+    prompt_versions: Dict[str, str] | None  # prompt name -> version used this turn
+    candidates: int | None  # completions to request per LLM call (1 = no spares)
+    alternatives: List[Dict] | None  # spare responses for this turn, same agent/classification
+
+
+_onboarding_agent = None
+_therapy_agent = None
+_mediator_graph = None
+
+
+def get_onboarding_agent():
+    """Create the onboarding agent on first use."""
+    global _onboarding_agent
+    if _onboarding_agent is None:
+        from src.agents.onboarding import OnboardingAgent
+        _onboarding_agent = OnboardingAgent()
+    return _onboarding_agent
+
+
+def get_therapy_agent():
+    """Create the therapy agent on first use."""
+    global _therapy_agent
+    if _therapy_agent is None:
+        from src.agents.therapy import TherapyAgent
+        _therapy_agent = TherapyAgent()
+    return _therapy_agent
+
+
+def _record_prompt(state: MediatorState, prompt: PromptVersion) -> Dict[str, str]:
+    """Remember which prompt version served this turn."""
+    metrics.inc("prompt_turns_total", prompt=prompt.name, version=prompt.version)
+    return {**(state.get("prompt_versions") or {}), prompt.name: prompt.version}
+
+
+def _preclassify(messages) -> ConflictClassification | None:
+    """Run the local pre-classifier over user turns (None if no model is trained)."""
+    model = get_preclassifier()
+    if model is None:
+        return None
+    return model.predict("\n".join(extract_user_texts(messages)))
 
 
-# Initialize agents
-onboarding_agent = OnboardingAgent()
-therapy_agent = TherapyAgent()
+def _can_hand_off_early(messages, hint: ConflictClassification | None) -> bool:
+    """
+    Early handoff (opt-in with PRECLASSIFIER_EARLY_HANDOFF=1) needs a confident
+    prediction and enough input from both partners.
+    """
+    if os.getenv("PRECLASSIFIER_EARLY_HANDOFF", "0") != "1":
+        return False
+    if hint is None or hint.confidence < float(os.getenv("PRECLASSIFIER_HANDOFF_CONFIDENCE", "0.9")):
+        return False
+    texts = [
+        (m.get("content") if isinstance(m, dict) else getattr(m, "content", "")) or ""
+        for m in messages
+    ]
+    spoke = {role for role in ("user_1", "user_2") if any(t.startswith(f"[{role}]") for t in texts)}
+    user_turns = len(extract_user_texts(messages))
+    return len(spoke) == 2 and user_turns >= int(os.getenv("PRECLASSIFIER_MIN_TURNS", "4"))
 
 
-def onboarding_node(state: MediatorState) -> MediatorState:
+@traced("node.onboarding")
+async def onboarding_node(state: MediatorState) -> MediatorState:
     """Execute onboarding agent."""
-    response = onboarding_agent.process(state["messages"])
+    hint = _preclassify(state["messages"])
+    
+    if _can_hand_off_early(state["messages"], hint):
+        # Skip the onboarding LLM call: therapy runs next in the same turn
+        metrics.inc("preclassifier_early_handoffs_total")
+        return {
+            **state,
+            "current_agent": "therapy",
+            "classification": hint,
+            "last_response": AgentResponse(messages=[], handoff=True, classification=hint).model_dump(),
+        }
+    
+    if hint is not None and hint.confidence < float(os.getenv("PRECLASSIFIER_HINT_CONFIDENCE", "0.6")):
+        hint = None
+    if hint is not None:
+        metrics.inc("preclassifier_hints_total")
+    
+    # The very first reply decides whether the couple stays: serve it first
+    first_turn = len(extract_user_texts(state["messages"])) <= 1
+    prompt = prompt_registry.get("onboarding.md")
+    route = route_turn(state["messages"], "onboarding", hint)
+    started = time.monotonic()
+    response = await get_onboarding_agent().process(
+        state["messages"],
+        deadline=state.get("deadline"),
+        classification_hint=hint,
+        prompt=prompt,
+        priority=Priority.FIRST_TURN if first_turn else Priority.ONBOARDING,
+        fairness_key=state.get("session_id") or "",
+        candidates=state.get("candidates") or 1,
+        model=route.model,
+    )
+    record_turn_route(route, "onboarding", time.monotonic() - started, [m.type.value for m in response.messages])
     
     # Update state
     new_state = {
         **state,
         "last_response": response.model_dump(),
+        "prompt_versions": _record_prompt(state, prompt),
+        # A spare that hands off would lead to a different state: only keep like-for-like ones
+        "alternatives": [] if response.handoff else [
+            alt.model_dump() for alt in response.alternatives if not alt.handoff
+        ],
     }
     
     # Check for handoff
@@ -40,7 +163,8 @@ def onboarding_node(state: MediatorState) -> MediatorState:
     return new_state
 
 
-def therapy_node(state: MediatorState) -> MediatorState:
+@traced("node.therapy")
+async def therapy_node(state: MediatorState) -> MediatorState:
     """Execute therapy agent with specialized approach."""
     classification = state.get("classification")
     
@@ -51,16 +175,29 @@ def therapy_node(state: MediatorState) -> MediatorState:
     if isinstance(classification, dict):
         classification = ConflictClassification.model_validate(classification)
     
-    response = therapy_agent.process(
+    prompt = prompt_registry.get("therapy.md")
+    # No await before the agent builds its prompt, so these are the playbooks it reads
+    playbooks = playbook_versions(classification)
+    route = route_turn(state["messages"], "therapy", classification)
+    started = time.monotonic()
+    response = await get_therapy_agent().process(
         state["messages"],
-        classification
+        classification,
+        deadline=state.get("deadline"),
+        prompt=prompt,
+        fairness_key=state.get("session_id") or "",
+        candidates=state.get("candidates") or 1,
+        model=route.model,
     )
+    record_turn_route(route, "therapy", time.monotonic() - started, [m.type.value for m in response.messages])
     
     # Update state
     return {
         **state,
         "last_response": response.model_dump(),
         "classification": classification,
+        "prompt_versions": {**_record_prompt(state, prompt), **playbooks},
+        "alternatives": [alt.model_dump() for alt in response.alternatives],
     }
 
 
@@ -79,16 +216,29 @@ def route_agent(state: MediatorState) -> str:
 
 def should_continue(state: MediatorState) -> str:
     """Decide if workflow should continue or end."""
+    from langgraph.graph import END
+
     # If we have a response, we're done for this turn
     if state.get("last_response"):
         return END
     return "continue"
 
 
+def _graph_state_schema():
+    """MediatorState with the add_messages reducer (needs langgraph, so built lazily)."""
+    from langgraph.graph.message import add_messages
+
+    fields = dict(MediatorState.__annotations__)
+    fields["messages"] = Annotated[List[Dict[str, str]], add_messages]
+    return TypedDict("MediatorGraphState", fields)
+
+
 # Build the graph
-def build_mediator_graph():
-    """Build LangGraph workflow."""
-    workflow = StateGraph(MediatorState)
+def build_mediator_graph(checkpointer=None):
+    """Build LangGraph workflow (optionally persisting state per thread_id)."""
+    from langgraph.graph import StateGraph, END
+
+    workflow = StateGraph(_graph_state_schema())
     
     # Add nodes
     workflow.add_node("onboarding", onboarding_node)
@@ -126,11 +276,113 @@ def build_mediator_graph():
     # Therapy always ends
     workflow.add_edge("therapy", END)
     
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def build_direct_executor():
+    """Build the LangGraph-free executor over the same nodes and routing."""
+    from src.agents.executor import DirectExecutor
 
+    return DirectExecutor(onboarding_node, therapy_node, route_agent)
 
-# Global graph instance
-mediator_graph = build_mediator_graph()
+
+def get_mediator_graph():
+    """
+    Build the workflow runner on first use and reuse it afterwards.
+
+    MEDIATOR_EXECUTOR selects the runtime: "langgraph" (default) or "direct".
+    Both expose `ainvoke(state) -> state`.
+    """
+    global _mediator_graph
+    if _mediator_graph is None:
+        if os.getenv("MEDIATOR_EXECUTOR", "langgraph") == "direct":
+            _mediator_graph = build_direct_executor()
+        else:
+            _mediator_graph = build_mediator_graph()
+    return _mediator_graph
+
+
+async def warm_up():
+    """
+    Do the first turn's setup before traffic is accepted: load and compile
+    prompts, create agents and the workflow, open pooled LLM connections.
+
+    Disable with MEDIATOR_WARMUP=0.
+    """
+    if os.getenv("MEDIATOR_WARMUP", "1") == "0":
+        return
+    from src.agents.checkpointed import checkpointing_enabled, get_checkpointed_graph
+    from src.llm.http_pool import warm_connections
+    from src.llm.routing import Endpoint, load_endpoints
+
+    def build():
+        for path in sorted(prompt_registry.prompts_dir.rglob("*.md")):
+            prompt_registry.get(str(path.relative_to(prompt_registry.prompts_dir)))
+        get_preclassifier()
+        get_onboarding_agent()
+        get_therapy_agent()
+        get_mediator_graph()
+        import langchain_openai  # noqa: F401  (chat clients are created on the loop below)
+
+    started = time.monotonic()
+    with tracer.span("mediator.warm_up"):
+        await asyncio.gather(
+            asyncio.to_thread(build),
+            warm_connections(load_endpoints() or [Endpoint(name="default")]),
+        )
+        for agent in (get_onboarding_agent(), get_therapy_agent()):
+            agent.llm.warm_clients()
+        if checkpointing_enabled():
+            await get_checkpointed_graph()
+    logger.info("Warm-up done in %.2fs", time.monotonic() - started)
+
+
+def __getattr__(name: str):
+    # Backwards compatibility for the former module-level globals
+    if name == "mediator_graph":
+        return get_mediator_graph()
+    if name == "onboarding_agent":
+        return get_onboarding_agent()
+    if name == "therapy_agent":
+        return get_therapy_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _last_user_role(messages: List[Dict[str, str]]) -> str:
+    """Find who wrote the last user message ("[user_2]: ..." -> "user_2")."""
+    for msg in reversed(messages):
+        if isinstance(msg, dict):
+            role, content = msg.get("role"), msg.get("content") or ""
+        else:
+            role, content = getattr(msg, "type", None), getattr(msg, "content", "") or ""
+        if role in ("user", "human"):
+            return "user_2" if content.startswith("[user_2]") else "user_1"
+    return "user_1"
+
+
+def build_fallback_response(messages: List[Dict[str, str]], text: str = FALLBACK_TEXT) -> AgentResponse:
+    """Graceful reply used when the turn deadline runs out, the LLM queue is full or a quota is spent."""
+    return AgentResponse(
+        messages=[Message(
+            recipient=_last_user_role(messages),
+            type=MessageType.OTHER,
+            text=text,
+        )],
+        handoff=False,
+    )
+
+
+def deferred_result(current_agent: str, classification) -> Dict:
+    """Result of a turn held back by the turn-taking gate: nothing to send, nothing to store."""
+    return {
+        "response": AgentResponse(messages=[]).model_dump(),
+        "current_agent": current_agent,
+        "classification": classification,
+        "fallback": True,
+        "deferred": True,
+        "prompt_versions": {},
+        "alternatives": [],
+    }
 
 
 async def process_message(
@@ -138,6 +390,9 @@ async def process_message(
     messages: List[Dict[str, str]],
     current_agent: str = "onboarding",
     classification: ConflictClassification | None = None,
+    deadline_s: Optional[float] = None,
+    candidates: int = 1,
+    quota_scope: Optional[QuotaScope] = None,
 ) -> Dict:
     """
     Process a message through the mediator workflow.
@@ -147,24 +402,85 @@ async def process_message(
         messages: Full conversation history
         current_agent: Current agent ("onboarding" or "therapy")
         classification: Conflict classification (if available)
+        deadline_s: Per-turn budget in seconds (default: TURN_DEADLINE_SECONDS)
+        candidates: Completions to request from the LLM; the spares are
+            returned as "alternatives" (e.g. to serve regenerate from cache)
+        quota_scope: User and partnership charged for the LLM calls (None = no quota)
     
     Returns:
-        Dict with response and updated state
+        Dict with response, updated state, the prompt versions used
+        ("prompt_versions") and spare responses ("alternatives"). If the deadline ran out, the LLM queue is
+        full or the spend quota is exhausted, "fallback" is True and the response is a placeholder that
+        should be delivered but not stored in history. A message deferred by the turn-taking gate
+        (the mediator waits for the other partner) returns an empty fallback with "deferred": True.
     """
-    initial_state = MediatorState(
-        session_id=session_id,
-        messages=messages,
-        current_agent=current_agent,
-        classification=classification,
-        last_response=None,
-    )
-    
-    # Run the graph
-    result = await mediator_graph.ainvoke(initial_state)
-    
-    return {
-        "response": result.get("last_response"),
-        "current_agent": result.get("current_agent"),
-        "classification": result.get("classification"),
-    }
+    with tracer.span(
+        "mediator.process_message", session_id=session_id, agent=current_agent, history_messages=len(messages),
+        history_chars=sum(len(m.get("content") or "") for m in messages if isinstance(m, dict)),
+    ):
+        reason = defer_reason(messages)
+        if reason is not None:
+            record_deferred(session_id, current_agent, reason, messages)
+            return deferred_result(current_agent, classification)
+
+        budget = deadline_s if deadline_s is not None else get_turn_deadline_seconds()
+        initial_state = MediatorState(
+            session_id=session_id,
+            messages=messages,
+            current_agent=current_agent,
+            classification=classification,
+            last_response=None,
+            deadline=time.monotonic() + budget,
+            prompt_versions={},
+            candidates=candidates,
+            alternatives=None,
+        )
+        
+        # Run the graph
+        try:
+            spend = await get_spend_quotas().admit(quota_scope, initial_state["deadline"])
+            with spending(spend):
+                result = await get_mediator_graph().ainvoke(initial_state)
+        except QuotaExceeded as exc:
+            logger.warning("Session %s: %s, sending quota reply", session_id, exc)
+            metrics.inc("turn_quota_limited_total", agent=current_agent)
+            return {
+                "response": build_fallback_response(messages, QUOTA_TEXT).model_dump(),
+                "current_agent": current_agent,
+                "classification": classification,
+                "fallback": True,
+                "prompt_versions": {},
+                "alternatives": [],
+            }
+        except LLMDeadlineExceeded as exc:
+            logger.warning("Session %s: %s, sending fallback reply", session_id, exc)
+            metrics.inc("turn_fallbacks_total", agent=current_agent)
+            return {
+                "response": build_fallback_response(messages).model_dump(),
+                "current_agent": current_agent,
+                "classification": classification,
+                "fallback": True,
+                "prompt_versions": {},
+                "alternatives": [],
+            }
+        except AdmissionRejected as exc:
+            logger.warning("Session %s: %s, sending busy reply", session_id, exc)
+            metrics.inc("turn_busy_total", agent=current_agent)
+            return {
+                "response": build_fallback_response(messages, BUSY_TEXT).model_dump(),
+                "current_agent": current_agent,
+                "classification": classification,
+                "fallback": True,
+                "prompt_versions": {},
+                "alternatives": [],
+            }
+        
+        return {
+            "response": result.get("last_response"),
+            "current_agent": result.get("current_agent"),
+            "classification": result.get("classification"),
+            "fallback": False,
+            "prompt_versions": result.get("prompt_versions") or {},
+            "alternatives": result.get("alternatives") or [],
+        }
 
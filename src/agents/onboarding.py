@@ -1,7 +1,6 @@
 """Onboarding agent - establishes contact, classifies conflict."""
-from pathlib import Path
-from typing import Dict, List
-from langchain_openai import ChatOpenAI
+from json import JSONDecodeError
+from typing import Dict, List, Optional
 from langchain_core.messages import (
     AIMessage,
     BaseMessage,
@@ -9,31 +8,46 @@ from langchain_core.messages import (
     SystemMessage,
 )
 
-from src.models.schemas import AgentResponse, Message, MessageType
+from src.agents.context import compact_history_enabled, encode_assistant_turn
+from src.models.schemas import AgentResponse, ConflictClassification, Message, MessageType
+from src.models.serialization import loads
 from src.classification.classifier import parse_classification_from_response
+from src.llm.admission import Priority
+from src.llm.hedging import invoke_with_deadline
+from src.llm.routing import LLMRouter
+from src.llm.tokens import estimate_messages_tokens
+from src.observability.tracing import tracer
+from src.prompts.registry import PromptVersion, prompt_registry
 
 
-PROMPTS_DIR = Path(__file__).parent.parent.parent / "prompts"
+PROMPT_NAME = "onboarding.md"
 
 
 class OnboardingAgent:
     """Agent for initial engagement and classification (7-10 messages)."""
     
     def __init__(self, model_name: str = "gpt-4.1", temperature: float = 0.7):
-        self.llm = ChatOpenAI(
-            model=model_name,
-            temperature=temperature,
-            model_kwargs={"response_format": {"type": "json_object"}}
+        self.llm = LLMRouter(
+            model_name,
+            temperature,
+            response_format={"type": "json_object"},
         )
-        self.system_prompt = self._load_prompt()
     
-    def _build_lc_messages(self, messages: List[Dict[str, str]]):
+    @property
+    def system_prompt(self) -> str:
+        """Current onboarding prompt (hot-reloaded by the prompt registry)."""
+        return self._load_prompt().compiled
+    
+    def _build_lc_messages(self, messages: List[Dict[str, str]], system_prompt: Optional[str] = None):
         """
         Convert stored history (dicts or LangChain BaseMessage) to LangChain messages.
         LangGraph with add_messages may convert dicts into HumanMessage/AIMessage, so
-        we accept both shapes here.
+        we accept both shapes here. Assistant turns are sent in compact form
+        (see src/agents/context.py).
         """
-        lc_messages = [SystemMessage(content=self.system_prompt)]
+        lc_messages = [SystemMessage(content=system_prompt or self.system_prompt)]
+        compact = compact_history_enabled()
+        saved_chars = 0
         
         for msg in messages:
             role = None
@@ -52,38 +66,87 @@ class OnboardingAgent:
             if role in ("user", "human"):
                 lc_messages.append(HumanMessage(content=content))
             elif role in ("assistant", "ai"):
+                if compact:
+                    encoded = encode_assistant_turn(content)
+                    saved_chars += len(content) - len(encoded)
+                    content = encoded
                 lc_messages.append(AIMessage(content=content))
             elif role == "system":
                 lc_messages.append(SystemMessage(content=content))
         
+        span = tracer.current_span()
+        if span is not None and saved_chars:
+            span.set(history_chars_saved=saved_chars)
         return lc_messages
     
-    def _load_prompt(self) -> str:
-        """Load onboarding prompt from file."""
-        prompt_path = PROMPTS_DIR / "onboarding.md"
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            return f.read()
+    @staticmethod
+    def _format_hint(hint: ConflictClassification) -> str:
+        """Render pre-classifier output as a system hint."""
+        return (
+            "Подсказка локального классификатора (может ошибаться, проверь по диалогу): "
+            f"resolvability={hint.resolvability.value}, domain={hint.domain.value}, "
+            f"nature={hint.nature.value}, form={hint.form.value}, "
+            f"threat_level={hint.threat_level.value}, confidence={hint.confidence:.2f}. "
+            "Если картина уже ясна, можно переходить к handoff раньше."
+        )
+    
+    def _load_prompt(self) -> PromptVersion:
+        """Get current onboarding prompt version from the registry."""
+        return prompt_registry.get(PROMPT_NAME)
     
-    def process(self, messages: List[Dict[str, str]]) -> AgentResponse:
+    async def process(
+        self,
+        messages: List[Dict[str, str]],
+        deadline: Optional[float] = None,
+        classification_hint: Optional[ConflictClassification] = None,
+        prompt: Optional[PromptVersion] = None,
+        priority: Priority = Priority.ONBOARDING,
+        fairness_key: str = "",
+        candidates: int = 1,
+        model: Optional[str] = None,
+    ) -> AgentResponse:
         """
         Process conversation and generate response.
         
         Args:
             messages: Full conversation history [{"role": "user", "content": "[user_1]: ..."}, ...]
+            deadline: Absolute time.monotonic() deadline for the LLM call (None = no limit)
+            classification_hint: Local pre-classifier guess, shown to the model as a hint
+            prompt: Prompt snapshot to use for this turn (default: current version)
+            priority: Admission priority class of the LLM call
+            fairness_key: Session id used for fair queuing between couples
+            candidates: Completions to request; spares go to `alternatives`
+            model: Model for this turn instead of the agent's (light turns)
         
         Returns:
             AgentResponse with messages and optionally handoff signal
         """
-        lc_messages = self._build_lc_messages(messages)
+        with tracer.span("prompt.build", agent="onboarding", history_messages=len(messages)) as span:
+            prompt = prompt or self._load_prompt()
+            lc_messages = self._build_lc_messages(messages, prompt.compiled)
+            
+            if classification_hint:
+                lc_messages.append(SystemMessage(content=self._format_hint(classification_hint)))
+            span.set(prompt_version=prompt.version, prompt_tokens=estimate_messages_tokens(lc_messages))
         
         # Get response from LLM
-        response = self.llm.invoke(lc_messages)
+        response = await invoke_with_deadline(
+            self.llm, lc_messages, deadline=deadline, agent="onboarding",
+            priority=priority, fairness_key=fairness_key, candidates=candidates, model=model,
+        )
         response_text = response.content.strip()
         
+        with tracer.span("llm.parse", agent="onboarding", response_chars=len(response_text)):
+            parsed = self._parse_response(response_text)
+            spares = (getattr(response, "response_metadata", None) or {}).get("candidates", [])
+            parsed.alternatives = [self._parse_response(text.strip()) for text in spares]
+            return parsed
+    
+    def _parse_response(self, response_text: str) -> AgentResponse:
+        """Convert the model's JSON answer into an AgentResponse."""
         # Try to parse as JSON (structured response)
         try:
-            import json
-            response_data = json.loads(response_text)
+            response_data = loads(response_text)
             
             # Check for handoff
             handoff = response_data.get("handoff", False)
@@ -91,7 +154,7 @@ class OnboardingAgent:
             # Parse classification if present
             classification = None
             if handoff:
-                classification = parse_classification_from_response(response_text)
+                classification = parse_classification_from_response(response_data)
             
             # Parse messages
             agent_messages = []
@@ -116,7 +179,7 @@ class OnboardingAgent:
                 classification=classification
             )
             
-        except json.JSONDecodeError:
+        except JSONDecodeError:
             # Fallback: treat as plain text response to user_1
             print(f"Warning: Onboarding agent returned non-JSON: {response_text[:100]}")
             return AgentResponse(
@@ -1,7 +1,7 @@
 """Therapy agent - deep work with conflict using specialized approaches."""
-from pathlib import Path
-from typing import Dict, List
-from langchain_openai import ChatOpenAI
+import os
+from json import JSONDecodeError
+from typing import Dict, List, Optional, Tuple
 from langchain_core.messages import (
     AIMessage,
     BaseMessage,
@@ -9,51 +9,101 @@ from langchain_core.messages import (
     SystemMessage,
 )
 
+from src.agents.context import compact_history_enabled, encode_assistant_turn
 from src.models.schemas import AgentResponse, Message, MessageType, ConflictClassification
+from src.models.serialization import loads
 from src.playbooks.loader import load_selected_playbooks
+from src.playbooks.retrieval import get_playbook_index, load_relevant_playbook_sections
+from src.llm.admission import Priority
+from src.llm.hedging import invoke_with_deadline
+from src.llm.routing import LLMRouter
+from src.llm.tokens import estimate_messages_tokens, estimate_tokens
+from src.observability.tracing import tracer
+from src.prompts.compiler import dedupe_lines
+from src.prompts.registry import PromptVersion, prompt_registry
 
 
-PROMPTS_DIR = Path(__file__).parent.parent.parent / "prompts"
+PROMPT_NAME = "therapy.md"
+PLAYBOOK_PLACEHOLDER = "{PLAYBOOK_CONTENT_WILL_BE_INSERTED_HERE}"
 
 
 class TherapyAgent:
     """Agent for deep conflict resolution work with psychological approaches."""
     
     def __init__(self, model_name: str = "gpt-4.1", temperature: float = 0.7):
-        self.llm = ChatOpenAI(
-            model=model_name,
-            temperature=temperature,
-            model_kwargs={"response_format": {"type": "json_object"}}
+        self.llm = LLMRouter(
+            model_name,
+            temperature,
+            response_format={"type": "json_object"},
         )
-        self.base_prompt = self._load_base_prompt()
+        # (prompt version, classification axes) -> prompt with classification injected
+        self._compiled_prompts: Dict[Tuple, str] = {}
+        prompt_registry.subscribe(self._on_prompt_changed)
+        self.use_retrieval = os.getenv("PLAYBOOK_RETRIEVAL", "1") != "0"
+        if self.use_retrieval:
+            # Build the section index at startup, not on the first therapy turn
+            get_playbook_index()
     
-    def _load_base_prompt(self) -> str:
-        """Load therapy base prompt from file."""
-        prompt_path = PROMPTS_DIR / "therapy.md"
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            return f.read()
+    @property
+    def base_prompt(self) -> str:
+        """Current therapy prompt (hot-reloaded by the prompt registry)."""
+        return self._load_base_prompt().compiled
     
-    def _build_system_prompt(self, classification: ConflictClassification) -> str:
+    def _load_base_prompt(self) -> PromptVersion:
+        """Get current therapy prompt version from the registry."""
+        return prompt_registry.get(PROMPT_NAME)
+    
+    def _on_prompt_changed(self, prompt: PromptVersion):
+        """Drop compiled prompts built from an outdated therapy.md."""
+        if prompt.name == PROMPT_NAME:
+            self._compiled_prompts = {}
+    
+    def _compile_base_prompt(self, prompt: PromptVersion, classification: ConflictClassification) -> str:
+        """Inject classification into the base prompt (cached per prompt version)."""
+        key = (
+            prompt.version,
+            classification.resolvability.value,
+            classification.domain.value,
+            classification.nature.value,
+            classification.form.value,
+            classification.threat_level.value,
+        )
+        compiled = self._compiled_prompts.get(key)
+        if compiled is None:
+            compiled = prompt.compiled
+            compiled = compiled.replace("{resolvability}", classification.resolvability.value)
+            compiled = compiled.replace("{domain}", classification.domain.value)
+            compiled = compiled.replace("{nature}", classification.nature.value)
+            compiled = compiled.replace("{form}", classification.form.value)
+            compiled = compiled.replace("{threat_level}", classification.threat_level.value)
+            self._compiled_prompts[key] = compiled
+        return compiled
+    
+    def _build_system_prompt(
+        self,
+        classification: ConflictClassification,
+        messages: Optional[List[Dict[str, str]]] = None,
+        prompt: Optional[PromptVersion] = None,
+    ) -> str:
         """
         Build complete system prompt with classification and playbooks.
         
         Format:
         - Base therapy.md prompt
         - Classification injected
-        - Playbooks appended
+        - Playbooks appended (only sections relevant to recent messages
+          when PLAYBOOK_RETRIEVAL is on, whole files otherwise), without
+          lines the base prompt or an earlier playbook already contains
         """
         # Load playbooks
-        playbooks_content = load_selected_playbooks(classification)
-        
-        prompt = self.base_prompt
-        prompt = prompt.replace("{resolvability}", classification.resolvability.value)
-        prompt = prompt.replace("{domain}", classification.domain.value)
-        prompt = prompt.replace("{nature}", classification.nature.value)
-        prompt = prompt.replace("{form}", classification.form.value)
-        prompt = prompt.replace("{threat_level}", classification.threat_level.value)
-        prompt = prompt.replace("{PLAYBOOK_CONTENT_WILL_BE_INSERTED_HERE}", playbooks_content)
+        if self.use_retrieval and messages is not None:
+            playbooks_content = load_relevant_playbook_sections(classification, messages)
+        else:
+            playbooks_content = load_selected_playbooks(classification)
         
-        return prompt
+        compiled = self._compile_base_prompt(prompt or self._load_base_prompt(), classification)
+        # Playbooks repeating the base prompt (or each other) add tokens, not guidance
+        return compiled.replace(PLAYBOOK_PLACEHOLDER, dedupe_lines(playbooks_content, compiled))
     
     def _build_lc_messages(
         self,
@@ -63,9 +113,12 @@ class TherapyAgent:
         """
         Convert stored history (dicts or LangChain BaseMessage) to LangChain messages.
         LangGraph with add_messages may convert dicts into HumanMessage/AIMessage, so
-        we accept both shapes here.
+        we accept both shapes here. Assistant turns are sent in compact form
+        (see src/agents/context.py).
         """
         lc_messages = [SystemMessage(content=system_prompt)]
+        compact = compact_history_enabled()
+        saved_chars = 0
         
         for msg in messages:
             role = None
@@ -84,16 +137,28 @@ class TherapyAgent:
             if role in ("user", "human"):
                 lc_messages.append(HumanMessage(content=content))
             elif role in ("assistant", "ai"):
+                if compact:
+                    encoded = encode_assistant_turn(content)
+                    saved_chars += len(content) - len(encoded)
+                    content = encoded
                 lc_messages.append(AIMessage(content=content))
             elif role == "system":
                 lc_messages.append(SystemMessage(content=content))
         
+        span = tracer.current_span()
+        if span is not None and saved_chars:
+            span.set(history_chars_saved=saved_chars)
         return lc_messages
     
-    def process(
+    async def process(
         self, 
         messages: List[Dict[str, str]],
-        classification: ConflictClassification
+        classification: ConflictClassification,
+        deadline: Optional[float] = None,
+        prompt: Optional[PromptVersion] = None,
+        fairness_key: str = "",
+        candidates: int = 1,
+        model: Optional[str] = None,
     ) -> AgentResponse:
         """
         Process conversation with specialized approach.
@@ -101,23 +166,43 @@ class TherapyAgent:
         Args:
             messages: Full conversation history
             classification: Conflict classification from onboarding
+            deadline: Absolute time.monotonic() deadline for the LLM call (None = no limit)
+            prompt: Prompt snapshot to use for this turn (default: current version)
+            fairness_key: Session id used for fair queuing between couples
+            candidates: Completions to request; spares go to `alternatives`
+            model: Model for this turn instead of the agent's (light turns)
         
         Returns:
             AgentResponse with therapeutic messages
         """
-        # Build system prompt with playbooks
-        system_prompt = self._build_system_prompt(classification)
-        
-        lc_messages = self._build_lc_messages(messages, system_prompt)
+        with tracer.span("prompt.build", agent="therapy", history_messages=len(messages)) as span:
+            # Build system prompt with playbooks
+            system_prompt = self._build_system_prompt(classification, messages, prompt)
+            
+            lc_messages = self._build_lc_messages(messages, system_prompt)
+            span.set(
+                system_prompt_tokens=estimate_tokens(system_prompt),
+                prompt_tokens=estimate_messages_tokens(lc_messages),
+            )
         
         # Get response from LLM
-        response = self.llm.invoke(lc_messages)
+        response = await invoke_with_deadline(
+            self.llm, lc_messages, deadline=deadline, agent="therapy",
+            priority=Priority.THERAPY, fairness_key=fairness_key, candidates=candidates, model=model,
+        )
         response_text = response.content.strip()
         
+        with tracer.span("llm.parse", agent="therapy", response_chars=len(response_text)):
+            parsed = self._parse_response(response_text)
+            spares = (getattr(response, "response_metadata", None) or {}).get("candidates", [])
+            parsed.alternatives = [self._parse_response(text.strip()) for text in spares]
+            return parsed
+    
+    def _parse_response(self, response_text: str) -> AgentResponse:
+        """Convert the model's JSON answer into an AgentResponse."""
         # Parse JSON response
         try:
-            import json
-            response_data = json.loads(response_text)
+            response_data = loads(response_text)
             
             # Parse messages
             agent_messages = []
@@ -142,7 +227,7 @@ class TherapyAgent:
                 classification=None
             )
             
-        except json.JSONDecodeError:
+        except JSONDecodeError:
             # Fallback: treat as plain text
             print(f"Warning: Therapy agent returned non-JSON: {response_text[:100]}")
             return AgentResponse(
@@ -0,0 +1,120 @@
+"""Turn-taking gate: skip the LLM call while the mediator waits for the other partner.
+
+The mediator does not write to a partner again before that partner replies
+(see `compute_no_double_messaging` in eval/run_eval.py). Turn state is read
+from the history itself, so it is the same in every process and in
+checkpointed threads:
+
+- awaiting: partners the last assistant turn wrote to who have not replied yet;
+- asked: partners the last assistant turn asked something (a share_request or
+  a question mark);
+- unanswered: senders of the user messages after the last assistant turn.
+
+A message is deferred (stored, no LLM call, nothing sent) when its sender is
+the only one who wrote since the last assistant turn, was not asked anything
+by it, the other partner is still awaited and the message is a bare
+acknowledgement ("ок", "спасибо", 👍). The next call, when the other partner
+answers, sees the deferred messages together with that answer. Anything
+else - an answer to the mediator's question (even "да"/"нет"), substance,
+both partners writing, more than TURN_GATE_MAX_DEFERRED messages in a row -
+runs the agents as usual.
+
+    TURN_GATE               - 0 = never defer (default 1)
+    TURN_GATE_MAX_DEFERRED  - consecutive messages that may be deferred (default 3)
+"""
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, FrozenSet, List, Optional, Tuple
+
+from src.llm.tokens import estimate_messages_tokens
+from src.models.serialization import loads
+from src.observability.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PARTNERS = ("user_1", "user_2")
+
+# Narrower than the light-model routing acks: nothing here can answer a question
+_ACK = re.compile(r"^(ок(ей)?|ok|спасибо|спс|благодарю|👍|🙏|🤝|❤️|🙂)[\s!.,)]*$", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class TurnState:
+    awaiting: FrozenSet[str]  # partners written to by the last assistant turn, no reply yet
+    asked: FrozenSet[str]  # partners the last assistant turn asked something
+    unanswered: Tuple[str, ...]  # senders of user messages after the last assistant turn, in order
+    last_text: str = ""  # text of the latest user message, without the role prefix
+
+
+def _role_content(msg: Any) -> Tuple[Optional[str], str]:
+    if isinstance(msg, dict):
+        return msg.get("role"), msg.get("content") or ""
+    return getattr(msg, "type", None), getattr(msg, "content", "") or ""
+
+
+def _recipients(content: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """Partners an assistant turn wrote to, and those it asked something."""
+    try:
+        data = loads(content)
+    except ValueError:
+        return frozenset(), frozenset()
+    messages = data.get("messages") if isinstance(data, dict) else None
+    messages = [m for m in messages or [] if isinstance(m, dict) and m.get("recipient") in PARTNERS]
+    asked = frozenset(
+        m["recipient"] for m in messages if m.get("type") == "share_request" or "?" in (m.get("text") or "")
+    )
+    return frozenset(m["recipient"] for m in messages), asked
+
+
+def turn_state(messages: List[Any]) -> TurnState:
+    """Who the mediator is waiting for and who is owed a reply, from stored history (dicts or LangChain messages)."""
+    senders: List[str] = []
+    last_text = ""
+    recipients: FrozenSet[str] = frozenset()
+    asked: FrozenSet[str] = frozenset()
+    for msg in reversed(messages):
+        role, content = _role_content(msg)
+        if role in ("user", "human"):
+            sender = "user_2" if content.startswith("[user_2]") else "user_1"
+            if not senders:
+                last_text = content.split(":", 1)[1].strip() if content.startswith("[user_") else content
+            senders.append(sender)
+        elif role in ("assistant", "ai"):
+            recipients, asked = _recipients(content)
+            break
+    return TurnState(
+        awaiting=frozenset(r for r in recipients if r not in senders),
+        asked=asked,
+        unanswered=tuple(reversed(senders)),
+        last_text=last_text,
+    )
+
+
+def defer_reason(messages: List[Any]) -> Optional[str]:
+    """Why the latest message can wait for the other partner (None = call the LLM)."""
+    if os.getenv("TURN_GATE", "1") == "0":
+        return None
+    state = turn_state(messages)
+    if not state.unanswered:
+        return None
+    sender = state.unanswered[-1]
+    other = "user_2" if sender == "user_1" else "user_1"
+    if other not in state.awaiting or any(s != sender for s in state.unanswered):
+        return None
+    if sender in state.asked:
+        return None  # the mediator asked them something: their reply is the answer
+    if len(state.unanswered) > int(os.getenv("TURN_GATE_MAX_DEFERRED", "3")):
+        return None  # the sender keeps writing: answer them
+    if not _ACK.match(state.last_text):
+        return None
+    return "awaiting_partner"
+
+
+def record_deferred(session_id: str, agent: str, reason: str, messages: List[Any]):
+    """Count a skipped LLM call; saved tokens are the history part of the prompt that was not sent."""
+    saved = estimate_messages_tokens(messages)
+    metrics.inc("turn_gate_deferred_total", agent=agent, reason=reason)
+    metrics.inc("turn_gate_saved_prompt_tokens_total", saved, agent=agent)
+    logger.info("Session %s: deferred turn (%s), ~%d prompt tokens saved", session_id, reason, saved)
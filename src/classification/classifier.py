@@ -1,12 +1,17 @@
 """Conflict classification logic."""
 import json
-from typing import Optional
+import logging
+from typing import Any, Dict, Optional, Union
 from src.models.schemas import ConflictClassification, Resolvability, Domain, Nature, Form, ThreatLevel
+from src.models.serialization import loads
 
+logger = logging.getLogger(__name__)
 
-def parse_classification_from_response(response_text: str) -> Optional[ConflictClassification]:
+
+def parse_classification_from_response(response: Union[str, Dict[str, Any]]) -> Optional[ConflictClassification]:
     """
-    Parse classification from onboarding agent's JSON response.
+    Parse classification from onboarding agent's JSON response
+    (raw text or the already parsed dict).
     
     Expected format:
     {
@@ -22,7 +27,7 @@ def parse_classification_from_response(response_text: str) -> Optional[ConflictC
     }
     """
     try:
-        data = json.loads(response_text)
+        data = loads(response) if isinstance(response, (str, bytes)) else response
         
         if not data.get("handoff"):
             # Not ready for handoff yet
@@ -46,10 +51,10 @@ def parse_classification_from_response(response_text: str) -> Optional[ConflictC
         return classification
         
     except json.JSONDecodeError:
-        print(f"Failed to parse JSON from response: {response_text[:200]}")
+        logger.warning("Failed to parse JSON from response: %s", str(response)[:200])
         return None
     except (KeyError, ValueError) as e:
-        print(f"Invalid classification format: {e}")
+        logger.warning("Invalid classification format: %s", e)
         return None
 
 
@@ -0,0 +1,220 @@
+"""Local CPU-only conflict pre-classifier (linear model over character n-grams)."""
+import json
+import math
+import os
+import random
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.models.schemas import ConflictClassification, Resolvability, Domain, Nature, Form, ThreatLevel
+
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+DEFAULT_MODEL_PATH = PROJECT_ROOT / "eval" / "out" / "preclassifier.json"
+
+AXES = {
+    "resolvability": Resolvability,
+    "domain": Domain,
+    "nature": Nature,
+    "form": Form,
+    "threat_level": ThreatLevel,
+}
+
+_ROLE_PREFIX = re.compile(r"^\[user_[12]\]:\s*")
+_WHITESPACE = re.compile(r"\s+")
+
+# Only the most recent text matters for a hint; keeps prediction cost bounded
+MAX_TEXT_CHARS = 4000
+
+
+def extract_user_texts(messages: Iterable) -> List[str]:
+    """Return user message texts (without "[user_x]: " prefix) from stored history."""
+    texts = []
+    for msg in messages:
+        if isinstance(msg, dict):
+            role, content = msg.get("role"), msg.get("content")
+        elif hasattr(msg, "type") and hasattr(msg, "content"):  # LangChain BaseMessage
+            role, content = msg.type, msg.content
+        else:
+            continue
+        if role in ("user", "human") and content:
+            texts.append(_ROLE_PREFIX.sub("", content))
+    return texts
+
+
+def char_ngrams(text: str, n_min: int = 2, n_max: int = 4) -> Dict[str, float]:
+    """L2-normalized character n-gram frequencies."""
+    text = " " + _WHITESPACE.sub(" ", text.lower()[-MAX_TEXT_CHARS:]).strip() + " "
+    counts = Counter()
+    for n in range(n_min, n_max + 1):
+        for i in range(len(text) - n + 1):
+            counts[text[i:i + n]] += 1
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {k: v / norm for k, v in counts.items()}
+
+
+def _softmax(scores: Dict[str, float]) -> Dict[str, float]:
+    top = max(scores.values())
+    exps = {k: math.exp(v - top) for k, v in scores.items()}
+    total = sum(exps.values())
+    return {k: v / total for k, v in exps.items()}
+
+
+class PreClassifier:
+    """
+    One multinomial logistic regression per classification axis.
+
+    Weights are sparse dicts: weights[axis][label][ngram] -> float.
+    """
+
+    def __init__(
+        self,
+        weights: Dict[str, Dict[str, Dict[str, float]]],
+        bias: Dict[str, Dict[str, float]],
+        ngram_range: Tuple[int, int] = (2, 4),
+    ):
+        self.weights = weights
+        self.bias = bias
+        self.ngram_range = tuple(ngram_range)
+
+    @classmethod
+    def fit(
+        cls,
+        examples: List[Tuple[str, Dict[str, str]]],
+        epochs: int = 15,
+        learning_rate: float = 0.5,
+        l2: float = 1e-4,
+        ngram_range: Tuple[int, int] = (2, 4),
+        seed: int = 13,
+    ) -> "PreClassifier":
+        """
+        Train on (text, labels) pairs, labels = {"domain": "money", ...}.
+        """
+        weights = {axis: {e.value: {} for e in enum} for axis, enum in AXES.items()}
+        bias = {axis: {e.value: 0.0 for e in enum} for axis, enum in AXES.items()}
+        model = cls(weights, bias, ngram_range)
+
+        featurized = [(char_ngrams(text, *ngram_range), labels) for text, labels in examples]
+        rng = random.Random(seed)
+
+        for epoch in range(epochs):
+            rng.shuffle(featurized)
+            lr = learning_rate / (1 + epoch)
+            for features, labels in featurized:
+                for axis, gold in labels.items():
+                    if axis not in AXES or gold not in weights[axis]:
+                        continue
+                    probs = model._axis_proba(axis, features)
+                    for label, prob in probs.items():
+                        grad = (1.0 if label == gold else 0.0) - prob
+                        w = weights[axis][label]
+                        for feat, value in features.items():
+                            w[feat] = w.get(feat, 0.0) * (1 - lr * l2) + lr * grad * value
+                        bias[axis][label] += lr * grad
+
+        # Drop near-zero weights to keep the model file small
+        for axis_weights in weights.values():
+            for label, w in axis_weights.items():
+                axis_weights[label] = {k: round(v, 5) for k, v in w.items() if abs(v) > 1e-4}
+
+        return model
+
+    def _axis_proba(self, axis: str, features: Dict[str, float]) -> Dict[str, float]:
+        scores = {}
+        for label, w in self.weights[axis].items():
+            score = self.bias[axis][label]
+            for feat, value in features.items():
+                score += w.get(feat, 0.0) * value
+            scores[label] = score
+        return _softmax(scores)
+
+    def predict_proba(self, text: str) -> Dict[str, Dict[str, float]]:
+        """Per-axis label probabilities."""
+        features = char_ngrams(text, *self.ngram_range)
+        return {axis: self._axis_proba(axis, features) for axis in AXES}
+
+    def predict(self, text: str) -> Optional[ConflictClassification]:
+        """
+        Predict all five axes. Confidence is the lowest per-axis probability
+        of the chosen label, so one uncertain axis makes the whole hint weak.
+        """
+        if not text.strip():
+            return None
+        proba = self.predict_proba(text)
+        chosen = {axis: max(p.items(), key=lambda kv: kv[1]) for axis, p in proba.items()}
+        confidence = min(prob for _, prob in chosen.values())
+        return ConflictClassification(
+            resolvability=Resolvability(chosen["resolvability"][0]),
+            domain=Domain(chosen["domain"][0]),
+            nature=Nature(chosen["nature"][0]),
+            form=Form(chosen["form"][0]),
+            threat_level=ThreatLevel(chosen["threat_level"][0]),
+            confidence=round(confidence, 4),
+            reasoning="local pre-classifier",
+        )
+
+    def save(self, path: Path):
+        data = {"ngram_range": list(self.ngram_range), "weights": self.weights, "bias": self.bias}
+        Path(path).write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path) -> "PreClassifier":
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        return cls(data["weights"], data["bias"], tuple(data.get("ngram_range", (2, 4))))
+
+
+def _turn_labels(turn: Dict) -> Optional[Dict]:
+    """Classification recorded on a transcript turn (parsed, or inside the raw agent response)."""
+    raw = turn.get("raw_response")
+    return turn.get("classification") or (raw.get("classification") if isinstance(raw, dict) else None)
+
+
+def build_training_examples(records: Iterable[Dict]) -> List[Tuple[str, Dict[str, str]]]:
+    """
+    Build (text, labels) pairs from labeled conversations.
+
+    Accepts eval transcript records ({"turns": [...]} with per-turn
+    "classification", or the one in the turn's "raw_response") and exported
+    sessions ({"messages": [...], "classification": {...}}). Every prefix of
+    user turns up to the handoff becomes an example, so the model also learns
+    from partial conversations.
+    """
+    examples = []
+    for record in records:
+        if "turns" in record:
+            labels, texts = None, []
+            for turn in record.get("turns") or []:
+                texts.append(turn.get("user_text", ""))
+                labels = _turn_labels(turn)
+                if labels:
+                    break
+        else:
+            labels = record.get("classification")
+            texts = extract_user_texts(record.get("messages", []))
+
+        if not labels or not texts:
+            continue
+        labels = {axis: labels[axis] for axis in AXES if labels.get(axis)}
+        for i in range(1, len(texts) + 1):
+            examples.append(("\n".join(texts[:i]), labels))
+    return examples
+
+
+_model: Optional[PreClassifier] = None
+_model_loaded = False
+
+
+def get_preclassifier() -> Optional[PreClassifier]:
+    """Load the trained model once (PRECLASSIFIER_PATH); None if not trained yet."""
+    global _model, _model_loaded
+    if not _model_loaded:
+        path = Path(os.getenv("PRECLASSIFIER_PATH", str(DEFAULT_MODEL_PATH)))
+        if path.exists():
+            try:
+                _model = PreClassifier.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Warning: Could not load pre-classifier from {path}: {e}")
+        _model_loaded = True
+    return _model
@@ -0,0 +1,46 @@
+"""LLM invocation helpers shared by agents."""
+from .admission import (
+    AdmissionRejected,
+    Priority,
+    get_admission_controller,
+)
+from .hedging import (
+    LLMDeadlineExceeded,
+    get_turn_deadline_seconds,
+    invoke_with_deadline,
+)
+from .http_pool import (
+    close_http_pool,
+    get_async_http_client,
+    warm_connections,
+)
+from .quotas import (
+    QuotaExceeded,
+    QuotaScope,
+    get_spend_quotas,
+)
+from .routing import (
+    Endpoint,
+    LLMRouter,
+    NoHealthyEndpoint,
+    endpoints_snapshot,
+)
+
+__all__ = [
+    "AdmissionRejected",
+    "Endpoint",
+    "LLMDeadlineExceeded",
+    "LLMRouter",
+    "NoHealthyEndpoint",
+    "Priority",
+    "QuotaExceeded",
+    "QuotaScope",
+    "close_http_pool",
+    "endpoints_snapshot",
+    "get_async_http_client",
+    "get_admission_controller",
+    "get_spend_quotas",
+    "get_turn_deadline_seconds",
+    "invoke_with_deadline",
+    "warm_connections",
+]
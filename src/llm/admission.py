@@ -0,0 +1,239 @@
+"""Global admission control for LLM calls: concurrency cap, token budget, priorities, fairness."""
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Deque, Dict, Optional
+
+from src.observability.metrics import metrics
+
+
+class Priority(IntEnum):
+    """Lower value is served first."""
+    FIRST_TURN = 0  # first onboarding reply: the user is deciding whether to stay
+    ONBOARDING = 1
+    THERAPY = 2
+
+
+class AdmissionRejected(Exception):
+    """Queues are full: the caller should answer "busy, please wait" right away."""
+
+
+@dataclass
+class Ticket:
+    """A granted LLM slot; pass back to `release`."""
+    tokens: int
+    priority: Priority
+    key: str
+    released: bool = False
+
+
+@dataclass
+class _Waiter:
+    ticket: Ticket
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class AdmissionController:
+    """
+    Admits LLM calls under a concurrency cap and a tokens-per-minute budget.
+
+    Waiting calls are served by priority class, and round-robin across
+    fairness keys (session/partnership) inside a class, so one chatty couple
+    cannot starve others. When the queue is full, `acquire` fails fast with
+    AdmissionRejected instead of making everyone wait longer.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        tokens_per_minute: int = 0,
+        max_queue: int = 100,
+        max_queue_per_key: int = 3,
+    ):
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute  # 0 = no token budget
+        self.max_queue = max_queue
+        self.max_queue_per_key = max_queue_per_key
+
+        self._active = 0
+        self._queued = 0
+        # priority -> fairness key -> waiters; key order is the round-robin order
+        self._queues: Dict[Priority, "OrderedDict[str, Deque[_Waiter]]"] = {p: OrderedDict() for p in Priority}
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+            tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", "0")),
+            max_queue=int(os.getenv("LLM_MAX_QUEUE", "100")),
+            max_queue_per_key=int(os.getenv("LLM_MAX_QUEUE_PER_SESSION", "3")),
+        )
+
+    # --- token bucket ---
+
+    def _refill(self):
+        if not self.tokens_per_minute:
+            return
+        now = time.monotonic()
+        self._tokens = min(
+            float(self.tokens_per_minute),
+            self._tokens + (now - self._refilled_at) * self.tokens_per_minute / 60.0,
+        )
+        self._refilled_at = now
+
+    def _has_tokens(self, tokens: int) -> bool:
+        if not self.tokens_per_minute:
+            return True
+        # A request larger than the whole budget still passes once the bucket is full
+        return self._tokens >= min(tokens, self.tokens_per_minute)
+
+    def _seconds_until_tokens(self, tokens: int) -> float:
+        missing = min(tokens, self.tokens_per_minute) - self._tokens
+        return max(missing, 0.0) * 60.0 / self.tokens_per_minute
+
+    # --- scheduling ---
+
+    def _can_admit_now(self, tokens: int) -> bool:
+        self._refill()
+        return self._queued == 0 and self._active < self.max_concurrency and self._has_tokens(tokens)
+
+    def _grant(self, ticket: Ticket):
+        self._active += 1
+        if self.tokens_per_minute:
+            self._tokens -= ticket.tokens
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        for priority in Priority:
+            queue = self._queues[priority]
+            while queue:
+                key, waiters = next(iter(queue.items()))
+                while waiters and waiters[0].future.done():
+                    waiters.popleft()  # timed out / cancelled
+                    self._queued -= 1
+                if waiters:
+                    return waiters[0]
+                del queue[key]
+        return None
+
+    def _pop(self, waiter: _Waiter):
+        queue = self._queues[waiter.ticket.priority]
+        waiters = queue[waiter.ticket.key]
+        waiters.popleft()
+        self._queued -= 1
+        if waiters:
+            queue.move_to_end(waiter.ticket.key)  # next caller of this key waits its turn
+        else:
+            del queue[waiter.ticket.key]
+
+    def _dispatch(self):
+        # At most one pending wake-up: every dispatch re-plans it from scratch
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        self._refill()
+        while self._active < self.max_concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            if not self._has_tokens(waiter.ticket.tokens):
+                delay = self._seconds_until_tokens(waiter.ticket.tokens)
+                self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            self._pop(waiter)
+            self._grant(waiter.ticket)
+            metrics.inc("llm_admission_wait_seconds_total", time.monotonic() - waiter.enqueued_at)
+            waiter.future.set_result(True)
+
+    def _remove(self, waiter: _Waiter):
+        queue = self._queues[waiter.ticket.priority]
+        waiters = queue.get(waiter.ticket.key)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            self._queued -= 1
+            if not waiters:
+                del queue[waiter.ticket.key]
+
+    # --- public API ---
+
+    def try_acquire(self, priority: Priority, key: str, tokens: int) -> Optional[Ticket]:
+        """Grant a slot only if one is free right now (used for hedged requests)."""
+        if not self._can_admit_now(tokens):
+            return None
+        ticket = Ticket(tokens=tokens, priority=priority, key=key)
+        self._grant(ticket)
+        return ticket
+
+    async def acquire(
+        self,
+        priority: Priority,
+        key: str,
+        tokens: int,
+        deadline: Optional[float] = None,
+    ) -> Ticket:
+        """
+        Wait for a slot.
+
+        Raises:
+            AdmissionRejected: queue (global or for this key) is full
+            asyncio.TimeoutError: the deadline passed while waiting
+        """
+        ticket = Ticket(tokens=tokens, priority=priority, key=key)
+        if self._can_admit_now(tokens):
+            self._grant(ticket)
+            metrics.inc("llm_admitted_total", priority=priority.name)
+            return ticket
+
+        waiters = self._queues[priority].get(key)
+        if self._queued >= self.max_queue or (waiters and len(waiters) >= self.max_queue_per_key):
+            metrics.inc("llm_admission_rejected_total", priority=priority.name)
+            raise AdmissionRejected(f"LLM queue is full ({self._queued} waiting)")
+
+        waiter = _Waiter(ticket=ticket, future=asyncio.get_running_loop().create_future())
+        self._queues[priority].setdefault(key, deque()).append(waiter)
+        self._queued += 1
+        metrics.inc("llm_queued_total", priority=priority.name)
+        self._dispatch()
+
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(ticket)  # granted at the last moment
+            else:
+                waiter.future.cancel()
+                self._remove(waiter)
+            raise
+        metrics.inc("llm_admitted_total", priority=priority.name)
+        return ticket
+
+    def release(self, ticket: Ticket, used_tokens: Optional[int] = None):
+        """Free the slot; `used_tokens` corrects the token estimate with actual usage."""
+        if ticket.released:
+            return
+        ticket.released = True
+        self._active -= 1
+        if self.tokens_per_minute and used_tokens is not None:
+            self._tokens -= used_tokens - ticket.tokens
+        self._dispatch()
+
+    def stats(self) -> Dict[str, float]:
+        return {"active": self._active, "queued": self._queued, "tokens_available": round(self._tokens, 1)}
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Process-wide controller configured from env on first use."""
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController.from_env()
+    return _controller
@@ -0,0 +1,210 @@
+"""Deadline-aware LLM invocation with hedged requests."""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from src.llm.admission import Priority, Ticket, get_admission_controller
+from src.llm.tokens import estimate_messages_tokens
+from src.observability.metrics import metrics
+from src.observability.tracing import tracer
+
+
+class LLMDeadlineExceeded(Exception):
+    """Raised when the per-turn deadline runs out before the LLM answers."""
+
+
+class LatencyTracker:
+    """Rolling window of successful LLM call latencies (seconds)."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency_s: float):
+        with self._lock:
+            self._samples.append(latency_s)
+
+    def percentile(self, p: float, min_samples: int = 20) -> Optional[float]:
+        """Return p-th percentile (0..1) or None while the window is too small."""
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            xs = sorted(self._samples)
+        k = int(round((len(xs) - 1) * p))
+        return xs[k]
+
+
+latency_tracker = LatencyTracker()
+
+
+def get_turn_deadline_seconds() -> float:
+    """Default per-turn budget for a single `process_message` call."""
+    return float(os.getenv("TURN_DEADLINE_SECONDS", "60"))
+
+
+def get_hedge_delay() -> Optional[float]:
+    """
+    Delay after which a hedged second request is sent.
+
+    Uses the configured percentile of observed latencies once enough samples
+    are collected, otherwise LLM_HEDGE_DELAY_SECONDS. Returns None if hedging
+    is disabled (LLM_HEDGE_ENABLED=0).
+    """
+    if os.getenv("LLM_HEDGE_ENABLED", "1") == "0":
+        return None
+    percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+    observed = latency_tracker.percentile(percentile)
+    if observed is not None:
+        return observed
+    return float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "20"))
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def _used_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None) or {}
+    total = usage.get("total_tokens") if isinstance(usage, dict) else None
+    return int(total) if total else None
+
+
+def _task_tokens(task: asyncio.Task) -> Optional[int]:
+    """Actual usage of a finished request (None if it failed or was cancelled)."""
+    if not task.done() or task.cancelled() or task.exception() is not None:
+        return None
+    return _used_tokens(task.result())
+
+
+async def _call(llm, lc_messages: List[Any], candidates: int = 1, model: Optional[str] = None):
+    """One LLM request; the caller holds its admission ticket."""
+    # Only routers understand `n` and `model`; plain chat models get the old call
+    kwargs = {}
+    if candidates > 1:
+        kwargs["n"] = candidates
+    if model:
+        kwargs["model"] = model
+    return await llm.ainvoke(lc_messages, **kwargs)
+
+
+async def _cancel_all(tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def invoke_with_deadline(
+    llm,
+    lc_messages: List[Any],
+    deadline: Optional[float] = None,
+    agent: str = "unknown",
+    priority: Priority = Priority.THERAPY,
+    fairness_key: str = "",
+    candidates: int = 1,
+    model: Optional[str] = None,
+):
+    """
+    Call `llm.ainvoke` within an absolute `time.monotonic()` deadline.
+
+    The call first waits for a slot from the global admission controller
+    (`priority` class, round-robin by `fairness_key`). If the first request
+    has not answered after the hedge delay, a second identical request is
+    sent - only when a slot is free right away - and whichever finishes
+    first wins.
+
+    With `candidates` > 1 the request asks for that many completions (see
+    LLMRouter); spares end up in `response_metadata["candidates"]`. `model`
+    overrides the router's model for this call (light turns).
+
+    Raises:
+        LLMDeadlineExceeded: the deadline ran out before any request answered
+        AdmissionRejected: the admission queue is full
+    """
+    estimated_tokens = estimate_messages_tokens(lc_messages)
+    with tracer.span(
+        "llm.call", agent=agent, priority=priority.name, prompt_tokens_estimate=estimated_tokens, model=model,
+    ) as span:
+        response = await _invoke(
+            llm, lc_messages, deadline, agent, priority, fairness_key, estimated_tokens, span, candidates, model,
+        )
+        usage = getattr(response, "usage_metadata", None) or {}
+        if isinstance(usage, dict):
+            span.set(
+                prompt_tokens=usage.get("input_tokens"),
+                completion_tokens=usage.get("output_tokens"),
+                total_tokens=usage.get("total_tokens"),
+            )
+        return response
+
+
+async def _invoke(
+    llm, lc_messages, deadline, agent, priority, fairness_key, estimated_tokens, span, candidates=1, model=None,
+):
+    remaining = _remaining(deadline)
+    if remaining is not None and remaining <= 0:
+        metrics.inc("llm_timeouts_total", agent=agent)
+        raise LLMDeadlineExceeded("Turn deadline exhausted before LLM call")
+
+    controller = get_admission_controller()
+    try:
+        with tracer.span("llm.admission", priority=priority.name):
+            ticket = await controller.acquire(priority, fairness_key, estimated_tokens, deadline)
+    except asyncio.TimeoutError:
+        metrics.inc("llm_timeouts_total", agent=agent)
+        raise LLMDeadlineExceeded(f"No LLM slot freed up within the turn deadline ({agent})")
+
+    started = time.monotonic()
+    metrics.inc("llm_requests_total", agent=agent)
+    primary = asyncio.create_task(_call(llm, lc_messages, candidates, model))
+    # Every request's ticket is released here, once its task is over, with its actual usage
+    tickets: Dict[asyncio.Task, Ticket] = {primary: ticket}
+    hedge = None
+    pending = {primary}
+    last_error: Optional[BaseException] = None
+
+    try:
+        hedge_delay = get_hedge_delay()
+        if hedge_delay is not None and (remaining is None or hedge_delay < remaining):
+            done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+            if not done:
+                # Hedges only use spare capacity, never queue behind other users
+                hedge_ticket = controller.try_acquire(priority, fairness_key, estimated_tokens)
+                if hedge_ticket is not None:
+                    hedge = asyncio.create_task(_call(llm, lc_messages, candidates, model))
+                    tickets[hedge] = hedge_ticket
+                    pending.add(hedge)
+                    metrics.inc("llm_hedges_total", agent=agent)
+                else:
+                    metrics.inc("llm_hedges_skipped_total", agent=agent)
+
+        while pending:
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=_remaining(deadline),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                metrics.inc("llm_timeouts_total", agent=agent)
+                raise LLMDeadlineExceeded(f"LLM did not answer within the turn deadline ({agent})")
+
+            for task in done:
+                if task.exception() is None:
+                    latency_tracker.record(time.monotonic() - started)
+                    span.set(hedged=hedge is not None, hedge_won=task is hedge)
+                    if task is hedge:
+                        metrics.inc("llm_hedge_wins_total", agent=agent)
+                    return task.result()
+                last_error = task.exception()
+    finally:
+        # Losing/abandoned requests must not keep running in the background
+        await _cancel_all([t for t in tickets if not t.done()])
+        for task, task_ticket in tickets.items():
+            controller.release(task_ticket, _task_tokens(task))
+
+    metrics.inc("llm_errors_total", agent=agent)
+    raise last_error
@@ -0,0 +1,126 @@
+"""One keep-alive HTTP connection pool shared by every LLM client.
+
+Each ChatOpenAI instance would otherwise open its own httpx client, so every
+(endpoint, model) pair and every agent paid for its own DNS lookups and TLS
+handshakes. All clients created by LLMRouter get the same pool instead, and
+`warm_connections` opens the connections before traffic is accepted. The pool
+belongs to one event loop; when another loop asks for it, the old pool is
+closed and a new one is created.
+
+    LLM_HTTP_MAX_CONNECTIONS  - max open connections (default 100)
+    LLM_HTTP_MAX_KEEPALIVE    - idle connections kept open (default 20)
+    LLM_HTTP_KEEPALIVE_EXPIRY - seconds an idle connection is kept (default 120)
+    LLM_HTTP2                 - 1 = HTTP/2 (needs the h2 package, default 0)
+    LLM_WARMUP_TIMEOUT        - seconds per endpoint for the warm-up request (default 5)
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+
+from src.observability.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+# (event loop, client): an httpx pool must not be reused on another loop
+_shared: Optional[Tuple[Any, Any]] = None
+
+
+def _http2_enabled() -> bool:
+    if os.getenv("LLM_HTTP2", "0") != "1":
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("LLM_HTTP2=1 but the h2 package is not installed, using HTTP/1.1")
+        return False
+    return True
+
+
+async def _aclose_quietly(client):
+    try:
+        await client.aclose()
+    except Exception as e:  # the owning loop is closed; the sockets go with the client object
+        logger.debug("Closing replaced LLM HTTP pool: %s", e)
+
+
+def _close_replaced(loop, client):
+    """Close a pool created on another event loop so its connections are not leaked."""
+    if client.is_closed:
+        return
+    if loop is not None and loop.is_running():
+        # Still serving in another thread: close on the loop that owns the sockets
+        asyncio.run_coroutine_threadsafe(_aclose_quietly(client), loop)
+        return
+    # This thread may be running its own loop, so close from a helper thread
+    run = loop.run_until_complete if loop is not None and not loop.is_closed() else asyncio.run
+    closer = threading.Thread(target=run, args=(_aclose_quietly(client),), name="llm-http-pool-close")
+    closer.start()
+    closer.join()
+
+
+def get_async_http_client():
+    """Process-wide httpx.AsyncClient for LLM calls on the running event loop."""
+    global _shared
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if _shared is not None and _shared[0] is loop and not _shared[1].is_closed:
+        return _shared[1]
+    if _shared is not None:
+        _close_replaced(*_shared)
+        metrics.inc("llm_http_pool_replaced_total")
+
+    import httpx
+    from openai import DefaultAsyncHttpxClient  # keeps the SDK's timeouts and redirect handling
+
+    client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "120")),
+        ),
+        http2=_http2_enabled(),
+    )
+    _shared = (loop, client)
+    return client
+
+
+async def close_http_pool():
+    """Close the shared pool (shutdown)."""
+    global _shared
+    if _shared is not None:
+        client, _shared = _shared[1], None
+        await client.aclose()
+
+
+async def _warm_endpoint(client, name: str, base_url: str, api_key: Optional[str], timeout: float):
+    started = time.monotonic()
+    headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+    try:
+        # Any answer (even 401/404) means DNS, TCP and TLS are done and the connection is pooled
+        response = await client.get(f"{base_url.rstrip('/')}/models", headers=headers, timeout=timeout)
+        logger.info("Warmed LLM endpoint %s in %.2fs (HTTP %d)", name, time.monotonic() - started, response.status_code)
+    except Exception as e:
+        metrics.inc("llm_warmup_errors_total", endpoint=name)
+        logger.warning("Could not warm LLM endpoint %s: %s", name, e)
+
+
+async def warm_connections(endpoints: List[Any]):
+    """Open a pooled connection to every endpoint concurrently (best effort)."""
+    client = get_async_http_client()
+    timeout = float(os.getenv("LLM_WARMUP_TIMEOUT", "5"))
+    seen = set()
+    calls = []
+    for endpoint in endpoints:
+        base_url = endpoint.base_url or os.getenv("OPENAI_BASE_URL") or DEFAULT_BASE_URL
+        if base_url in seen:
+            continue
+        seen.add(base_url)
+        calls.append(_warm_endpoint(client, endpoint.name, base_url, os.getenv(endpoint.api_key_env), timeout))
+    await asyncio.gather(*calls)
@@ -0,0 +1,305 @@
+"""Per-user and per-partnership LLM spend quotas.
+
+Every spender (a user, and the partnership they belong to) has a token
+bucket that refills continuously up to its hourly allowance and is charged
+with the actual token usage of each LLM call, weighted by model cost. A turn
+is limited by the emptier of its two buckets:
+
+- soft (bucket below QUOTA_SOFT_FRACTION of its capacity): the turn runs on
+  QUOTA_SOFT_MODEL, and turns of the same user closer than
+  QUOTA_SOFT_INTERVAL_SECONDS are held back until the interval has passed;
+- hard (bucket empty): no LLM call, the transport sends a polite reply.
+
+Counters live in memory and are saved to QUOTA_STATE_PATH every
+QUOTA_PERSIST_INTERVAL seconds, so a restart does not hand out fresh
+allowances. Buckets that have refilled completely carry no information and
+are dropped every QUOTA_PRUNE_INTERVAL seconds (and on save), so idle
+sessions don't accumulate in memory.
+
+    QUOTA_USER_TOKENS_PER_HOUR         - per user allowance (0 = no user quota)
+    QUOTA_PARTNERSHIP_TOKENS_PER_HOUR  - per partnership allowance (0 = no partnership quota)
+    QUOTA_SOFT_FRACTION                - soft limit threshold (default 0.25)
+    QUOTA_SOFT_MODEL                   - cheaper model under the soft limit (empty = keep the model)
+    QUOTA_SOFT_INTERVAL_SECONDS        - min. seconds between a soft-limited user's turns (default 10)
+    QUOTA_MODEL_COSTS                  - JSON {"model": weight}, e.g. {"gpt-4.1-mini": 0.2} (default 1.0)
+    QUOTA_STATE_PATH                   - JSON file with the counters (empty = memory only)
+    QUOTA_PERSIST_INTERVAL             - seconds between saves (default 60)
+    QUOTA_PRUNE_INTERVAL               - seconds between drops of full, idle buckets (default 300)
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from src.models.serialization import dumps, loads
+from src.observability.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaExceeded(Exception):
+    """The spender is over its hard limit: answer without calling the LLM."""
+
+
+@dataclass(frozen=True)
+class QuotaScope:
+    """Who pays for a turn."""
+    user: str  # Telegram user id, or "<session>:<role>" in the web app
+    partnership: str  # partnership / session id
+
+    def keys(self) -> Tuple[str, str]:
+        return f"user:{self.user}", f"partnership:{self.partnership}"
+
+
+@dataclass
+class TokenBucket:
+    capacity: float
+    level: float
+    updated_at: float  # time.time(), so persisted levels refill across restarts
+
+    def refill(self, now: float, per_hour: float):
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * per_hour / 3600.0)
+        self.updated_at = now
+
+
+@dataclass
+class TurnSpend:
+    """Quota decision for one turn; LLM calls made inside `spending()` are charged to it."""
+    scope: QuotaScope
+    soft: bool = False
+    model: Optional[str] = None  # cheaper model forced by the soft limit
+    tokens: float = 0.0  # cost-weighted tokens charged so far
+
+
+_current: contextvars.ContextVar[Optional[TurnSpend]] = contextvars.ContextVar("turn_spend", default=None)
+
+
+class SpendQuotas:
+    """Token buckets per user and per partnership (single event loop, no locking)."""
+
+    def __init__(
+        self,
+        user_tokens_per_hour: float = 0,
+        partnership_tokens_per_hour: float = 0,
+        soft_fraction: float = 0.25,
+        soft_model: Optional[str] = None,
+        soft_interval: float = 10.0,
+        model_costs: Optional[Dict[str, float]] = None,
+        state_path: Optional[str] = None,
+        persist_interval: float = 60.0,
+        prune_interval: float = 300.0,
+    ):
+        self.allowances = {"user": float(user_tokens_per_hour), "partnership": float(partnership_tokens_per_hour)}
+        self.soft_fraction = soft_fraction
+        self.soft_model = soft_model or None
+        self.soft_interval = soft_interval
+        self.model_costs = model_costs or {}
+        self.state_path = Path(state_path) if state_path else None
+        self.persist_interval = persist_interval
+        self.prune_interval = prune_interval
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._last_turn: Dict[str, float] = {}  # user key -> time.monotonic() of the last admitted turn
+        self._dirty = False
+        self._pruned_at = time.monotonic()
+        self._persist_task: Optional[asyncio.Task] = None
+        self.load()
+
+    @classmethod
+    def from_env(cls) -> "SpendQuotas":
+        return cls(
+            user_tokens_per_hour=float(os.getenv("QUOTA_USER_TOKENS_PER_HOUR", "0")),
+            partnership_tokens_per_hour=float(os.getenv("QUOTA_PARTNERSHIP_TOKENS_PER_HOUR", "0")),
+            soft_fraction=float(os.getenv("QUOTA_SOFT_FRACTION", "0.25")),
+            soft_model=os.getenv("QUOTA_SOFT_MODEL"),
+            soft_interval=float(os.getenv("QUOTA_SOFT_INTERVAL_SECONDS", "10")),
+            model_costs=loads(os.getenv("QUOTA_MODEL_COSTS") or "{}"),
+            state_path=os.getenv("QUOTA_STATE_PATH"),
+            persist_interval=float(os.getenv("QUOTA_PERSIST_INTERVAL", "60")),
+            prune_interval=float(os.getenv("QUOTA_PRUNE_INTERVAL", "300")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return any(self.allowances.values())
+
+    # --- buckets ---
+
+    def _bucket(self, key: str, now: float) -> Optional[TokenBucket]:
+        per_hour = self.allowances[key.split(":", 1)[0]]
+        if not per_hour:
+            return None
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(capacity=per_hour, level=per_hour, updated_at=now)
+        else:
+            bucket.capacity = per_hour
+            bucket.refill(now, per_hour)
+        return bucket
+
+    def prune(self):
+        """Drop full buckets and pacing entries that no longer hold anything back."""
+        recent = time.monotonic() - self.soft_interval
+        self._last_turn = {key: at for key, at in self._last_turn.items() if at > recent}
+        now = time.time()
+        for key in list(self._buckets):
+            bucket = self._bucket(key, now)
+            if bucket is None or bucket.level >= bucket.capacity:
+                del self._buckets[key]
+        self._pruned_at = time.monotonic()
+
+    def status(self, scope: QuotaScope) -> str:
+        """Limit state of the emptier of the scope's buckets: "ok", "soft" or "hard"."""
+        now = time.time()
+        state = "ok"
+        for key in scope.keys():
+            bucket = self._bucket(key, now)
+            if bucket is None:
+                continue
+            if bucket.level <= 0:
+                return "hard"
+            if bucket.level < bucket.capacity * self.soft_fraction:
+                state = "soft"
+        return state
+
+    def charge(self, scope: QuotaScope, model: str, tokens: int) -> float:
+        """Subtract actual usage (weighted by model cost); buckets may go into debt."""
+        cost = tokens * float(self.model_costs.get(model, 1.0))
+        now = time.time()
+        for key in scope.keys():
+            bucket = self._bucket(key, now)
+            if bucket is not None:
+                bucket.level -= cost
+        self._dirty = True
+        metrics.inc("quota_tokens_charged_total", cost)
+        return cost
+
+    # --- turns ---
+
+    async def admit(self, scope: Optional[QuotaScope], deadline: Optional[float] = None) -> Optional[TurnSpend]:
+        """
+        Decide how a turn may spend; None when quotas are off or nobody pays.
+
+        Raises:
+            QuotaExceeded: hard limit reached
+        """
+        if scope is None or not self.enabled:
+            return None
+        if time.monotonic() - self._pruned_at >= self.prune_interval:
+            self.prune()
+        state = self.status(scope)
+        if state == "hard":
+            metrics.inc("quota_hard_limited_total")
+            raise QuotaExceeded(f"Spend quota exhausted for user {scope.user} / {scope.partnership}")
+
+        user_key = scope.keys()[0]
+        spend = TurnSpend(scope=scope)
+        if state == "soft":
+            metrics.inc("quota_soft_limited_total")
+            spend.soft, spend.model = True, self.soft_model
+            # Pace a chatty user: hold the turn until the interval since their last one has passed
+            wait = self._last_turn.get(user_key, 0.0) + self.soft_interval - time.monotonic()
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+            if wait > 0:
+                metrics.observe("quota_debounce_seconds", wait)
+                await asyncio.sleep(wait)
+        self._last_turn[user_key] = time.monotonic()
+        return spend
+
+    def record_usage(self, model: str, response: Any):
+        """Charge an LLM response to the turn being spent in this context (if any)."""
+        spend = _current.get()
+        usage = getattr(response, "usage_metadata", None) or {}
+        tokens = usage.get("total_tokens") if isinstance(usage, dict) else None
+        if spend is not None and tokens:
+            spend.tokens += self.charge(spend.scope, model, int(tokens))
+
+    # --- persistence ---
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters in a JSON-friendly form; full buckets are omitted."""
+        self.prune()
+        return {key: {"level": round(b.level, 1), "updated_at": b.updated_at} for key, b in self._buckets.items()}
+
+    def load(self):
+        if self.state_path is None or not self.state_path.exists():
+            return
+        try:
+            data = loads(self.state_path.read_bytes())
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load quota state from %s: %s", self.state_path, e)
+            return
+        for key, entry in data.items():
+            per_hour = self.allowances.get(key.split(":", 1)[0])
+            if per_hour:
+                self._buckets[key] = TokenBucket(capacity=per_hour, level=entry["level"], updated_at=entry["updated_at"])
+        logger.info("Loaded %d quota buckets from %s", len(self._buckets), self.state_path)
+
+    def save(self):
+        if self.state_path is None:
+            return
+        tmp = self.state_path.with_suffix(self.state_path.suffix + ".tmp")
+        tmp.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(dumps(self.snapshot()), encoding="utf-8")
+        os.replace(tmp, self.state_path)
+        self._dirty = False
+
+    async def persist(self):
+        """Save changed counters every `persist_interval` seconds."""
+        while True:
+            await asyncio.sleep(self.persist_interval)
+            if self._dirty:
+                try:
+                    self.save()
+                except OSError as e:
+                    logger.error("Could not save quota state to %s: %s", self.state_path, e)
+
+    def start_persisting(self):
+        """Start the background saver on the running event loop."""
+        if self.state_path is None or not self.enabled:
+            return
+        if self._persist_task is None or self._persist_task.done():
+            self._persist_task = asyncio.create_task(self.persist())
+
+    async def stop_persisting(self):
+        if self._persist_task is not None:
+            self._persist_task.cancel()
+            await asyncio.gather(self._persist_task, return_exceptions=True)
+            self._persist_task = None
+        if self._dirty:
+            self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "buckets": len(self._buckets)}
+
+
+@contextmanager
+def spending(spend: Optional[TurnSpend]) -> Iterator[Optional[TurnSpend]]:
+    """Charge LLM calls made inside the block (graph nodes, hedges) to `spend`."""
+    token = _current.set(spend)
+    try:
+        yield spend
+    finally:
+        _current.reset(token)
+
+
+def current_model_override() -> Optional[str]:
+    """Cheaper model the current turn must use, if its spender is over the soft limit."""
+    spend = _current.get()
+    return spend.model if spend is not None else None
+
+
+_quotas: Optional[SpendQuotas] = None
+
+
+def get_spend_quotas() -> SpendQuotas:
+    """Process-wide quotas configured from env on first use."""
+    global _quotas
+    if _quotas is None:
+        _quotas = SpendQuotas.from_env()
+    return _quotas
@@ -0,0 +1,340 @@
+"""Routing of LLM calls across several OpenAI-compatible endpoints.
+
+Endpoints are configured with LLM_ENDPOINTS (JSON list) or LLM_ENDPOINTS_FILE
+(path to the same JSON). Each entry:
+
+    {"name": "main", "model": "gpt-4.1"}
+    {"name": "backup", "base_url": "http://localhost:9001/v1",
+     "api_key_env": "BACKUP_API_KEY", "model": "gpt-4.1-mini", "fallback": true}
+
+Without configuration there is a single endpoint using the agent's model and
+the default OpenAI settings, i.e. the old behaviour.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.llm.http_pool import get_async_http_client
+from src.llm.quotas import current_model_override, get_spend_quotas
+from src.models.serialization import loads
+from src.observability.metrics import metrics
+from src.observability.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class NoHealthyEndpoint(Exception):
+    """Every endpoint is behind an open circuit breaker."""
+
+
+def is_endpoint_failure(exc: BaseException) -> bool:
+    """
+    True for errors that say the endpoint is unhealthy: timeouts, connection
+    errors, 408/429 and 5xx. Anything else (400/401/422, a bad prompt) would
+    fail the same way everywhere, so it neither trips breakers nor fails over.
+    """
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in (408, 429) or status >= 500
+
+    import httpx
+    import openai
+
+    return isinstance(exc, (openai.APIConnectionError, httpx.TransportError))
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    """One OpenAI-compatible endpoint (URL + key + optional model override)."""
+    name: str
+    base_url: Optional[str] = None
+    api_key_env: str = "OPENAI_API_KEY"
+    model: Optional[str] = None  # None = the agent's model
+    weight: float = 1.0
+    fallback: bool = False  # only used when no primary is healthy and fast
+
+
+class EndpointHealth:
+    """
+    Rolling latency/error window and circuit breaker of one endpoint.
+
+    The breaker opens after LLM_BREAKER_FAILURES consecutive failures or when
+    the error rate over the window exceeds LLM_BREAKER_ERROR_RATE. After
+    LLM_BREAKER_COOLDOWN_SECONDS one trial request is let through (half-open);
+    its outcome closes or re-opens the breaker.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, window: int = 50):
+        self.name = name
+        self._latencies = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)  # True = success
+        self._consecutive_failures = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _failure_threshold() -> int:
+        return int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+
+    @staticmethod
+    def _error_rate_threshold() -> float:
+        return float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+
+    @staticmethod
+    def _cooldown() -> float:
+        return float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self._cooldown():
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            return self._state
+
+    def allow_request(self) -> bool:
+        """False while the breaker is open (or a half-open trial is already running)."""
+        state = self.state
+        with self._lock:
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self, latency_s: float):
+        with self._lock:
+            self._latencies.append(latency_s)
+            self._outcomes.append(True)
+            self._consecutive_failures = 0
+            if self._state != self.CLOSED:
+                logger.info("LLM endpoint %s recovered, closing circuit breaker", self.name)
+            self._state = self.CLOSED
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._outcomes.append(False)
+            self._consecutive_failures += 1
+            failures = self._outcomes.count(False)
+            error_rate = failures / len(self._outcomes)
+            trip = (
+                self._state == self.HALF_OPEN
+                or self._consecutive_failures >= self._failure_threshold()
+                or (len(self._outcomes) >= 10 and error_rate > self._error_rate_threshold())
+            )
+            if trip and self._state != self.OPEN:
+                logger.warning(
+                    "LLM endpoint %s: opening circuit breaker (%d consecutive failures, error rate %.0f%%)",
+                    self.name, self._consecutive_failures, error_rate * 100,
+                )
+                metrics.inc("llm_breaker_opened_total", endpoint=self.name)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """A half-open trial was cancelled (e.g. lost a hedge race) without an outcome."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def p95(self, min_samples: int = 5) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < min_samples:
+                return None
+            xs = sorted(self._latencies)
+        return xs[int(round((len(xs) - 1) * 0.95))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            outcomes = list(self._outcomes)
+        p95 = self.p95()
+        return {
+            "state": self.state,
+            "p95_seconds": round(p95, 3) if p95 is not None else None,
+            "error_rate": round(outcomes.count(False) / len(outcomes), 3) if outcomes else 0.0,
+            "samples": len(outcomes),
+        }
+
+
+# Health is per endpoint, shared by all agents that call it
+_health: Dict[str, EndpointHealth] = {}
+_health_lock = threading.Lock()
+
+
+def get_endpoint_health(name: str) -> EndpointHealth:
+    with _health_lock:
+        if name not in _health:
+            _health[name] = EndpointHealth(name)
+        return _health[name]
+
+
+def endpoints_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Health of every endpoint used so far (for /api/metrics)."""
+    with _health_lock:
+        items = list(_health.items())
+    return {name: health.snapshot() for name, health in items}
+
+
+def load_endpoints() -> List[Endpoint]:
+    """Read endpoint list from LLM_ENDPOINTS / LLM_ENDPOINTS_FILE (empty if unset)."""
+    raw = os.getenv("LLM_ENDPOINTS")
+    path = os.getenv("LLM_ENDPOINTS_FILE")
+    if not raw and path:
+        raw = Path(path).read_text(encoding="utf-8")
+    if not raw:
+        return []
+    entries = loads(raw)
+    return [Endpoint(**entry) for entry in entries]
+
+
+class LLMRouter:
+    """
+    Drop-in replacement for a chat model's `ainvoke` that picks an endpoint
+    per call.
+
+    Primaries with a closed breaker and p95 under LLM_ROUTER_DEGRADED_P95_SECONDS
+    are chosen by weight; when none qualifies, the remaining healthy endpoints
+    (fallbacks included) are tried fastest-first. A failed call fails over to
+    the next candidate within the same `ainvoke`; client errors (see
+    `is_endpoint_failure`) are raised at once.
+
+    `ainvoke(messages, n=3)` asks for several completions in one request; the
+    first is returned and the others are in `response_metadata["candidates"]`.
+
+    `ainvoke(messages, model=...)` overrides the agent's model for one call
+    (light turns). Usage is charged to the turn's spend quota; a
+    soft-limited turn runs on the quota's cheaper model. Endpoints that pin
+    a model always use it.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        temperature: float,
+        endpoints: Optional[List[Endpoint]] = None,
+        **model_kwargs,
+    ):
+        self.model_name = model_name
+        self.temperature = temperature
+        self.model_kwargs = model_kwargs
+        self.endpoints = endpoints or load_endpoints() or [Endpoint(name="default")]
+        self._clients: Dict[Tuple[str, str], Any] = {}
+
+    def _model(self, endpoint: Endpoint, requested: Optional[str] = None) -> str:
+        return endpoint.model or current_model_override() or requested or self.model_name
+
+    def _client(self, endpoint: Endpoint, model: str):
+        http_client = get_async_http_client()
+        client = self._clients.get((endpoint.name, model))
+        if client is None or client.http_async_client is not http_client:
+            from langchain_openai import ChatOpenAI
+
+            kwargs = {}
+            if endpoint.base_url:
+                kwargs["base_url"] = endpoint.base_url
+            api_key = os.getenv(endpoint.api_key_env)
+            if api_key:
+                kwargs["api_key"] = api_key
+            client = ChatOpenAI(
+                model=model,
+                temperature=self.temperature,
+                model_kwargs=self.model_kwargs,
+                # Failover is ours: don't let the SDK retry a sick endpoint for minutes
+                max_retries=0,
+                # Shared keep-alive pool instead of a client per (endpoint, model)
+                http_async_client=http_client,
+                **kwargs,
+            )
+            self._clients[(endpoint.name, model)] = client
+        return client
+
+    def warm_clients(self):
+        """Create the chat clients for the agent's model up front (call on the serving event loop)."""
+        for endpoint in self.endpoints:
+            self._client(endpoint, self._model(endpoint))
+
+    def candidates(self) -> List[Endpoint]:
+        """Endpoints in the order they should be tried for the next call."""
+        degraded_p95 = float(os.getenv("LLM_ROUTER_DEGRADED_P95_SECONDS", "15"))
+        usable = [e for e in self.endpoints if get_endpoint_health(e.name).state != EndpointHealth.OPEN]
+
+        def p95(endpoint: Endpoint) -> float:
+            value = get_endpoint_health(endpoint.name).p95()
+            return value if value is not None else 0.0  # unknown = assume fast
+
+        preferred = [e for e in usable if not e.fallback and p95(e) <= degraded_p95]
+        rest = sorted((e for e in usable if e not in preferred), key=p95)
+
+        # Weighted shuffle of healthy primaries spreads load across keys/endpoints
+        ordered = []
+        pool = list(preferred)
+        while pool:
+            pick = random.choices(pool, weights=[e.weight for e in pool])[0]
+            ordered.append(pick)
+            pool.remove(pick)
+        return ordered + rest
+
+    async def _call(self, client, messages, n: int, **kwargs):
+        if n <= 1:
+            return await client.ainvoke(messages, **kwargs)
+        # ainvoke keeps only the first choice; agenerate returns all of them
+        result = await client.agenerate([messages], n=n, **kwargs)
+        generations = result.generations[0]
+        response = generations[0].message
+        response.response_metadata["candidates"] = [g.message.content for g in generations[1:]]
+        return response
+
+    async def ainvoke(self, messages, n: int = 1, model: Optional[str] = None, **kwargs):
+        last_error: Optional[BaseException] = None
+        tried = 0
+        for endpoint in self.candidates():
+            health = get_endpoint_health(endpoint.name)
+            if not health.allow_request():
+                continue
+            if tried:
+                metrics.inc("llm_failovers_total", endpoint=endpoint.name)
+            tried += 1
+            metrics.inc("llm_endpoint_requests_total", endpoint=endpoint.name)
+            started = time.monotonic()
+            used_model = self._model(endpoint, model)
+            try:
+                with tracer.span("llm.endpoint", endpoint=endpoint.name, model=used_model, n=n if n > 1 else None):
+                    response = await self._call(self._client(endpoint, used_model), messages, n, **kwargs)
+            except Exception as e:
+                if not is_endpoint_failure(e):
+                    # The request itself is bad: no verdict on the endpoint, no point trying others
+                    health.release_trial()
+                    metrics.inc("llm_endpoint_client_errors_total", endpoint=endpoint.name)
+                    raise
+                health.record_failure()
+                metrics.inc("llm_endpoint_errors_total", endpoint=endpoint.name)
+                logger.warning("LLM endpoint %s failed: %s", endpoint.name, e)
+                last_error = e
+                continue
+            except BaseException:
+                # Cancelled by the deadline / hedging layer: no verdict on the endpoint
+                health.release_trial()
+                raise
+            health.record_success(time.monotonic() - started)
+            get_spend_quotas().record_usage(used_model, response)
+            return response
+
+        if last_error is not None:
+            raise last_error
+        raise NoHealthyEndpoint("All LLM endpoints are behind open circuit breakers")
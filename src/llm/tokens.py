@@ -0,0 +1,16 @@
+"""Cheap token estimates used for budgets and admission control."""
+from typing import Any, Iterable
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for mixed Russian/English text (~3 chars per token)."""
+    return len(text) // 3 + 1
+
+
+def estimate_messages_tokens(messages: Iterable[Any]) -> int:
+    """Estimate prompt tokens of a LangChain message list (or dicts with "content")."""
+    total = 0
+    for msg in messages:
+        content = msg.get("content") if isinstance(msg, dict) else getattr(msg, "content", "")
+        total += estimate_tokens(content or "") + 4  # per-message overhead
+    return total
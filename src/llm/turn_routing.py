@@ -0,0 +1,121 @@
+"""Content-aware model choice per turn: light turns go to a smaller, faster model.
+
+Many turns only need an `ack` or a `share_request` (e.g. "ок, спасибо" or a
+short factual answer early in onboarding). Local heuristics over the incoming
+message and the current agent send those to LIGHT_TURN_MODEL; anything that
+may need `insight`/`synthesis`, a classification/handoff, or touches safety
+stays on the agent's model.
+
+Every decision is counted and logged with its latency and the message types
+the model produced, so quality of the light path can be checked against the
+full one (see `turn_route_*` metrics).
+
+    LIGHT_TURN_MODEL      - model for light turns (empty = routing off)
+    LIGHT_TURN_MAX_CHARS  - longest message that can count as light (default 80)
+"""
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from src.classification.preclassifier import extract_user_texts
+from src.llm.hedging import LatencyTracker
+from src.observability.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+FULL, LIGHT = "full", "light"
+
+# Whole message is an acknowledgement / greeting
+_ACK = re.compile(
+    r"^(ок(ей)?|ok|да|нет|ага|угу|хорошо|ладно|понятно|понял[аи]?|ясно|спасибо|спс|согласен|согласна|"
+    r"привет|здравствуйте|добрый день|давай(те)?|конечно|отлично|👍|🙏|🤝|❤️|🙂)[\s!.,)]*$",
+    re.IGNORECASE,
+)
+
+# Feelings, blame or safety: the reply needs the full model even if the message is short
+_HEAVY_MARKERS = (
+    "почему", "не понима", "обид", "боюсь", "страш", "измен", "развод", "удар", "бьет", "бьёт",
+    "насили", "угрож", "ненави", "не могу", "больно", "плач", "устал", "одиноч", "предал",
+)
+
+_latency: Dict[str, LatencyTracker] = {FULL: LatencyTracker(), LIGHT: LatencyTracker()}
+
+
+@dataclass(frozen=True)
+class TurnRoute:
+    tier: str  # "light" | "full"
+    reason: str
+    model: Optional[str] = None  # None = the agent's model
+
+
+def get_light_model() -> Optional[str]:
+    return os.getenv("LIGHT_TURN_MODEL") or None
+
+
+def _is_foundational(classification: Any) -> bool:
+    if classification is None:
+        return False
+    level = classification.get("threat_level") if isinstance(classification, dict) else classification.threat_level
+    return getattr(level, "value", level) == "foundational"
+
+
+def route_turn(messages: List[Any], current_agent: str, classification: Any = None) -> TurnRoute:
+    """
+    Pick the model tier for the agent about to answer `messages`.
+
+    Args:
+        messages: Stored history ending with the incoming user message
+        current_agent: "onboarding" or "therapy"
+        classification: Conflict classification or pre-classifier hint, if any
+    """
+    light_model = get_light_model()
+    if light_model is None:
+        return TurnRoute(FULL, "disabled")
+
+    texts = extract_user_texts(messages)
+    if len(texts) <= 1:
+        return TurnRoute(FULL, "first_turn")  # the first reply decides whether the couple stays
+    text = texts[-1].strip()
+    lowered = text.lower()
+
+    if any(marker in lowered for marker in _HEAVY_MARKERS):
+        return TurnRoute(FULL, "emotional")
+    if _is_foundational(classification):
+        return TurnRoute(FULL, "foundational")
+    if _ACK.match(text):
+        return TurnRoute(LIGHT, "ack", light_model)
+    if current_agent == "therapy":
+        return TurnRoute(FULL, "therapy")
+
+    # Onboarding: short factual answers only need the next question / a share_request,
+    # unless enough turns passed for the agent to classify and hand off
+    if len(texts) >= int(os.getenv("PRECLASSIFIER_MIN_TURNS", "4")):
+        return TurnRoute(FULL, "handoff_possible")
+    if len(text) <= int(os.getenv("LIGHT_TURN_MAX_CHARS", "80")) and "?" not in text:
+        return TurnRoute(LIGHT, "short_answer", light_model)
+    return TurnRoute(FULL, "default")
+
+
+def record_turn_route(route: TurnRoute, agent: str, latency_s: float, message_types: List[str]):
+    """Count and log a routed turn; light turns are compared with the full model's median latency."""
+    _latency[route.tier].record(latency_s)
+    metrics.inc("turn_route_total", tier=route.tier, reason=route.reason, agent=agent)
+    metrics.observe("turn_route_latency_seconds", latency_s, tier=route.tier)
+    if route.tier == FULL:
+        logger.info("Turn route full (%s, agent=%s): %.2fs, produced %s", route.reason, agent, latency_s, message_types)
+        return
+
+    # A light turn that produced insight/synthesis probably deserved the full model
+    if any(t in ("insight", "synthesis") for t in message_types):
+        metrics.inc("turn_route_light_heavy_output_total", agent=agent)
+    full_p50 = _latency[FULL].percentile(0.5, min_samples=5)
+    saved = full_p50 - latency_s if full_p50 is not None else None
+    if saved is not None:
+        metrics.inc("turn_route_saved_seconds_total", max(saved, 0.0))
+    logger.info(
+        "Turn route light (%s, agent=%s, model=%s): %.2fs, produced %s, %s",
+        route.reason, agent, route.model, latency_s, message_types,
+        f"~{saved:.2f}s vs full p50" if saved is not None else "no full-model baseline yet",
+    )
@@ -77,6 +77,11 @@ class AgentResponse(BaseModel):
     messages: List[Message]
     handoff: bool = Field(default=False, description="Signal to switch agents")
     classification: Optional[ConflictClassification] = None
+    alternatives: List["AgentResponse"] = Field(
+        default_factory=list,
+        exclude=True,
+        description="Spare candidates from the same LLM call (never stored in history)",
+    )
 
 
 # Session State
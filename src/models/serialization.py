@@ -0,0 +1,58 @@
+"""One JSON path for turns: history entries, API responses and transcripts.
+
+Uses orjson when it is installed (several times faster than the stdlib and
+already produces the bytes an HTTP response needs), otherwise stdlib json
+with the same compact, non-ASCII-escaping output. Pydantic models,
+dataclasses, enums and datetimes are handled in both cases.
+"""
+import dataclasses
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # optional speedup, see requirements.txt
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _lenient_default(obj: Any) -> Any:
+    try:
+        return _default(obj)
+    except TypeError:
+        return str(obj)
+
+
+def dumps_bytes(obj: Any, indent: bool = False, lenient: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes (compact unless `indent`; `lenient` writes unknown objects as str())."""
+    default = _lenient_default if lenient else _default
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, default=default, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, default=default, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any, indent: bool = False, lenient: bool = False) -> str:
+    """Serialize to a JSON string (e.g. an assistant turn stored in history)."""
+    return dumps_bytes(obj, indent, lenient).decode("utf-8")
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse JSON; errors are `json.JSONDecodeError` (orjson's error subclasses it)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,5 @@
+"""Observability: in-process metrics and tracing."""
+from .metrics import metrics, MetricsRegistry
+from .tracing import tracer, traced, Span, Tracer
+
+__all__ = ["metrics", "MetricsRegistry", "tracer", "traced", "Span", "Tracer"]
@@ -0,0 +1,123 @@
+"""Opt-in, anonymized capture of real turn arrivals for offline replay.
+
+Each incoming user message (Telegram or /api/chat) becomes one compact JSONL
+record with its arrival time and the shape of its text, never the text
+itself or any id:
+
+    {"t": 1729350000.123, "src": "tg", "s": "3f9a1c0b2e7d", "r": "user_2",
+     "c": 74, "w": 12, "l": 1, "q": 1}
+
+    t    - arrival time (unix seconds, ms precision)
+    src  - "tg" (Telegram) or "web" (/api/chat)
+    s    - salted hash of the session / partnership id
+    r    - role of the sender (user_1 / user_2)
+    c, w, l - characters, words and lines of the message
+    q    - 1 if the message contains a question mark
+
+`eval/replay_traffic.py` turns such a log back into a workload. Records are
+written by a background thread so capture never blocks a turn.
+
+    TRAFFIC_CAPTURE_PATH    - JSONL file (empty = capture off)
+    TRAFFIC_CAPTURE_SAMPLE  - fraction of sessions captured (default 1.0)
+    TRAFFIC_CAPTURE_SALT    - hash salt; random per process when unset, so
+                              hashes cannot be matched against known ids
+"""
+import hashlib
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.models.serialization import dumps
+from src.observability.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TrafficCapture:
+    """Appends anonymized turn records to a JSONL file (no-op when `path` is None)."""
+
+    def __init__(self, path: Optional[str] = None, sample: float = 1.0, salt: Optional[str] = None):
+        self.path = Path(path) if path else None
+        self.sample = sample
+        self.salt = (salt or secrets.token_hex(16)).encode()
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=10000)
+        self._worker: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "TrafficCapture":
+        return cls(
+            path=os.getenv("TRAFFIC_CAPTURE_PATH") or None,
+            sample=float(os.getenv("TRAFFIC_CAPTURE_SAMPLE", "1.0")),
+            salt=os.getenv("TRAFFIC_CAPTURE_SALT") or None,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def _hash(self, session_id: str) -> str:
+        return hashlib.blake2b(session_id.encode(), key=self.salt, digest_size=6).hexdigest()
+
+    def _sampled(self, session_hash: str) -> bool:
+        # Decided per session, so captured sessions are complete
+        return self.sample >= 1.0 or int(session_hash, 16) / float(1 << 48) < self.sample
+
+    def record(self, source: str, session_id: str, role: str, text: str):
+        """Capture one incoming user message."""
+        if self.path is None:
+            return
+        session_hash = self._hash(session_id)
+        if not self._sampled(session_hash):
+            return
+        self._submit({
+            "t": round(time.time(), 3),
+            "src": source,
+            "s": session_hash,
+            "r": role,
+            "c": len(text),
+            "w": len(text.split()),
+            "l": text.count("\n") + 1,
+            "q": int("?" in text),
+        })
+
+    def _submit(self, entry: Dict[str, Any]):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+            self._worker.start()
+        try:
+            self._queue.put_nowait(entry)
+            metrics.inc("traffic_capture_records_total")
+        except queue.Full:
+            metrics.inc("traffic_capture_dropped_total")
+
+    def _run(self):
+        while True:
+            batch: List[Dict[str, Any]] = [self._queue.get()]
+            while len(batch) < 256:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with self.path.open("a", encoding="utf-8") as f:
+                    f.write("".join(dumps(entry) + "\n" for entry in batch))
+            except OSError as e:
+                logger.warning("Traffic capture write to %s failed: %s", self.path, e)
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until queued records are written (best effort, for shutdown)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+# Global capture
+traffic_capture = TrafficCapture.from_env()
@@ -0,0 +1,192 @@
+"""Approximate memory accounting and per-session caps.
+
+Sizes are estimates from `sys.getsizeof` over the session's containers and
+strings - good enough to spot a runaway session, not an exact heap profile.
+LangChain message copies made during a call are transient and only show up
+in the process totals.
+
+    SESSION_MAX_BYTES        - cap per session (default 2 MB, 0 = no cap)
+    SESSION_KEEP_MESSAGES    - history tail kept in memory after archiving (default 200)
+    SESSION_ARCHIVE_DIR      - where archived history goes (default session_archive)
+"""
+import gc
+import logging
+import os
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.models.serialization import dumps, loads
+from src.observability.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_NOTE = "[Ранняя часть разговора ({count} сообщений) перенесена в архив]"
+
+
+def approx_size(obj: Any, _seen: Optional[set] = None) -> int:
+    """Deep `sys.getsizeof` over dicts, lists, tuples, sets and dataclass-like objects."""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, seen) + approx_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        size += approx_size(vars(obj), seen)
+    return size
+
+
+def history_bytes(messages: List[Dict[str, str]]) -> int:
+    """Cheap size of a message history (per-turn cap checks; no deep walk)."""
+    return sys.getsizeof(messages) + sum(
+        sys.getsizeof(m) + sys.getsizeof(m.get("content") or "") for m in messages if isinstance(m, dict)
+    )
+
+
+def process_memory() -> Dict[str, Any]:
+    """Process-wide totals: RSS, GC object counts and tracemalloc if it is running."""
+    totals: Dict[str, Any] = {"gc_objects": len(gc.get_objects()), "gc_counts": gc.get_count()}
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key, value = line.split(":", 1)
+                    totals["rss_bytes" if key == "VmRSS" else "peak_rss_bytes"] = int(value.split()[0]) * 1024
+    except OSError:
+        import resource  # not on Windows; /proc is Linux-only
+
+        totals["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        totals["traced_bytes"], totals["traced_peak_bytes"] = current, peak
+    return totals
+
+
+def memory_report(session_sizes: Dict[str, Dict[str, int]], top_n: int = 10) -> Dict[str, Any]:
+    """
+    Summary for the admin endpoint.
+
+    Args:
+        session_sizes: session id -> {"bytes": ..., "messages": ..., ...}
+        top_n: how many of the heaviest sessions to list
+    """
+    heaviest = sorted(session_sizes.items(), key=lambda kv: kv[1]["bytes"], reverse=True)[:top_n]
+    return {
+        "sessions": len(session_sizes),
+        "sessions_bytes": sum(s["bytes"] for s in session_sizes.values()),
+        "top": [{"session_id": sid, **sizes} for sid, sizes in heaviest],
+        "process": process_memory(),
+        "caps": SessionCaps.from_env().__dict__,
+    }
+
+
+@dataclass
+class SessionCaps:
+    max_bytes: int = 2_000_000
+    keep_messages: int = 200
+    archive_dir: str = "session_archive"
+
+    @classmethod
+    def from_env(cls) -> "SessionCaps":
+        return cls(
+            max_bytes=int(os.getenv("SESSION_MAX_BYTES", "2000000")),
+            keep_messages=int(os.getenv("SESSION_KEEP_MESSAGES", "200")),
+            archive_dir=os.getenv("SESSION_ARCHIVE_DIR", "session_archive"),
+        )
+
+
+def compact_assistant_turns(messages: List[Dict[str, str]]) -> int:
+    """
+    Re-encode stored assistant JSON without indentation, nulls or empty fields.
+
+    Lossless for the dialogue; returns the number of characters saved.
+    """
+    saved = 0
+    for msg in messages:
+        if msg.get("role") != "assistant":
+            continue
+        content = msg.get("content") or ""
+        try:
+            data = loads(content)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            data = {k: v for k, v in data.items() if v is not None and v is not False and v != [] and v != {}}
+        compact = dumps(data)
+        if len(compact) < len(content):
+            saved += len(content) - len(compact)
+            msg["content"] = compact
+    return saved
+
+
+def split_for_archive(messages: List[Dict[str, str]], keep: int) -> Tuple[List[Dict], List[Dict]]:
+    """Split history into (archived head, kept tail); the tail starts at a user message."""
+    if len(messages) <= keep:
+        return [], messages
+    cut = len(messages) - keep
+    while cut < len(messages) and messages[cut].get("role") != "user":
+        cut += 1
+    return messages[:cut], messages[cut:]
+
+
+def archive_messages(session_id: str, archived: List[Dict[str, Any]], archive_dir: str, kind: str = "history"):
+    """Append archived entries to <archive_dir>/<session_id>.jsonl."""
+    path = Path(archive_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    safe_id = "".join(c if c.isalnum() or c in "-_." else "_" for c in session_id)
+    archived_at = datetime.now().isoformat()
+    with (path / f"{safe_id}.jsonl").open("a", encoding="utf-8") as f:
+        for entry in archived:
+            f.write(dumps({"kind": kind, "archived_at": archived_at, **entry}) + "\n")
+
+
+def enforce_history_cap(
+    session_id: str,
+    messages: List[Dict[str, str]],
+    extra_bytes: int = 0,
+    caps: Optional[SessionCaps] = None,
+) -> bool:
+    """
+    Keep one session under SESSION_MAX_BYTES, editing `messages` in place.
+
+    First compacts stored assistant JSON; if still over the cap, moves the
+    oldest messages to the archive file and leaves a short system note in
+    their place. `extra_bytes` accounts for other per-session data (e.g. UI
+    copies). Returns True if the history was archived.
+    """
+    caps = caps or SessionCaps.from_env()
+    if not caps.max_bytes or history_bytes(messages) + extra_bytes <= caps.max_bytes:
+        return False
+
+    saved = compact_assistant_turns(messages)
+    if saved:
+        metrics.inc("session_compactions_total")
+        logger.info("Session %s: compacted assistant turns, saved %d chars", session_id, saved)
+    if history_bytes(messages) + extra_bytes <= caps.max_bytes:
+        return False
+
+    archived, kept = split_for_archive(messages, caps.keep_messages)
+    if not archived:
+        return False
+    try:
+        archive_messages(session_id, archived, caps.archive_dir)
+    except OSError as e:
+        # Never drop history that is not safely on disk: stay over the cap instead
+        metrics.inc("session_archive_failures_total")
+        logger.error("Session %s: could not archive history, keeping it in memory: %s", session_id, e)
+        return False
+    note = {"role": "system", "content": ARCHIVE_NOTE.format(count=len(archived))}
+    messages[:] = [note] + kept
+    metrics.inc("session_archivals_total")
+    logger.warning(
+        "Session %s over %d bytes: archived %d messages, kept %d",
+        session_id, caps.max_bytes, len(archived), len(kept),
+    )
+    return True
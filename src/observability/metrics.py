@@ -0,0 +1,129 @@
+"""In-memory metrics registry shared by agents and transports."""
+import bisect
+import threading
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Seconds; covers everything from a cached prompt build to a slow LLM call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0)
+
+
+def _escape_label(value: str) -> str:
+    """Escape a label value per the Prometheus text exposition format."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_key(name: str, labels: LabelKey) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels)
+    return f"{name}{{{rendered}}}"
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class _Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics)."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts: List[int] = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        out, running = [], 0
+        for bound, n in zip(self.buckets, self.counts):
+            running += n
+            out.append((f"{bound:g}", running))
+        out.append(("+Inf", self.count))
+        return out
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms keyed by name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, LabelKey], float] = defaultdict(float)
+        self._histograms: Dict[Tuple[str, LabelKey], _Histogram] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels: str):
+        """Increment counter `name` with optional labels."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels: str):
+        """Record `value` in histogram `name` with optional labels."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def get(self, name: str, **labels: str) -> float:
+        """Read current counter value (0 if never incremented)."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            return self._counters.get(key, 0.0)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Return a JSON-serializable copy of all metrics."""
+        with self._lock:
+            counters = {_format_key(name, labels): value for (name, labels), value in self._counters.items()}
+            histograms = {
+                _format_key(name, labels): {"count": h.count, "sum": round(h.sum, 6), "buckets": dict(h.cumulative())}
+                for (name, labels), h in self._histograms.items()
+            }
+        return {"counters": dict(sorted(counters.items())), "histograms": dict(sorted(histograms.items()))}
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                ((key, h.cumulative(), h.count, h.sum) for key, h in self._histograms.items()),
+                key=lambda item: item[0],
+            )
+
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{_format_key(name, labels)} {value:g}")
+
+        for (name, labels), buckets, count, total in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, n in buckets:
+                lines.append(f"{_format_key(name + '_bucket', labels + (('le', bound),))} {n}")
+            lines.append(f"{_format_key(name + '_count', labels)} {count}")
+            lines.append(f"{_format_key(name + '_sum', labels)} {total:g}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Drop all recorded values."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# Global registry
+metrics = MetricsRegistry()
@@ -0,0 +1,235 @@
+"""On-demand profiling of single mediator turns.
+
+A turn is profiled when asked for explicitly - `X-Profile` header or
+`?profile=` query flag on /api/chat, or a Telegram partnership switched on via
+PROFILE_PARTNERSHIPS / the /profile admin command - so real traffic can be
+inspected without profiling the whole process. The HTTP flag is honoured only
+with a valid `X-Admin-Token` (ADMIN_TOKEN) or PROFILE_ALLOW_REQUESTS=1: a
+profile slows the whole event loop and writes dump files.
+
+Modes:
+    cpu       - deterministic cProfile; writes <name>.prof (+ top functions in <name>.txt)
+    sampling  - stack sampler on the event loop thread; writes <name>.folded
+                (collapsed stacks, feed to flamegraph.pl / speedscope)
+
+Each dump gets <name>.json with the turn's history size, prompt size and
+stage timings taken from its tracing spans. Dumps go to PROFILE_DUMP_DIR.
+
+Both modes see everything running on the event loop thread during the turn,
+including other concurrent turns; only one profile runs at a time.
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from src.models.serialization import dumps
+from src.observability.metrics import metrics
+from src.observability.tracing import Span, tracer
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("cpu", "sampling")
+
+# Span attributes worth keeping in the dump metadata
+_SIZE_ATTRIBUTES = ("history_messages", "history_chars", "prompt_tokens", "system_prompt_tokens", "total_tokens")
+
+_active_lock = threading.Lock()
+
+
+def get_dump_dir() -> Path:
+    return Path(os.getenv("PROFILE_DUMP_DIR", "profiles"))
+
+
+def parse_profile_flag(value: Optional[str]) -> Optional[str]:
+    """Map a header/query value to a mode: "1"/"cpu" -> cpu, "sampling" -> sampling, else None."""
+    if not value:
+        return None
+    value = value.strip().lower()
+    if value in ("1", "true", "yes", "cpu", "deterministic"):
+        return "cpu"
+    if value == "sampling":
+        return "sampling"
+    return None
+
+
+def request_profiling_allowed(admin_token: Optional[str]) -> bool:
+    """May an HTTP client turn on profiling? Needs ADMIN_TOKEN or PROFILE_ALLOW_REQUESTS=1."""
+    if os.getenv("PROFILE_ALLOW_REQUESTS", "0") == "1":
+        return True
+    expected = os.getenv("ADMIN_TOKEN")
+    return bool(expected and admin_token and secrets.compare_digest(admin_token, expected))
+
+
+def _parse_partnerships(raw: str) -> Dict[str, str]:
+    """PROFILE_PARTNERSHIPS="p_1_...:sampling,p_2_..." -> {id: mode} (mode defaults to cpu)."""
+    result = {}
+    for item in filter(None, (part.strip() for part in raw.split(","))):
+        pid, _, mode = item.partition(":")
+        result[pid] = parse_profile_flag(mode) or "cpu"
+    return result
+
+
+_partnerships: Dict[str, str] = _parse_partnerships(os.getenv("PROFILE_PARTNERSHIPS", ""))
+
+
+def partnership_profile_mode(partnership_id: str) -> Optional[str]:
+    """Profiling mode switched on for a Telegram partnership, or None."""
+    return _partnerships.get(partnership_id)
+
+
+def set_partnership_profiling(partnership_id: str, mode: Optional[str]):
+    """Switch profiling of a partnership on (mode) or off (None)."""
+    global _partnerships
+    if mode is None:
+        _partnerships = {k: v for k, v in _partnerships.items() if k != partnership_id}
+    else:
+        _partnerships = {**_partnerships, partnership_id: mode}
+
+
+def profiled_partnerships() -> Dict[str, str]:
+    return dict(_partnerships)
+
+
+class StackSampler:
+    """Samples the stack of one thread at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileSession:
+    """One profiled turn: profiler state plus metadata collected from spans."""
+
+    def __init__(self, mode: str, label: str, meta: Dict[str, Any]):
+        self.mode = mode
+        self.label = label
+        self.meta = dict(meta)
+        self.stages: List[Dict[str, Any]] = []
+        self.trace_id: Optional[str] = None
+        self.started = time.perf_counter()
+        self._profiler: Optional[cProfile.Profile] = None
+        self._sampler: Optional[StackSampler] = None
+
+    def set(self, **meta: Any):
+        self.meta.update(meta)
+
+    def _on_span(self, span: Span):
+        if span.trace_id != self.trace_id:
+            return
+        self.stages.append({"name": span.name, "duration_ms": round(span.duration_s * 1000, 3)})
+        for key in _SIZE_ATTRIBUTES:
+            if key in span.attributes:
+                # Several LLM calls per turn (onboarding + therapy): keep the largest
+                self.meta[key] = max(self.meta.get(key, 0), span.attributes[key])
+
+    def start(self):
+        current = tracer.current_span()
+        self.trace_id = current.trace_id if current else None
+        tracer.add_listener(self._on_span)
+        if self.mode == "cpu":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            interval = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+            self._sampler = StackSampler(threading.get_ident(), interval)
+            self._sampler.start()
+
+    def stop(self):
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        tracer.remove_listener(self._on_span)
+        self.meta["wall_ms"] = round((time.perf_counter() - self.started) * 1000, 3)
+
+    def dump(self, dump_dir: Path) -> Path:
+        """Write profile + metadata; returns the path prefix of the dump."""
+        dump_dir.mkdir(parents=True, exist_ok=True)
+        safe_label = "".join(c if c.isalnum() or c in "-_." else "_" for c in self.label)
+        base = dump_dir / f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{safe_label}_{self.mode}"
+
+        if self._profiler is not None:
+            self._profiler.dump_stats(str(base) + ".prof")
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(40)
+            Path(str(base) + ".txt").write_text(out.getvalue(), encoding="utf-8")
+        if self._sampler is not None:
+            Path(str(base) + ".folded").write_text(self._sampler.folded(), encoding="utf-8")
+            self.meta["samples"] = sum(self._sampler.stacks.values())
+
+        meta = {"label": self.label, "mode": self.mode, "trace_id": self.trace_id, **self.meta, "stages": self.stages}
+        Path(str(base) + ".json").write_text(dumps(meta, indent=True, lenient=True), encoding="utf-8")
+        return base
+
+
+@asynccontextmanager
+async def profile_turn(mode: Optional[str], label: str, **meta: Any) -> AsyncIterator[Optional[ProfileSession]]:
+    """
+    Profile the enclosed turn if `mode` is set; yields None when not profiling.
+
+    Open it inside the turn's root span so stage timings and prompt/history
+    sizes can be picked up from tracing.
+    """
+    if mode not in PROFILE_MODES:
+        yield None
+        return
+    if not _active_lock.acquire(blocking=False):
+        logger.warning("Profile requested for %s while another profile is running, skipping", label)
+        metrics.inc("profiles_skipped_total")
+        yield None
+        return
+
+    session = ProfileSession(mode, label, meta)
+    try:
+        session.start()
+        try:
+            yield session
+        finally:
+            session.stop()
+    finally:
+        _active_lock.release()
+
+    try:
+        base = await asyncio.to_thread(session.dump, get_dump_dir())
+        metrics.inc("profiles_written_total", mode=mode)
+        logger.info("Profile for %s written to %s.*", label, base)
+    except OSError as e:
+        logger.error("Could not write profile for %s: %s", label, e)
@@ -0,0 +1,241 @@
+"""Lightweight tracing: nested spans per turn, exported as JSONL and/or OTLP.
+
+Spans are always timed into the `stage_duration_seconds` histogram; export is
+enabled with TRACING_EXPORTERS (comma-separated: "jsonl", "otlp").
+
+    TRACING_JSONL_PATH            - file for the jsonl exporter (default traces.jsonl)
+    OTEL_EXPORTER_OTLP_ENDPOINT   - collector base URL (default http://localhost:4318)
+    OTEL_SERVICE_NAME             - service.name resource attribute (default aith-mediator)
+"""
+import contextvars
+import functools
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from src.models.serialization import dumps
+from src.observability.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    """One timed stage of a turn."""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"  # "ok" | "error"
+    error: Optional[str] = None
+
+    def set(self, **attributes: Any):
+        """Attach attributes (ids, token counts...) to the span."""
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    @property
+    def duration_s(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_s * 1000, 3),
+            "attributes": self.attributes,
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+class JsonlSpanExporter:
+    """Appends one JSON object per span to a local file."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def export(self, spans: List[Span]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(dumps(span.to_dict(), lenient=True) + "\n")
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPHttpSpanExporter:
+    """Sends spans to an OpenTelemetry collector as OTLP/HTTP JSON (/v1/traces)."""
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def _payload(self, spans: List[Span]) -> Dict[str, Any]:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": _otlp_value(self.service_name)}]},
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [{
+                    "traceId": span.trace_id,
+                    "spanId": span.span_id,
+                    **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+                    "name": span.name,
+                    "kind": 1,  # SPAN_KIND_INTERNAL
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns),
+                    "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+                    "status": {"code": 2, "message": span.error or ""} if span.status == "error" else {"code": 1},
+                } for span in spans],
+            }],
+        }]}
+
+    def export(self, spans: List[Span]):
+        import httpx
+
+        httpx.post(self.url, json=self._payload(spans), timeout=self.timeout).raise_for_status()
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to exporters on a background thread,
+    so a slow collector never adds latency to a turn.
+    """
+
+    def __init__(self, exporters: Optional[List[Any]] = None):
+        self.exporters = exporters or []
+        self._current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=10000)
+        self._worker: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[Span], None]] = []
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        exporters: List[Any] = []
+        for name in filter(None, (n.strip() for n in os.getenv("TRACING_EXPORTERS", "").split(","))):
+            if name == "jsonl":
+                exporters.append(JsonlSpanExporter(Path(os.getenv("TRACING_JSONL_PATH", "traces.jsonl"))))
+            elif name == "otlp":
+                exporters.append(OTLPHttpSpanExporter(
+                    os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318"),
+                    os.getenv("OTEL_SERVICE_NAME", "aith-mediator"),
+                ))
+            else:
+                print(f"Warning: Unknown tracing exporter '{name}', ignoring")
+        return cls(exporters)
+
+    def current_span(self) -> Optional[Span]:
+        return self._current.get()
+
+    def add_listener(self, listener: Callable[[Span], None]):
+        """Call `listener(span)` for every finished span (in-process consumers, e.g. profiling)."""
+        self._listeners = [*self._listeners, listener]
+
+    def remove_listener(self, listener: Callable[[Span], None]):
+        self._listeners = [l for l in self._listeners if l is not listener]
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """
+        Time a stage as a child of the current span.
+
+        Session ids set on an ancestor are inherited so every span of a turn
+        can be filtered by session/partnership.
+        """
+        parent = self._current.get()
+        inherited = {k: v for k, v in (parent.attributes if parent else {}).items() if k in ("session_id", "partnership_id")}
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            start_ns=time.time_ns(),
+        )
+        span.set(**{**inherited, **attributes})
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._current.reset(token)
+            span.end_ns = time.time_ns()
+            metrics.observe("stage_duration_seconds", span.duration_s, stage=name)
+            for listener in self._listeners:
+                try:
+                    listener(span)
+                except Exception as e:
+                    logger.error("Span listener failed: %s", e)
+            self._submit(span)
+
+    def _submit(self, span: Span):
+        if not self.exporters:
+            return
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+            self._worker.start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            metrics.inc("tracing_spans_dropped_total")
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 256:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for exporter in self.exporters:
+                try:
+                    exporter.export(batch)
+                except Exception as e:
+                    logger.warning("Span export via %s failed: %s", type(exporter).__name__, e)
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until queued spans are exported (best effort, for shutdown)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+# Global tracer
+tracer = Tracer.from_env()
+
+
+def traced(name: str) -> Callable:
+    """Decorator: run an async function inside a span of the global tracer."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
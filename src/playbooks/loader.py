@@ -2,10 +2,16 @@
 from pathlib import Path
 from typing import List, Dict
 from src.models.schemas import ConflictClassification, Resolvability, Domain, Nature, Form, ThreatLevel
+from src.prompts.registry import prompt_registry
 
 
 PLAYBOOKS_DIR = Path(__file__).parent.parent.parent / "prompts" / "playbooks"
 
+NO_PLAYBOOK_TEXT = (
+    "# No Specialized Playbook\n\n"
+    "Use general therapeutic approach. Focus on safety and referral to professional."
+)
+
 
 def select_playbooks(classification: ConflictClassification) -> List[str]:
     """
@@ -91,8 +97,17 @@ def load_playbook(playbook_name: str) -> str:
     if not playbook_path.exists():
         raise FileNotFoundError(f"Playbook not found: {playbook_name}")
     
-    with open(playbook_path, "r", encoding="utf-8") as f:
-        return f.read()
+    return prompt_registry.get(f"playbooks/{playbook_name}").compiled
+
+
+def playbook_versions(classification: ConflictClassification) -> Dict[str, str]:
+    """Registry name -> version of every playbook selected for this classification."""
+    versions = {}
+    for name in select_playbooks(classification):
+        if (PLAYBOOKS_DIR / name).exists():
+            prompt = prompt_registry.get(f"playbooks/{name}")
+            versions[prompt.name] = prompt.version
+    return versions
 
 
 def load_selected_playbooks(classification: ConflictClassification) -> str:
@@ -103,7 +118,7 @@ def load_selected_playbooks(classification: ConflictClassification) -> str:
     playbook_names = select_playbooks(classification)
     
     if not playbook_names:
-        return "# No Specialized Playbook\n\nUse general therapeutic approach. Focus on safety and referral to professional."
+        return NO_PLAYBOOK_TEXT
     
     combined = ""
     for name in playbook_names:
@@ -0,0 +1,228 @@
+"""Section-level playbook retrieval with a local BM25 index."""
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from json import JSONDecodeError
+from typing import Dict, List, Optional
+
+from src.llm.tokens import estimate_tokens
+from src.models.schemas import ConflictClassification
+from src.models.serialization import loads
+from src.playbooks.loader import PLAYBOOKS_DIR, select_playbooks, NO_PLAYBOOK_TEXT
+from src.prompts.registry import PromptVersion, prompt_registry
+
+
+# Sections always injected for a selected playbook (matched by heading, lowercase)
+PINNED_SECTIONS = ("core principles", "red flags")
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_ROLE_PREFIX = re.compile(r"^\[user_[12]\]:\s*")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens truncated to 5 chars.
+
+    Truncation is a crude stemmer: it folds most Russian inflections
+    ("ревность", "ревности", "ревнует") into one term.
+    """
+    return [w[:5] for w in _WORD.findall(text.lower()) if len(w) > 2]
+
+
+@dataclass
+class PlaybookSection:
+    """A heading-delimited chunk of a playbook."""
+    playbook: str
+    title: str  # playbook title ("# ..." line)
+    heading: str  # nearest "##"/"###" heading path
+    text: str
+    position: int  # order inside the playbook
+    tokens: int = 0
+    terms: Counter = field(default_factory=Counter)
+
+
+def chunk_playbook(name: str, content: str) -> List[PlaybookSection]:
+    """Split a playbook into sections at "##" and "###" headings."""
+    title = name
+    sections: List[PlaybookSection] = []
+    parent = ""
+    heading = ""
+    heading_line = ""
+    lines: List[str] = []
+
+    def flush():
+        body = "\n".join(line for line in lines if line.strip() != "---").strip()
+        # Heading-only chunks (e.g. "## Key Techniques" directly followed by "###") are skipped
+        if not body:
+            return
+        text = f"{heading_line}\n{body}" if heading_line else body
+        sections.append(PlaybookSection(
+            playbook=name,
+            title=title,
+            heading=heading,
+            text=text,
+            position=len(sections),
+            tokens=estimate_tokens(text),
+            terms=Counter(tokenize(f"{heading}\n{body}")),
+        ))
+
+    for line in content.splitlines():
+        if line.startswith("# "):
+            title = line[2:].strip()
+        elif line.startswith("## ") or line.startswith("### "):
+            flush()
+            lines = []
+            heading_line = line
+            text = line.lstrip("#").strip()
+            if line.startswith("## "):
+                parent = text
+                heading = text
+            else:
+                heading = f"{parent} > {text}" if parent else text
+        else:
+            lines.append(line)
+    flush()
+    return sections
+
+
+class BM25Index:
+    """Okapi BM25 over pre-tokenized sections."""
+
+    def __init__(self, sections: List[PlaybookSection], k1: float = 1.5, b: float = 0.75):
+        self.sections = sections
+        self.k1 = k1
+        self.b = b
+        self.avg_len = (sum(sum(s.terms.values()) for s in sections) / len(sections)) if sections else 0.0
+        df = Counter()
+        for s in sections:
+            df.update(s.terms.keys())
+        n = len(sections)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def score(self, section: PlaybookSection, query_terms: List[str]) -> float:
+        length = sum(section.terms.values())
+        norm = self.k1 * (1 - self.b + self.b * length / (self.avg_len or 1.0))
+        score = 0.0
+        for term in query_terms:
+            tf = section.terms.get(term)
+            if tf:
+                score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return score
+
+
+class PlaybookIndex:
+    """All playbooks chunked by heading and indexed once."""
+
+    def __init__(self, sections: List[PlaybookSection]):
+        self.sections = sections
+        self.bm25 = BM25Index(sections)
+
+    @classmethod
+    def build(cls) -> "PlaybookIndex":
+        sections: List[PlaybookSection] = []
+        for path in sorted(PLAYBOOKS_DIR.glob("*.md")):
+            content = prompt_registry.get(f"playbooks/{path.name}").compiled
+            sections.extend(chunk_playbook(path.name, content))
+        return cls(sections)
+
+    def search(self, query: str, playbooks: List[str], top_k: int) -> List[PlaybookSection]:
+        """Top-k sections of the given playbooks for the query (score > 0 only)."""
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        scored = []
+        for section in self.sections:
+            if section.playbook not in playbooks:
+                continue
+            score = self.bm25.score(section, query_terms)
+            if score > 0:
+                scored.append((score, section))
+        scored.sort(key=lambda x: -x[0])
+        return [section for _, section in scored[:top_k]]
+
+
+_index: Optional[PlaybookIndex] = None
+
+
+def get_playbook_index() -> PlaybookIndex:
+    """Build the index on first use and reuse it afterwards."""
+    global _index
+    if _index is None:
+        _index = PlaybookIndex.build()
+    return _index
+
+
+def _on_prompt_changed(prompt: PromptVersion):
+    """Rebuild the index lazily after a playbook edit."""
+    global _index
+    if prompt.name.startswith("playbooks/"):
+        _index = None
+
+
+prompt_registry.subscribe(_on_prompt_changed)
+
+
+def _message_text(msg) -> str:
+    """Text of a stored history message; assistant JSON turns are reduced to message texts."""
+    if isinstance(msg, dict):
+        role, content = msg.get("role"), msg.get("content") or ""
+    elif hasattr(msg, "type") and hasattr(msg, "content"):  # LangChain BaseMessage
+        role, content = msg.type, msg.content or ""
+    else:
+        return ""
+    if role in ("assistant", "ai"):
+        try:
+            data = loads(content)
+            return "\n".join(m.get("text", "") for m in data.get("messages", []))
+        except (JSONDecodeError, AttributeError):
+            return content
+    return _ROLE_PREFIX.sub("", content)
+
+
+def build_query(messages: List, last_n: int = 4) -> str:
+    """Retrieval query from the last few history messages."""
+    return "\n".join(_message_text(m) for m in messages[-last_n:])
+
+
+def load_relevant_playbook_sections(
+    classification: ConflictClassification,
+    messages: List,
+    top_k: Optional[int] = None,
+    token_budget: Optional[int] = None,
+) -> str:
+    """
+    Select playbooks by classification, then inject only pinned sections
+    plus the top-k sections relevant to the recent messages, within budget.
+    """
+    top_k = top_k if top_k is not None else int(os.getenv("PLAYBOOK_TOP_K", "6"))
+    token_budget = token_budget if token_budget is not None else int(os.getenv("PLAYBOOK_TOKEN_BUDGET", "2000"))
+
+    playbook_names = select_playbooks(classification)
+    if not playbook_names:
+        return NO_PLAYBOOK_TEXT
+
+    index = get_playbook_index()
+    pinned = [
+        s for s in index.sections
+        if s.playbook in playbook_names and s.heading.lower() in PINNED_SECTIONS
+    ]
+    retrieved = index.search(build_query(messages), playbook_names, top_k)
+
+    chosen: List[PlaybookSection] = []
+    seen = set()
+    used = 0
+    for section in pinned + retrieved:
+        if id(section) in seen or used + section.tokens > token_budget:
+            continue
+        seen.add(id(section))
+        chosen.append(section)
+        used += section.tokens
+
+    # Render grouped by playbook, sections in original document order
+    combined = ""
+    for name in playbook_names:
+        parts = sorted((s for s in chosen if s.playbook == name), key=lambda s: s.position)
+        if not parts:
+            continue
+        combined += f"\n\n---\n\n# {parts[0].title}\n\n" + "\n\n".join(p.text for p in parts)
+    return combined
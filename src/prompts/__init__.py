@@ -0,0 +1,4 @@
+"""Prompt registry with hot reload."""
+from .registry import PromptRegistry, PromptVersion, prompt_registry
+
+__all__ = ["PromptRegistry", "PromptVersion", "prompt_registry"]
@@ -0,0 +1,85 @@
+"""Prompt compilation: what is sent to the model vs. what editors see.
+
+Prompt files are written as readable markdown. Before they go to the model,
+`compile_prompt` removes what carries no meaning for it:
+
+- editor comments (`<!-- ... -->`);
+- horizontal rules (`---`, `***`, `___`);
+- bold markers (`**text**` -> `text`);
+- trailing whitespace and repeated blank lines.
+
+Headings, lists, indentation, placeholders and fenced code blocks (JSON
+examples) are kept as they are. `dedupe_lines` drops lines of inserted text
+(playbooks) that the surrounding prompt or an earlier playbook already says.
+
+Compilation is opt-in: the registry serves files verbatim unless
+PROMPT_MINIFY=1 (bold markers carry emphasis some prompts rely on).
+"""
+import os
+import re
+from typing import Iterable, List, Set
+
+_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+_RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_BOLD = re.compile(r"\*\*(?=\S)(.+?)(?<=\S)\*\*")
+_FENCE = "```"
+
+# Shorter lines ("If you see:", "**Example:**") are structure, not boilerplate
+DEDUPE_MIN_CHARS = 30
+
+
+def minify_enabled() -> bool:
+    return os.getenv("PROMPT_MINIFY", "0") == "1"
+
+
+def compile_prompt(text: str) -> str:
+    """Strip non-semantic markdown formatting (see module docstring)."""
+    text = _COMMENT.sub("", text)
+    out: List[str] = []
+    in_fence = False
+    for line in text.splitlines():
+        if line.lstrip().startswith(_FENCE):
+            in_fence = not in_fence
+            out.append(line.rstrip())
+            continue
+        if in_fence:
+            out.append(line)
+            continue
+        if _RULE.match(line):
+            continue
+        line = _BOLD.sub(r"\1", line).rstrip()
+        if not line and (not out or not out[-1]):
+            continue  # one blank line separates blocks; more carry nothing
+        out.append(line)
+    while out and not out[-1]:
+        out.pop()
+    return "\n".join(out)
+
+
+def _key(line: str) -> str:
+    return " ".join(line.split()).lower()
+
+
+def _dedupe_keys(lines: Iterable[str]) -> Set[str]:
+    return {
+        _key(line) for line in lines
+        if len(line.strip()) >= DEDUPE_MIN_CHARS and not line.lstrip().startswith("#")
+    }
+
+
+def dedupe_lines(text: str, *context: str) -> str:
+    """
+    Drop lines of `text` already present in `context` or earlier in `text`.
+
+    Headings and short lines are always kept so the structure survives.
+    """
+    seen = _dedupe_keys(line for block in context for line in block.splitlines())
+    out: List[str] = []
+    for line in text.splitlines():
+        key = _key(line)
+        if len(line.strip()) >= DEDUPE_MIN_CHARS and not line.lstrip().startswith("#"):
+            if key in seen:
+                continue
+            seen.add(key)
+        out.append(line)
+    return "\n".join(out)
@@ -0,0 +1,161 @@
+"""Versioned prompt registry that reloads changed files from prompts/."""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from src.prompts.compiler import compile_prompt, minify_enabled
+
+logger = logging.getLogger(__name__)
+
+PROMPTS_DIR = Path(__file__).parent.parent.parent / "prompts"
+
+
+@dataclass(frozen=True)
+class PromptVersion:
+    """Immutable snapshot of a prompt file."""
+    name: str  # path relative to prompts/, e.g. "therapy.md" or "playbooks/eft.md"
+    content: str  # file as written (editors, API)
+    version: str  # short content hash
+    loaded_at: datetime
+    compiled: str  # what is sent to the model (see src/prompts/compiler.py)
+
+    @property
+    def tag(self) -> str:
+        return f"{self.name}@{self.version}"
+
+
+def content_version(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+
+
+class PromptRegistry:
+    """
+    Holds the current version of every prompt file.
+
+    Readers call `get()` once per turn and keep the returned snapshot, so a
+    reload in the middle of a turn never mixes two versions. Swaps replace
+    the whole mapping in one assignment.
+    """
+
+    def __init__(self, prompts_dir: Path = PROMPTS_DIR, poll_interval: Optional[float] = None):
+        self.prompts_dir = Path(prompts_dir)
+        self.poll_interval = poll_interval or float(os.getenv("PROMPT_RELOAD_INTERVAL", "2.0"))
+        self._prompts: Dict[str, PromptVersion] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._listeners: List[Callable[[PromptVersion], None]] = []
+        self._watch_task: Optional[asyncio.Task] = None
+
+    def _path(self, name: str) -> Path:
+        return self.prompts_dir / name
+
+    def _read(self, name: str) -> tuple:
+        path = self._path(name)
+        mtime = path.stat().st_mtime
+        return path.read_text(encoding="utf-8"), mtime
+
+    def _swap(self, name: str, content: str, mtime: float) -> Optional[PromptVersion]:
+        """Install new content; returns the new version if it actually changed."""
+        current = self._prompts.get(name)
+        version = content_version(content)
+        self._mtimes = {**self._mtimes, name: mtime}
+        if current is not None and current.version == version:
+            return None
+        prompt = PromptVersion(
+            name=name,
+            content=content,
+            version=version,
+            loaded_at=datetime.now(),
+            compiled=compile_prompt(content) if minify_enabled() else content,
+        )
+        self._prompts = {**self._prompts, name: prompt}
+        if current is not None:
+            logger.info("Prompt %s reloaded: %s -> %s", name, current.version, version)
+            for listener in list(self._listeners):
+                try:
+                    listener(prompt)
+                except Exception as e:
+                    logger.error("Prompt listener failed for %s: %s", name, e)
+        return prompt
+
+    def get(self, name: str) -> PromptVersion:
+        """Current version of a prompt (loaded synchronously on first access)."""
+        prompt = self._prompts.get(name)
+        if prompt is None:
+            content, mtime = self._read(name)
+            self._swap(name, content, mtime)
+            prompt = self._prompts[name]
+        return prompt
+
+    def versions(self) -> Dict[str, str]:
+        """name -> version of every loaded prompt."""
+        return {name: p.version for name, p in self._prompts.items()}
+
+    def subscribe(self, listener: Callable[[PromptVersion], None]):
+        """Call `listener(new_version)` whenever a loaded prompt changes."""
+        self._listeners.append(listener)
+
+    async def reload(self, name: str) -> PromptVersion:
+        """Re-read one prompt off the event loop and swap it in if changed."""
+        content, mtime = await asyncio.to_thread(self._read, name)
+        self._swap(name, content, mtime)
+        return self._prompts[name]
+
+    async def write(self, name: str, content: str) -> PromptVersion:
+        """Atomically replace a prompt file and reload it."""
+        path = self._path(name)
+
+        def _write():
+            fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(content)
+                os.replace(tmp, path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+
+        await asyncio.to_thread(_write)
+        return await self.reload(name)
+
+    def _changed_files(self) -> List[str]:
+        changed = []
+        for name in list(self._prompts):
+            try:
+                mtime = self._path(name).stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if mtime != self._mtimes.get(name):
+                changed.append(name)
+        return changed
+
+    async def watch(self):
+        """Poll loaded prompts for changes until cancelled."""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                for name in await asyncio.to_thread(self._changed_files):
+                    await self.reload(name)
+            except Exception as e:
+                logger.error("Prompt watcher error: %s", e)
+
+    def start_watching(self):
+        """Start the background watcher on the running event loop."""
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self.watch())
+
+    async def stop_watching(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+
+
+# Global registry
+prompt_registry = PromptRegistry()
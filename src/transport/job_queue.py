@@ -0,0 +1,272 @@
+"""Durable SQLite job queue between Telegram ingestion and mediator workers.
+
+Handlers enqueue incoming messages and return at once; workers claim jobs
+and run the turns. Guarantees:
+
+- per-partition ordering: only the oldest unfinished job of a partition
+  (partnership) can be claimed, so a couple's messages are processed one
+  by one in arrival order while different couples run in parallel;
+- visibility timeout: a claimed job that is not completed, failed or
+  extended within `visibility_timeout` is claimable again (worker crashed);
+- retries with exponential backoff, then the job is kept as "failed".
+
+Delivery is at-least-once: a worker that dies after sending the replies
+but before `complete` leads to the turn being processed again.
+
+The database can be shared by several processes (see `main.py --worker`).
+"""
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.models.serialization import dumps, loads
+from src.observability.metrics import metrics
+from src.observability.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    partition TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',  -- queued | running | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    locked_until REAL,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_partition ON jobs (partition, status, id);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at);
+"""
+
+# Head of its partition, due, and either queued or abandoned by its worker
+_CLAIM = """
+SELECT id, partition, payload, attempts, created_at FROM jobs AS j
+WHERE status IN ('queued', 'running')
+  AND available_at <= :now
+  AND (status = 'queued' OR locked_until <= :now)
+  AND id = (SELECT MIN(id) FROM jobs WHERE partition = j.partition AND status IN ('queued', 'running'))
+ORDER BY id
+LIMIT 1
+"""
+
+
+class JobFailed(Exception):
+    """Raised by a handler for errors that must not be retried."""
+
+
+@dataclass
+class Job:
+    id: int
+    partition: str
+    payload: Dict[str, Any]
+    attempts: int  # including the current one
+    created_at: float
+
+
+class SQLiteJobQueue:
+    """Job table in a SQLite file; all methods are blocking (call via asyncio.to_thread)."""
+
+    def __init__(
+        self,
+        path: str,
+        visibility_timeout: float = 180.0,
+        max_attempts: int = 3,
+        retry_backoff: float = 5.0,
+    ):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> Optional["SQLiteJobQueue"]:
+        """Queue from TELEGRAM_JOB_QUEUE (path to the SQLite file); None = process inline."""
+        path = os.getenv("TELEGRAM_JOB_QUEUE")
+        if not path:
+            return None
+        return cls(
+            path,
+            visibility_timeout=float(os.getenv("JOB_VISIBILITY_TIMEOUT", "180")),
+            max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+            retry_backoff=float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "5")),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; asyncio.to_thread reuses pool threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, partition: str, payload: Dict[str, Any]) -> int:
+        now = time.time()
+        cur = self._connect().execute(
+            "INSERT INTO jobs (partition, payload, available_at, created_at) VALUES (?, ?, ?, ?)",
+            (partition, dumps(payload), now, now),
+        )
+        metrics.inc("jobs_enqueued_total")
+        return cur.lastrowid
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """Take the next claimable job, or None."""
+        conn = self._connect()
+        now = time.time()
+        # IMMEDIATE: the write lock is taken up front, so two workers can't claim the same job
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(_CLAIM, {"now": now}).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            job_id, partition, payload, attempts, created_at = row
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ?, worker = ? WHERE id = ?",
+                (now + self.visibility_timeout, worker, job_id),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if attempts:
+            metrics.inc("jobs_redelivered_total")
+        return Job(job_id, partition, loads(payload), attempts + 1, created_at)
+
+    def extend(self, job: Job):
+        """Heartbeat: keep a long-running job invisible to other workers."""
+        self._connect().execute(
+            "UPDATE jobs SET locked_until = ? WHERE id = ? AND status = 'running'",
+            (time.time() + self.visibility_timeout, job.id),
+        )
+
+    def complete(self, job: Job):
+        self._connect().execute("DELETE FROM jobs WHERE id = ?", (job.id,))
+        metrics.inc("jobs_completed_total")
+
+    def fail(self, job: Job, error: str, retry: bool = True) -> bool:
+        """Record a failed attempt; returns True if the job will be retried."""
+        if retry and job.attempts < self.max_attempts:
+            delay = self.retry_backoff * 2 ** (job.attempts - 1)
+            self._connect().execute(
+                "UPDATE jobs SET status = 'queued', available_at = ?, locked_until = NULL, last_error = ? WHERE id = ?",
+                (time.time() + delay, error, job.id),
+            )
+            metrics.inc("jobs_retried_total")
+            return True
+        self._connect().execute(
+            "UPDATE jobs SET status = 'failed', locked_until = NULL, last_error = ? WHERE id = ?",
+            (error, job.id),
+        )
+        metrics.inc("jobs_failed_total")
+        return False
+
+    def release(self, job: Job):
+        """Give a job back untouched (worker shutting down): no attempt is charged."""
+        self._connect().execute(
+            "UPDATE jobs SET status = 'queued', attempts = attempts - 1, locked_until = NULL WHERE id = ?",
+            (job.id,),
+        )
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+Handler = Callable[[Job], Awaitable[None]]
+
+
+class JobWorkerPool:
+    """
+    Async workers that claim jobs and run `handler(job)`.
+
+    A handler that returns completes the job; an exception is a failed
+    attempt (retried unless it is `JobFailed` or attempts are used up).
+    """
+
+    def __init__(
+        self,
+        queue: SQLiteJobQueue,
+        handler: Handler,
+        concurrency: int = 4,
+        poll_interval: float = 0.5,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def notify(self):
+        """A job was enqueued in this process: wake idle workers without waiting for the poll."""
+        self._wakeup.set()
+
+    def start(self):
+        for i in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._worker(f"{self._prefix}:{i}")))
+        logger.info("Started %d job workers on %s", self.concurrency, self.queue.path)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, name: str):
+        while True:
+            try:
+                job = await asyncio.to_thread(self.queue.claim, name)
+            except sqlite3.Error as e:
+                logger.error("Job queue claim failed: %s", e)
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _heartbeat(self, job: Job):
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            await asyncio.to_thread(self.queue.extend, job)
+
+    async def _run(self, job: Job):
+        metrics.observe("job_queue_wait_seconds", max(0.0, time.time() - job.created_at))
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            with tracer.span("job.run", job_id=job.id, partition=job.partition, attempt=job.attempts):
+                await self.handler(job)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.queue.release, job)
+            raise
+        except Exception as e:
+            retried = await asyncio.to_thread(
+                self.queue.fail, job, f"{type(e).__name__}: {e}", not isinstance(e, JobFailed),
+            )
+            logger.warning(
+                "Job %d (%s) attempt %d failed: %s%s",
+                job.id, job.partition, job.attempts, e, ", will retry" if retried else ", giving up",
+            )
+        else:
+            await asyncio.to_thread(self.queue.complete, job)
+        finally:
+            heartbeat.cancel()
@@ -3,6 +3,8 @@ from datetime import datetime, timedelta
 from typing import Dict, Optional, Tuple
 from dataclasses import dataclass
 
+from src.observability.memory import approx_size, enforce_history_cap
+
 
 @dataclass
 class Partnership:
@@ -117,13 +119,13 @@ class SessionManager:
         else:
             return partnership.user1_id
     
-    def get_or_create_session(self, partnership_id: str) -> Session:
-        """Get or create session for a partnership."""
+    def get_or_create_session(self, partnership_id: str, session_id: Optional[str] = None) -> Session:
+        """Get or create session for a partnership (`session_id` adopts a known id, e.g. in a worker process)."""
         if partnership_id in self.sessions:
             return self.sessions[partnership_id]
         
         session = Session(
-            session_id=f"s_{partnership_id}_{datetime.now().timestamp()}",
+            session_id=session_id or f"s_{partnership_id}_{datetime.now().timestamp()}",
             partnership_id=partnership_id,
             current_agent="onboarding",
             messages=[],
@@ -158,6 +160,17 @@ class SessionManager:
             return
         
         session.messages.append({"role": role, "content": content})
+        enforce_history_cap(session.session_id, session.messages)
+    
+    def memory_usage(self) -> Dict[str, Dict[str, int]]:
+        """Approximate bytes held per partnership (session history + partnership record)."""
+        usage = {}
+        for partnership_id, session in self.sessions.items():
+            usage[partnership_id] = {
+                "bytes": approx_size(session),
+                "messages": len(session.messages),
+            }
+        return usage
     
     def is_partnership_complete(self, user_id: int) -> bool:
         """Check if partnership has both users."""
@@ -1,10 +1,25 @@
-import json
+import asyncio
 import logging
-from typing import Optional
+import os
+from typing import Callable, Dict, Optional
 from telegram import Update
 from telegram.ext import ContextTypes
 
 from src.agents.graph import process_message
+from src.agents.checkpointed import checkpointing_enabled, get_thread_messages, process_turn
+from src.llm.quotas import QuotaScope
+from src.models.serialization import dumps
+from src.observability.capture import traffic_capture
+from src.observability.memory import memory_report
+from src.observability.profiling import (
+    parse_profile_flag,
+    partnership_profile_mode,
+    profile_turn,
+    profiled_partnerships,
+    set_partnership_profiling,
+)
+from src.observability.tracing import tracer
+from src.transport.job_queue import Job, SQLiteJobQueue
 from src.transport.session_manager import SessionManager
 
 logger = logging.getLogger(__name__)
@@ -13,9 +28,21 @@ logger = logging.getLogger(__name__)
 class TelegramHandlers:
     """Telegram bot handlers for duo mediation."""
     
-    def __init__(self, session_manager: SessionManager, bot_username: str):
+    def __init__(
+        self,
+        session_manager: SessionManager,
+        bot_username: str,
+        job_queue: Optional[SQLiteJobQueue] = None,
+    ):
         self.session_manager = session_manager
         self.bot_username = bot_username
+        # With a job queue, messages are only enqueued here and answered by workers
+        self.job_queue = job_queue
+        self.on_enqueue: Optional[Callable[[], None]] = None
+        # Telegram user ids allowed to run admin commands (/profile)
+        self.admin_ids = {
+            int(x) for x in os.getenv("TELEGRAM_ADMIN_IDS", "").split(",") if x.strip().isdigit()
+        }
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command."""
@@ -87,13 +114,72 @@ class TelegramHandlers:
         )
         await update.message.reply_text(help_text)
     
+    async def profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /profile <partnership_id> [cpu|sampling|off] - admin only."""
+        if not update.effective_user or update.effective_user.id not in self.admin_ids:
+            return
+        
+        if not context.args:
+            enabled = profiled_partnerships()
+            lines = [f"{pid}: {mode}" for pid, mode in enabled.items()] or ["нет"]
+            await update.message.reply_text(
+                "Профилирование включено для:\n" + "\n".join(lines) + "\n\n"
+                "Использование: /profile <partnership_id> [cpu|sampling|off]"
+            )
+            return
+        
+        partnership_id = context.args[0]
+        action = context.args[1].lower() if len(context.args) > 1 else "cpu"
+        mode = None if action == "off" else parse_profile_flag(action)
+        if action != "off" and mode is None:
+            await update.message.reply_text("Режим должен быть cpu, sampling или off")
+            return
+        
+        set_partnership_profiling(partnership_id, mode)
+        logger.info(f"Profiling for {partnership_id} set to {mode} by admin {update.effective_user.id}")
+        await update.message.reply_text(f"Профилирование {partnership_id}: {mode or 'выключено'}")
+    
+    async def memory_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /memory [top_n] - admin only: approximate memory per partnership."""
+        if not update.effective_user or update.effective_user.id not in self.admin_ids:
+            return
+        
+        top_n = int(context.args[0]) if context.args and context.args[0].isdigit() else 5
+        report = memory_report(self.session_manager.memory_usage(), top_n=top_n)
+        lines = [
+            f"Сессий: {report['sessions']}, ~{report['sessions_bytes'] / 1024:.0f} KB",
+            f"RSS процесса: {report['process'].get('rss_bytes', 0) / 1024 / 1024:.1f} MB",
+            "",
+        ]
+        for item in report["top"]:
+            lines.append(f"{item['session_id']}: ~{item['bytes'] / 1024:.0f} KB, {item['messages']} сообщений")
+        await update.message.reply_text("\n".join(lines))
+    
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle text messages from users."""
+        """Handle text messages from users (inline, or via the job queue if enabled)."""
         if not update.effective_user or not update.message or not update.message.text:
             return
         
         user_id = update.effective_user.id
-        message_text = update.message.text
+        partnership = self.session_manager.get_partnership(user_id)
+        if partnership is not None and traffic_capture.enabled:
+            role = "user_1" if partnership.user1_id == user_id else "user_2"
+            traffic_capture.record("tg", partnership.partnership_id, role, update.message.text)
+        
+        if self.job_queue is not None:
+            with tracer.span("telegram.enqueue", user_id=user_id):
+                await self._enqueue_message(update, context)
+            return
+        
+        profile_mode = partnership_profile_mode(partnership.partnership_id) if partnership else None
+        
+        with tracer.span("telegram.handle_message", user_id=user_id):
+            async with profile_turn(profile_mode, label=partnership.partnership_id if partnership else str(user_id)):
+                await self._handle_message(update, context)
+    
+    async def _prepare_turn(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[Dict]:
+        """Check the partnership and describe the turn; None if the user was told why not."""
+        user_id = update.effective_user.id
         
         # Check if partnership is complete
         if not self.session_manager.is_partnership_complete(user_id):
@@ -101,7 +187,7 @@ class TelegramHandlers:
                 "Для начала медиации необходимо создать партнерство.\n\n"
                 "Используйте команду /invite для создания ссылки-приглашения и отправьте её партнеру."
             )
-            return
+            return None
         
         # Show typing indicator
         try:
@@ -115,47 +201,120 @@ class TelegramHandlers:
             await update.message.reply_text(
                 "Ошибка: партнерство не найдено. Используйте /start для начала."
             )
-            return
+            return None
         
         session = self.session_manager.get_or_create_session(partnership.partnership_id)
         
-        # Determine user role (user_1 or user_2)
-        user_role = "user_1" if partnership.user1_id == user_id else "user_2"
+        # Everything a worker (possibly in another process) needs to run the turn
+        return {
+            "user_id": user_id,
+            "text": update.message.text,
+            "partnership_id": partnership.partnership_id,
+            "user1_id": partnership.user1_id,
+            "user2_id": partnership.user2_id,
+            "session_id": session.session_id,
+            # Determine user role (user_1 or user_2)
+            "user_role": "user_1" if partnership.user1_id == user_id else "user_2",
+        }
+    
+    async def _handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Run one mediator turn for a text message and deliver the replies."""
+        turn = await self._prepare_turn(update, context)
+        if turn is None:
+            return
+        tracer.current_span().set(
+            partnership_id=turn["partnership_id"], session_id=turn["session_id"], user_role=turn["user_role"],
+        )
+        await self._run_turn(context.bot, turn)
+    
+    async def _enqueue_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Store the turn in the job queue and return; a worker answers it."""
+        turn = await self._prepare_turn(update, context)
+        if turn is None:
+            return
+        tracer.current_span().set(partnership_id=turn["partnership_id"], session_id=turn["session_id"])
+        job_id = await asyncio.to_thread(self.job_queue.enqueue, turn["partnership_id"], turn)
+        logger.info(f"Queued job {job_id} for {turn['partnership_id']} ({turn['user_role']})")
+        if self.on_enqueue is not None:
+            self.on_enqueue()
+    
+    async def process_job(self, job: Job, bot):
+        """Job queue handler: run a queued turn (retried by the queue if it raises)."""
+        turn = job.payload
+        profile_mode = partnership_profile_mode(turn["partnership_id"])
+        with tracer.span(
+            "telegram.handle_message",
+            user_id=turn["user_id"], partnership_id=turn["partnership_id"],
+            session_id=turn["session_id"], user_role=turn["user_role"],
+        ):
+            async with profile_turn(profile_mode, label=turn["partnership_id"]):
+                await self._run_turn(
+                    bot, turn,
+                    redelivered=job.attempts > 1,
+                    # Earlier attempts fail silently and get retried; the last one tells the user
+                    raise_errors=job.attempts < self.job_queue.max_attempts,
+                )
+    
+    async def _user_message_stored(self, session, user_message: str) -> bool:
+        """A redelivered turn may have stored its user message before failing."""
+        if checkpointing_enabled():
+            messages = await get_thread_messages(session.session_id)
+            last = messages[-1] if messages else None
+            return getattr(last, "type", None) == "human" and getattr(last, "content", None) == user_message
+        return bool(session.messages) and session.messages[-1] == {"role": "user", "content": user_message}
+    
+    async def _run_turn(self, bot, turn: Dict, redelivered: bool = False, raise_errors: bool = False):
+        """Run the mediator for one user message and send the replies to both partners."""
+        session = self.session_manager.get_or_create_session(turn["partnership_id"], session_id=turn["session_id"])
+        user_role = turn["user_role"]
+        quota_scope = QuotaScope(user=str(turn["user_id"]), partnership=turn["partnership_id"])
         
-        # Add user message to session
-        user_message = f"[{user_role}]: {message_text}"
-        self.session_manager.add_message(partnership.partnership_id, "user", user_message)
+        # Add user message to session (in checkpointed mode the graph keeps history)
+        user_message = f"[{user_role}]: {turn['text']}"
+        checkpointed = checkpointing_enabled()
+        already_stored = redelivered and await self._user_message_stored(session, user_message)
+        if not checkpointed and not already_stored:
+            self.session_manager.add_message(turn["partnership_id"], "user", user_message)
         
         try:
             # Process through LangGraph
-            result = await process_message(
-                session_id=session.session_id,
-                messages=session.messages,
-                current_agent=session.current_agent,
-                classification=session.classification,
-            )
+            if checkpointed:
+                message = None if already_stored else {"role": "user", "content": user_message}
+                result = await process_turn(session.session_id, message, quota_scope=quota_scope)
+            else:
+                result = await process_message(
+                    session_id=session.session_id,
+                    messages=session.messages,
+                    current_agent=session.current_agent,
+                    classification=session.classification,
+                    quota_scope=quota_scope,
+                )
             
             response_data = result.get("response")
+            logger.info(
+                f"Session {session.session_id}: agent={result.get('current_agent')} "
+                f"prompts={result.get('prompt_versions')}"
+            )
             
             # Update session state
             if result.get("current_agent"):
                 self.session_manager.update_session(
-                    partnership.partnership_id,
+                    turn["partnership_id"],
                     current_agent=result["current_agent"]
                 )
             
             if result.get("classification"):
                 self.session_manager.update_session(
-                    partnership.partnership_id,
+                    turn["partnership_id"],
                     classification=result["classification"]
                 )
             
-            # Add assistant response to session
-            if response_data:
+            # Add assistant response to session (deadline fallbacks are not part of the dialogue)
+            if response_data and not result.get("fallback") and not checkpointed:
                 self.session_manager.add_message(
-                    partnership.partnership_id,
+                    turn["partnership_id"],
                     "assistant",
-                    json.dumps(response_data, ensure_ascii=False)
+                    result.get("response_json") or dumps(response_data)
                 )
             
             # Parse and send responses to recipients
@@ -166,21 +325,24 @@ class TelegramHandlers:
                     
                     # Determine recipient user_id
                     if recipient == "user_1":
-                        recipient_id = partnership.user1_id
+                        recipient_id = turn["user1_id"]
                     else:
-                        recipient_id = partnership.user2_id
+                        recipient_id = turn["user2_id"]
                     
                     if text and recipient_id:
                         try:
-                            await context.bot.send_message(
-                                chat_id=recipient_id,
-                                text=text
-                            )
+                            with tracer.span("telegram.send_message", recipient=recipient, chars=len(text)):
+                                await bot.send_message(
+                                    chat_id=recipient_id,
+                                    text=text
+                                )
                             logger.info(f"Delivered message to {recipient} (user_id={recipient_id})")
                         except Exception as e:
                             logger.error(f"Failed to deliver message to {recipient_id}: {e}")
         
         except Exception as exc:
+            if raise_errors:
+                raise
             import traceback
             logger.error(f"Error processing message: {exc}")
             traceback.print_exc()
@@ -198,7 +360,7 @@ class TelegramHandlers:
                     "Пожалуйста, попробуйте снова через пару минут."
                 )
             
-            await update.message.reply_text(error_msg)
+            await bot.send_message(chat_id=turn["user_id"], text=error_msg)
     
     async def _handle_user_start(self, update: Update, user_id: int):
         """Handle user starting without invite - create partnership."""
@@ -0,0 +1,23 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app as mediator_app
+
+
+@pytest.fixture
+def client():
+    return TestClient(mediator_app.app)
+
+
+def test_memory_report_denied_without_configured_token(client, monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.get("/api/admin/memory").status_code == 403
+    monkeypatch.setenv("ADMIN_TOKEN", "")
+    assert client.get("/api/admin/memory", headers={"X-Admin-Token": ""}).status_code == 403
+
+
+def test_memory_report_needs_matching_token(client, monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    assert client.get("/api/admin/memory").status_code == 403
+    assert client.get("/api/admin/memory", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/api/admin/memory", headers={"X-Admin-Token": "secret"}).status_code == 200
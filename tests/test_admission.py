@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import pytest
+
+from src.llm.admission import AdmissionController, AdmissionRejected, Priority
+
+
+async def grant_order(controller, requests):
+    """Queue `requests` [(priority, key)] behind a held slot; return the order they are granted in."""
+    held = await controller.acquire(Priority.THERAPY, "holder", 1)
+    order = []
+
+    async def wait(priority, key, label):
+        ticket = await controller.acquire(priority, key, 1)
+        order.append(label)
+        await asyncio.sleep(0)
+        controller.release(ticket)
+
+    tasks = [asyncio.create_task(wait(p, k, f"{k}:{i}")) for i, (p, k) in enumerate(requests)]
+    await asyncio.sleep(0)
+    controller.release(held)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_higher_priority_is_served_first():
+    controller = AdmissionController(max_concurrency=1)
+    order = asyncio.run(grant_order(controller, [
+        (Priority.THERAPY, "a"), (Priority.ONBOARDING, "b"), (Priority.FIRST_TURN, "c"),
+    ]))
+    assert order == ["c:2", "b:1", "a:0"]
+
+
+def test_sessions_take_turns_within_a_priority():
+    controller = AdmissionController(max_concurrency=1, max_queue_per_key=5)
+    order = asyncio.run(grant_order(controller, [
+        (Priority.THERAPY, "busy"), (Priority.THERAPY, "busy"), (Priority.THERAPY, "busy"), (Priority.THERAPY, "calm"),
+    ]))
+    assert order == ["busy:0", "calm:3", "busy:1", "busy:2"]
+
+
+def test_full_queue_per_session_is_rejected():
+    controller = AdmissionController(max_concurrency=1, max_queue_per_key=1)
+
+    async def scenario():
+        await controller.acquire(Priority.THERAPY, "holder", 1)
+        waiting = asyncio.create_task(controller.acquire(Priority.THERAPY, "s", 1))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire(Priority.THERAPY, "s", 1)
+        waiting.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_deadline_while_queued_leaves_the_queue():
+    controller = AdmissionController(max_concurrency=1)
+
+    async def scenario():
+        await controller.acquire(Priority.THERAPY, "holder", 1)
+        with pytest.raises(asyncio.TimeoutError):
+            await controller.acquire(Priority.THERAPY, "s", 1, deadline=time.monotonic() + 0.05)
+        return controller.stats()
+
+    assert asyncio.run(scenario())["queued"] == 0
+
+
+def test_token_budget_keeps_a_single_wake_up_timer():
+    controller = AdmissionController(max_concurrency=10, tokens_per_minute=60)
+    handles = []
+    dispatch = controller._dispatch
+
+    def recording_dispatch():
+        dispatch()
+        handles.append(controller._wakeup)
+
+    controller._dispatch = recording_dispatch
+
+    async def scenario():
+        await controller.acquire(Priority.THERAPY, "a", 60)  # empties the bucket
+        waiters = [asyncio.create_task(controller.acquire(Priority.THERAPY, f"s{i}", 30)) for i in range(3)]
+        await asyncio.sleep(0)
+        live = [h for h in handles if h is not None and not h.cancelled()]
+        for task in waiters:
+            task.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        return live
+
+    assert len(asyncio.run(scenario())) == 1
@@ -0,0 +1,90 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app as mediator_app
+from src.agents.branches import Branch, BranchTree, TurnNode
+
+BEFORE = {"current_agent": "onboarding", "classification": None}
+
+
+def reply(text):
+    return {"messages": [{"recipient": "user_1", "type": "other", "text": text}], "handoff": False}
+
+
+def branch(text):
+    return Branch(reply(text), "onboarding")
+
+
+def texts(branches):
+    return [b.response["messages"][0]["text"] for b in branches]
+
+
+def test_branches_from_result_keeps_primary_first_and_its_json():
+    result = {"response": reply("a"), "alternatives": [reply("b"), reply("c")], "current_agent": "therapy",
+              "classification": None, "response_json": "{stored}"}
+    branches = BranchTree.branches_from_result(result)
+    assert texts(branches) == ["a", "b", "c"]
+    assert branches[0].encoded() == "{stored}"
+    assert all(b.current_agent == "therapy" for b in branches)
+
+
+def test_take_cached_serves_spares_in_order_then_runs_dry():
+    tree = BranchTree()
+    turn = tree.new_turn(BEFORE, [branch("a"), branch("b"), branch("c")])
+    assert texts(turn.branches) == ["a"] and texts(turn.cached) == ["b", "c"]
+    assert texts([turn.take_cached()]) == ["b"]
+    assert texts([turn.take_cached()]) == ["c"]
+    assert turn.take_cached() is None
+    assert turn.snapshot() == {"index": 2, "count": 3, "cached": 0}
+
+
+def test_select_switches_between_kept_branches():
+    turn = TurnNode(before=BEFORE)
+    turn.add(branch("a"))
+    turn.add(branch("b"))
+    assert texts([turn.select(0)]) == ["a"] and turn.active == 0
+    with pytest.raises(IndexError):
+        turn.select(2)
+    assert turn.active == 0
+
+
+def test_close_drops_spares_and_only_the_latest_turn_stays_open():
+    tree = BranchTree()
+    first = tree.new_turn(BEFORE, [branch("a"), branch("spare")])
+    second = tree.new_turn(BEFORE, [branch("b")])
+    assert first.cached == []  # answered against a context that moved on
+    assert tree.open is second
+    tree.close()
+    assert tree.open is None and len(tree.turns) == 2
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = mediator_app.create_session("branches")
+    monkeypatch.setitem(mediator_app.sessions, "branches", session)
+    monkeypatch.delenv("MEDIATOR_CHECKPOINTER", raising=False)
+
+    async def no_llm(**kwargs):
+        raise AssertionError("regenerate must be served from the cache")
+
+    monkeypatch.setattr(mediator_app, "process_message", no_llm)
+    turn = session["branches"].new_turn(BEFORE, [branch("a"), branch("b")])
+    mediator_app.show_branch(session, turn.current)
+    return session
+
+
+def test_regenerate_serves_the_cached_spare_and_branch_switches_back(session):
+    client = TestClient(mediator_app.app)
+    body = client.post("/api/regenerate", json={"session_id": "branches", "prompt_file": "", "user_role": "user_1"}).json()
+    assert body["cached"] and [r["text"] for r in body["responses"]] == ["b"]
+    assert body["branch"] == {"index": 1, "count": 2, "cached": 0}
+
+    body = client.post("/api/branch", json={"session_id": "branches", "index": 0}).json()
+    assert [r["text"] for r in body["responses"]] == ["a"]
+    assert [m["content"] for m in session["ui_messages"]["user_1"]] == ["a"]
+
+
+def test_closed_turn_cannot_be_switched(session):
+    session["branches"].close()
+    client = TestClient(mediator_app.app)
+    assert client.post("/api/branch", json={"session_id": "branches", "index": 0}).status_code == 404
@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+import src.agents.checkpointed as checkpointed
+import src.llm.quotas as quotas
+from src.llm.quotas import QuotaScope, SpendQuotas
+
+SCOPE = QuotaScope(user="u1", partnership="p1")
+
+
+@pytest.fixture
+def exhausted(monkeypatch):
+    monkeypatch.setenv("MEDIATOR_CHECKPOINTER", "memory")
+    monkeypatch.setattr(checkpointed, "_graph", None)
+    monkeypatch.setattr(checkpointed, "_checkpointer", None)
+    spend = SpendQuotas(user_tokens_per_hour=1000)
+    spend.charge(SCOPE, "any", 10_000)
+    monkeypatch.setattr(quotas, "_quotas", spend)
+
+
+def test_quota_reply_keeps_the_message_in_the_thread(exhausted):
+    message = {"role": "user", "content": "[user_1]: Мы опять поругались"}
+
+    async def scenario():
+        result = await checkpointed.process_turn("quota-thread", message, quota_scope=SCOPE)
+        return result, await checkpointed.get_thread_messages("quota-thread")
+
+    result, stored = asyncio.run(scenario())
+    assert result["fallback"]
+    assert [m.content for m in stored] == [message["content"]]
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+import src.agents.graph as graph
+from src.models.schemas import AgentResponse, ConflictClassification, Message, MessageType
+
+HINT = ConflictClassification(
+    resolvability="resolvable", domain="money", nature="rational", form="open",
+    threat_level="surface", confidence=0.99,
+)
+
+HISTORY = [
+    {"role": "user", "content": "[user_1]: Мы постоянно ссоримся из-за денег"},
+    {"role": "user", "content": "[user_2]: Он тратит, не советуясь со мной"},
+    {"role": "user", "content": "[user_1]: Я зарабатываю и могу решать сам"},
+    {"role": "user", "content": "[user_2]: Мне важно, чтобы мы решали вместе"},
+]
+
+
+class ConfidentPreclassifier:
+    def predict(self, text):
+        return HINT
+
+
+class FakeAgent:
+    def __init__(self, name, text):
+        self.name, self.text, self.calls = name, text, 0
+
+    async def process(self, messages, *args, **kwargs):
+        self.calls += 1
+        return AgentResponse(messages=[Message(recipient="user_1", type=MessageType.HOOK, text=self.text)])
+
+
+@pytest.fixture
+def agents(monkeypatch):
+    onboarding = FakeAgent("onboarding", "Расскажите подробнее")
+    therapy = FakeAgent("therapy", "Давайте посмотрим, что стоит за этим спором")
+    monkeypatch.setenv("MEDIATOR_EXECUTOR", "direct")
+    monkeypatch.setattr(graph, "_mediator_graph", None)
+    monkeypatch.setattr(graph, "get_preclassifier", lambda: ConfidentPreclassifier())
+    monkeypatch.setattr(graph, "get_onboarding_agent", lambda: onboarding)
+    monkeypatch.setattr(graph, "get_therapy_agent", lambda: therapy)
+    return onboarding, therapy
+
+
+def run_turn():
+    return asyncio.run(graph.process_message(session_id="t", messages=list(HISTORY)))
+
+
+def test_early_handoff_off_by_default(agents, monkeypatch):
+    monkeypatch.delenv("PRECLASSIFIER_EARLY_HANDOFF", raising=False)
+    onboarding, therapy = agents
+    result = run_turn()
+    assert onboarding.calls == 1 and therapy.calls == 0
+    assert result["current_agent"] == "onboarding"
+
+
+def test_therapy_replies_after_skipped_onboarding(agents, monkeypatch):
+    monkeypatch.setenv("PRECLASSIFIER_EARLY_HANDOFF", "1")
+    onboarding, therapy = agents
+    result = run_turn()
+    assert onboarding.calls == 0 and therapy.calls == 1
+    assert result["current_agent"] == "therapy"
+    assert not result["fallback"]
+    assert [m["text"] for m in result["response"]["messages"]] == ["Давайте посмотрим, что стоит за этим спором"]
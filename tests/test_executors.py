@@ -0,0 +1,103 @@
+"""The LangGraph runtime and DirectExecutor must give the same turns."""
+import asyncio
+
+import pytest
+
+import src.agents.graph as graph
+from src.llm.admission import AdmissionRejected
+from src.llm.hedging import LLMDeadlineExceeded
+from src.models.schemas import AgentResponse, ConflictClassification, Message, MessageType
+
+EXECUTORS = ["langgraph", "direct"]
+
+CLASSIFICATION = ConflictClassification(
+    resolvability="resolvable", domain="household", nature="emotional", form="open", threat_level="surface", confidence=0.9,
+)
+
+HISTORY = [
+    {"role": "user", "content": "[user_1]: Он никогда не моет посуду"},
+    {"role": "user", "content": "[user_2]: Я устаю на работе"},
+]
+
+
+def reply(text, **extra):
+    return AgentResponse(messages=[Message(recipient="user_1", type=MessageType.HOOK, text=text)], **extra)
+
+
+class ScriptedAgent:
+    """Stands in for an agent whose LLM returns `response` (or raises it)."""
+
+    def __init__(self, response):
+        self.response = response
+        self.calls = 0
+
+    async def process(self, messages, *args, **kwargs):
+        self.calls += 1
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+
+def run(monkeypatch, executor, onboarding, therapy, **kwargs):
+    monkeypatch.setenv("MEDIATOR_EXECUTOR", executor)
+    monkeypatch.setattr(graph, "_mediator_graph", None)
+    monkeypatch.setattr(graph, "get_preclassifier", lambda: None)
+    monkeypatch.setattr(graph, "get_onboarding_agent", lambda: onboarding)
+    monkeypatch.setattr(graph, "get_therapy_agent", lambda: therapy)
+    result = asyncio.run(graph.process_message(session_id="s", messages=list(HISTORY), **kwargs))
+    return {key: value for key, value in result.items() if key != "prompt_versions"}, result["prompt_versions"]
+
+
+SCENARIOS = {
+    "onboarding": (lambda: ScriptedAgent(reply("Расскажите подробнее")), lambda: ScriptedAgent(reply("-")), {}),
+    "handoff": (
+        lambda: ScriptedAgent(reply("Спасибо, я поняла", handoff=True, classification=CLASSIFICATION)),
+        lambda: ScriptedAgent(reply("Давайте разберёмся, что стоит за усталостью")),
+        {},
+    ),
+    "therapy": (
+        lambda: ScriptedAgent(reply("-")),
+        lambda: ScriptedAgent(reply("Что вы чувствуете, когда посуда остаётся?")),
+        {"current_agent": "therapy", "classification": CLASSIFICATION},
+    ),
+    "deadline": (lambda: ScriptedAgent(LLMDeadlineExceeded("late")), lambda: ScriptedAgent(reply("-")), {}),
+    "busy": (lambda: ScriptedAgent(AdmissionRejected("full")), lambda: ScriptedAgent(reply("-")), {}),
+}
+
+PLAYBOOKS = {"playbooks/eft.md", "playbooks/gottman.md"}
+
+EXPECTED = {
+    "onboarding": ("onboarding", None, "Расскажите подробнее", False, {"onboarding.md"}),
+    "handoff": ("therapy", CLASSIFICATION, "Давайте разберёмся, что стоит за усталостью", False,
+                {"onboarding.md", "therapy.md"} | PLAYBOOKS),
+    "therapy": ("therapy", CLASSIFICATION, "Что вы чувствуете, когда посуда остаётся?", False, {"therapy.md"} | PLAYBOOKS),
+    "deadline": ("onboarding", None, graph.FALLBACK_TEXT, True, set()),
+    "busy": ("onboarding", None, graph.BUSY_TEXT, True, set()),
+}
+
+
+@pytest.mark.parametrize("executor", EXECUTORS)
+@pytest.mark.parametrize("scenario", list(SCENARIOS))
+def test_turn(monkeypatch, executor, scenario):
+    make_onboarding, make_therapy, kwargs = SCENARIOS[scenario]
+    result, versions = run(monkeypatch, executor, make_onboarding(), make_therapy(), **kwargs)
+    agent, classification, text, fallback, prompts = EXPECTED[scenario]
+    assert result["current_agent"] == agent
+    assert result["classification"] == classification
+    assert [m["text"] for m in result["response"]["messages"]] == [text]
+    assert result["fallback"] is fallback
+    assert set(versions) == prompts
+
+
+@pytest.mark.parametrize("scenario", list(SCENARIOS))
+def test_executors_agree(monkeypatch, scenario):
+    make_onboarding, make_therapy, kwargs = SCENARIOS[scenario]
+    results = [run(monkeypatch, executor, make_onboarding(), make_therapy(), **kwargs) for executor in EXECUTORS]
+    assert results[0] == results[1]
+
+
+@pytest.mark.parametrize("executor", EXECUTORS)
+def test_therapy_turn_skips_onboarding(monkeypatch, executor):
+    onboarding, therapy = ScriptedAgent(reply("-")), ScriptedAgent(reply("Продолжим"))
+    run(monkeypatch, executor, onboarding, therapy, current_agent="therapy", classification=CLASSIFICATION)
+    assert (onboarding.calls, therapy.calls) == (0, 1)
@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+
+import src.agents.graph as graph
+import src.llm.admission as admission
+import src.llm.hedging as hedging
+from src.llm.admission import AdmissionController
+from src.llm.hedging import LatencyTracker, LLMDeadlineExceeded, invoke_with_deadline
+from src.models.schemas import AgentResponse, Message, MessageType
+
+
+class FakeLLM:
+    """Answers call i after delays[i] seconds; remembers which calls were cancelled."""
+
+    def __init__(self, *delays):
+        self.delays = list(delays)
+        self.calls = 0
+        self.cancelled = []
+
+    async def ainvoke(self, messages, **kwargs):
+        call = self.calls
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delays[min(call, len(self.delays) - 1)])
+        except asyncio.CancelledError:
+            self.cancelled.append(call)
+            raise
+        return f"answer {call}"
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    controller = AdmissionController(max_concurrency=4)
+    monkeypatch.setattr(admission, "_controller", controller)
+    monkeypatch.setattr(hedging, "latency_tracker", LatencyTracker())
+    monkeypatch.setenv("LLM_HEDGE_ENABLED", "1")
+    monkeypatch.setenv("LLM_HEDGE_DELAY_SECONDS", "0.05")
+    return controller
+
+
+def test_fast_hedge_wins_and_the_slow_primary_is_cancelled(controller):
+    llm = FakeLLM(2.0, 0.01)
+    started = time.monotonic()
+    result = asyncio.run(invoke_with_deadline(llm, [], deadline=time.monotonic() + 5))
+    assert result == "answer 1"
+    assert time.monotonic() - started < 1.0
+    assert llm.cancelled == [0]
+    assert controller.stats()["active"] == 0
+
+
+def test_primary_answering_before_the_hedge_delay_sends_no_hedge(controller):
+    llm = FakeLLM(0.01)
+    assert asyncio.run(invoke_with_deadline(llm, [], deadline=time.monotonic() + 5)) == "answer 0"
+    assert llm.calls == 1 and controller.stats()["active"] == 0
+
+
+def test_deadline_cancels_every_request(controller):
+    llm = FakeLLM(2.0)
+    with pytest.raises(LLMDeadlineExceeded):
+        asyncio.run(invoke_with_deadline(llm, [], deadline=time.monotonic() + 0.2))
+    assert sorted(llm.cancelled) == [0, 1]
+    assert controller.stats()["active"] == 0
+
+
+def test_hedge_skipped_without_spare_capacity(controller, monkeypatch):
+    monkeypatch.setattr(admission, "_controller", AdmissionController(max_concurrency=1))
+    llm = FakeLLM(0.2)
+    assert asyncio.run(invoke_with_deadline(llm, [], deadline=time.monotonic() + 5)) == "answer 0"
+    assert llm.calls == 1
+
+
+def test_deadline_turns_into_the_fallback_reply(controller, monkeypatch):
+    llm = FakeLLM(2.0)
+
+    class SlowAgent:
+        async def process(self, messages, *args, deadline=None, **kwargs):
+            await invoke_with_deadline(llm, [], deadline=deadline)
+            return AgentResponse(messages=[Message(recipient="user_1", type=MessageType.OTHER, text="-")])
+
+    monkeypatch.setenv("MEDIATOR_EXECUTOR", "direct")
+    monkeypatch.setattr(graph, "_mediator_graph", None)
+    monkeypatch.setattr(graph, "get_preclassifier", lambda: None)
+    monkeypatch.setattr(graph, "get_onboarding_agent", lambda: SlowAgent())
+    history = [{"role": "user", "content": "[user_2]: Привет"}]
+    result = asyncio.run(graph.process_message(session_id="slow", messages=history, deadline_s=0.2))
+    assert result["fallback"]
+    assert result["response"]["messages"] == [{"recipient": "user_2", "type": "other", "text": graph.FALLBACK_TEXT}]
@@ -0,0 +1,66 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app as mediator_app
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = mediator_app.create_session("hist")
+    monkeypatch.setitem(mediator_app.sessions, "hist", session)
+    for i in range(3):
+        mediator_app.add_ui_message(session, "user_1", {"role": "user", "content": f"сообщение {i}"})
+    mediator_app.add_ui_message(session, "user_2", {"role": "assistant", "content": "ответ"})
+    return session
+
+
+@pytest.fixture
+def client():
+    return TestClient(mediator_app.app)
+
+
+def contents(body, role):
+    return [m["content"] for m in body["messages"][role]]
+
+
+def test_full_history(client, session):
+    r = client.get("/api/history/hist")
+    body = r.json()
+    assert body["reset"] and body["cursor"] == mediator_app.history_cursor(session)
+    assert contents(body, "user_1") == ["сообщение 0", "сообщение 1", "сообщение 2"]
+    assert contents(body, "user_2") == ["ответ"]
+
+
+def test_delta_returns_new_and_removed_messages(client, session):
+    cursor = client.get("/api/history/hist").json()["cursor"]
+    mediator_app.add_ui_message(session, "user_1", {"role": "user", "content": "новое"})
+    mediator_app.remove_ui_message(session, "user_2", 0)
+    body = client.get("/api/history/hist", params={"since": cursor}).json()
+    assert not body["reset"]
+    assert contents(body, "user_1") == ["новое"] and contents(body, "user_2") == []
+    assert body["removed"] == [4]
+
+
+def test_unknown_epoch_resets(client, session):
+    body = client.get("/api/history/hist", params={"since": "stale.2"}).json()
+    assert body["reset"] and len(body["messages"]["user_1"]) == 3
+
+
+def test_not_modified_only_for_the_same_request(client, session):
+    full = client.get("/api/history/hist")
+    cursor = full.json()["cursor"]
+    assert client.get("/api/history/hist", headers={"If-None-Match": full.headers["etag"]}).status_code == 304
+
+    delta = client.get("/api/history/hist", params={"since": f"{session['history_epoch']}.1"})
+    assert delta.headers["etag"] != full.headers["etag"]
+    # Another delta's validator must not answer this one
+    other = client.get(
+        "/api/history/hist", params={"since": cursor}, headers={"If-None-Match": delta.headers["etag"]},
+    )
+    assert other.status_code == 200 and contents(other.json(), "user_1") == []
+    again = client.get("/api/history/hist", params={"since": cursor}, headers={"If-None-Match": other.headers["etag"]})
+    assert again.status_code == 304
+
+    mediator_app.add_ui_message(session, "user_1", {"role": "user", "content": "новое"})
+    changed = client.get("/api/history/hist", params={"since": cursor}, headers={"If-None-Match": other.headers["etag"]})
+    assert changed.status_code == 200 and contents(changed.json(), "user_1") == ["новое"]
@@ -0,0 +1,65 @@
+"""Compact re-encoding of stored assistant turns (COMPACT_HISTORY)."""
+import pytest
+
+from src.agents.context import compact_history_enabled, encode_assistant_turn
+from src.models.schemas import AgentResponse, ConflictClassification, Message, MessageType
+from src.models.serialization import loads
+
+STORED = AgentResponse(
+    messages=[
+        Message(recipient="user_1", type=MessageType.ACK, text="Слышу вас 🤍"),
+        Message(recipient="user_2", type=MessageType.INSIGHT, text='Кажется, за "усталостью" стоит обида'),
+    ],
+    handoff=True,
+    classification=ConflictClassification(
+        resolvability="resolvable", domain="household", nature="emotional", form="open",
+        threat_level="surface", confidence=0.9, reasoning="Оба говорят об усталости и быте",
+    ),
+).model_dump_json()
+
+
+def test_round_trip_keeps_messages_and_drops_payload():
+    compact = encode_assistant_turn(STORED)
+    assert len(compact) < len(STORED)
+    assert loads(compact) == {"messages": [
+        {"recipient": "user_1", "type": "ack", "text": "Слышу вас 🤍"},
+        {"recipient": "user_2", "type": "insight", "text": 'Кажется, за "усталостью" стоит обида'},
+    ]}
+    # Still the agent's output schema
+    parsed = AgentResponse.model_validate_json(compact)
+    assert [(m.recipient, m.type, m.text) for m in parsed.messages] == [
+        (m.recipient, m.type, m.text) for m in AgentResponse.model_validate_json(STORED).messages
+    ]
+    assert encode_assistant_turn(compact) == compact
+
+
+@pytest.mark.parametrize("content", [
+    "Просто текст без JSON",
+    '{"messages": [',
+    '["not", "an", "object"]',
+    '{"text": "нет поля messages"}',
+    '{"messages": "not a list"}',
+    "",
+])
+def test_non_agent_content_is_unchanged(content):
+    assert encode_assistant_turn(content) == content
+
+
+def test_empty_and_malformed_messages_are_dropped():
+    content = '{"messages": [{"recipient": "user_1", "type": "ack", "text": ""}, "junk", ' \
+              '{"recipient": "user_2", "type": "hook", "text": "Расскажите подробнее", "extra": "x"}], "handoff": false}'
+    assert loads(encode_assistant_turn(content)) == {"messages": [
+        {"recipient": "user_2", "type": "hook", "text": "Расскажите подробнее"},
+    ]}
+
+
+def test_longer_compact_form_keeps_original():
+    content = '{"messages":[{"text":"ок"}]}'
+    assert encode_assistant_turn(content) == content
+
+
+def test_compact_history_switch(monkeypatch):
+    monkeypatch.delenv("COMPACT_HISTORY", raising=False)
+    assert compact_history_enabled()
+    monkeypatch.setenv("COMPACT_HISTORY", "0")
+    assert not compact_history_enabled()
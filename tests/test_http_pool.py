@@ -0,0 +1,53 @@
+"""The shared LLM connection pool is per event loop and never leaked on a loop change."""
+import asyncio
+import threading
+
+import pytest
+
+import src.llm.http_pool as http_pool
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool(monkeypatch):
+    monkeypatch.setattr(http_pool, "_shared", None)
+    yield
+    if http_pool._shared is not None and not http_pool._shared[1].is_closed:
+        asyncio.run(http_pool._aclose_quietly(http_pool._shared[1]))
+
+
+async def get_client():
+    return http_pool.get_async_http_client()
+
+
+async def get_twice():
+    return http_pool.get_async_http_client(), http_pool.get_async_http_client()
+
+
+def test_same_loop_shares_one_client():
+    first, second = asyncio.run(get_twice())
+    assert first is second
+    assert not first.is_closed
+
+
+def test_new_loop_closes_client_of_finished_loop():
+    old = asyncio.run(get_client())
+    new = asyncio.run(get_client())
+    assert new is not old
+    assert old.is_closed
+    assert not new.is_closed
+
+
+def test_new_loop_closes_client_on_loop_still_running():
+    loop = asyncio.new_event_loop()
+    runner = threading.Thread(target=loop.run_forever)
+    runner.start()
+    try:
+        old = asyncio.run_coroutine_threadsafe(get_client(), loop).result()
+        new = asyncio.run(get_client())
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.01), loop).result()
+        assert new is not old
+        assert old.is_closed
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        runner.join()
+        loop.close()
@@ -0,0 +1,47 @@
+"""Importing core modules must stay cheap: heavy dependencies load on first use."""
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# Generous: catches an eager langgraph/langchain import, not machine noise
+BUDGET_MS = 1500
+
+HEAVY_MODULES = ["langgraph", "langchain_openai", "langchain_core", "openai"]
+
+PROBE = """
+import sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed_ms = (time.perf_counter() - t0) * 1000.0
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(f"{{elapsed_ms:.1f}}|{{','.join(heavy)}}")
+"""
+
+
+def cold_import(module: str):
+    """Import time (ms) in a fresh interpreter and the heavy modules it pulled in."""
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=str(PROJECT_ROOT),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+    elapsed, loaded = out.split("|")
+    return float(elapsed), [m for m in loaded.split(",") if m]
+
+
+@pytest.mark.parametrize("module", [
+    "src.agents.graph",
+    "src.transport.session_manager",
+    "src.playbooks.loader",
+    "src.classification.classifier",
+])
+def test_import_is_lazy_and_fast(module):
+    elapsed, heavy = min(cold_import(module) for _ in range(2))
+    assert heavy == [], f"{module} imports heavy dependencies eagerly"
+    assert elapsed < BUDGET_MS
@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+import pytest
+
+from src.transport.job_queue import SQLiteJobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteJobQueue(str(tmp_path / "jobs.db"), visibility_timeout=60, max_attempts=2, retry_backoff=0)
+
+
+def test_enqueue_claim_complete(queue):
+    job_id = queue.enqueue("couple-1", {"text": "привет"})
+    job = queue.claim("w1")
+    assert (job.id, job.partition, job.payload, job.attempts) == (job_id, "couple-1", {"text": "привет"}, 1)
+    assert queue.claim("w2") is None  # running and not timed out
+    queue.complete(job)
+    assert queue.stats() == {}
+
+
+def test_partition_is_processed_in_order(queue):
+    first = queue.enqueue("couple-1", {"n": 1})
+    queue.enqueue("couple-1", {"n": 2})
+    other = queue.enqueue("couple-2", {"n": 3})
+    assert queue.claim("w1").id == first
+    assert queue.claim("w2").id == other  # couple-1 is blocked until its head finishes
+    assert queue.claim("w3") is None
+
+
+def test_failed_job_is_retried_then_kept_as_failed(queue):
+    queue.enqueue("couple-1", {})
+    job = queue.claim("w1")
+    assert queue.fail(job, "boom") is True
+    retry = queue.claim("w1")
+    assert retry.id == job.id and retry.attempts == 2
+    assert queue.fail(retry, "boom again") is False
+    assert queue.claim("w1") is None
+    assert queue.stats() == {"failed": 1}
+
+
+def test_non_retryable_failure(queue):
+    queue.enqueue("couple-1", {})
+    assert queue.fail(queue.claim("w1"), "bad payload", retry=False) is False
+    assert queue.stats() == {"failed": 1}
+
+
+def test_abandoned_job_is_redelivered(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"), visibility_timeout=0.05)
+    queue.enqueue("couple-1", {})
+    job = queue.claim("crashed-worker")
+    time.sleep(0.1)
+    again = queue.claim("w2")
+    assert again.id == job.id and again.attempts == 2
+
+
+def test_release_does_not_charge_an_attempt(queue):
+    queue.enqueue("couple-1", {})
+    queue.release(queue.claim("w1"))
+    assert queue.claim("w1").attempts == 1
+
+
+def test_worker_requires_shared_checkpointer(tmp_path, monkeypatch):
+    import main
+
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "123:abc")
+    monkeypatch.setenv("TELEGRAM_BOT_USERNAME", "mediator_bot")
+    monkeypatch.setenv("TELEGRAM_JOB_QUEUE", str(tmp_path / "jobs.db"))
+    monkeypatch.delenv("MEDIATOR_CHECKPOINTER", raising=False)
+    with pytest.raises(ValueError, match="MEDIATOR_CHECKPOINTER"):
+        asyncio.run(main.main(worker_only=True))
@@ -0,0 +1,141 @@
+import asyncio
+import importlib.util
+import time
+from pathlib import Path
+
+import httpx
+import openai
+import pytest
+
+import src.llm.routing as routing
+from src.llm.routing import Endpoint, EndpointHealth, LLMRouter, is_endpoint_failure
+
+STUB_PATH = Path(__file__).resolve().parents[1] / "eval" / "stub_llm_server.py"
+REQUEST = httpx.Request("POST", "http://llm.local/v1/chat/completions")
+
+
+def status_error(status):
+    response = httpx.Response(status, request=REQUEST)
+    return openai.APIStatusError(f"HTTP {status}", response=response, body=None)
+
+
+class FakeClient:
+    """Chat client whose calls pop scripted outcomes (an exception or a reply)."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def fresh_health(monkeypatch):
+    monkeypatch.setattr(routing, "_health", {})
+    monkeypatch.setenv("LLM_BREAKER_FAILURES", "2")
+    monkeypatch.setenv("LLM_BREAKER_COOLDOWN_SECONDS", "0.2")
+
+
+def router_with(clients, fallback=()):
+    endpoints = [Endpoint(name=name, fallback=name in fallback) for name in clients]
+    router = LLMRouter("gpt-test", 0.0, endpoints=endpoints)
+    router._client = lambda endpoint, model: clients[endpoint.name]
+    return router
+
+
+@pytest.mark.parametrize("exc, failure", [
+    (openai.APITimeoutError(request=REQUEST), True),
+    (openai.APIConnectionError(request=REQUEST), True),
+    (status_error(429), True),
+    (status_error(503), True),
+    (status_error(400), False),
+    (status_error(401), False),
+    (status_error(422), False),
+    (ValueError("bad prompt"), False),
+])
+def test_error_classification(exc, failure):
+    assert is_endpoint_failure(exc) is failure
+
+
+def test_failover_to_the_next_endpoint():
+    primary, backup = FakeClient([status_error(503)]), FakeClient(["ok"])
+    router = router_with({"primary": primary, "backup": backup}, fallback={"backup"})
+    assert asyncio.run(router.ainvoke([])) == "ok"
+    assert (primary.calls, backup.calls) == (1, 1)
+
+
+def test_client_error_does_not_fail_over_or_trip_the_breaker():
+    primary, backup = FakeClient([status_error(400)]), FakeClient(["ok"])
+    router = router_with({"primary": primary, "backup": backup}, fallback={"backup"})
+    for _ in range(5):
+        with pytest.raises(openai.APIStatusError):
+            asyncio.run(router.ainvoke([]))
+    assert backup.calls == 0
+    assert routing.get_endpoint_health("primary").state == EndpointHealth.CLOSED
+
+
+def test_breaker_opens_then_recovers_half_open():
+    primary = FakeClient([status_error(503), status_error(503), "recovered"])
+    router = router_with({"primary": primary})
+    for _ in range(2):
+        with pytest.raises(openai.APIStatusError):
+            asyncio.run(router.ainvoke([]))
+    health = routing.get_endpoint_health("primary")
+    assert health.state == EndpointHealth.OPEN
+    with pytest.raises(routing.NoHealthyEndpoint):
+        asyncio.run(router.ainvoke([]))
+
+    time.sleep(0.25)
+    assert health.state == EndpointHealth.HALF_OPEN
+    assert asyncio.run(router.ainvoke([])) == "recovered"
+    assert health.state == EndpointHealth.CLOSED
+
+
+def test_failed_half_open_trial_reopens_the_breaker():
+    health = EndpointHealth("x")
+    health.record_failure()
+    health.record_failure()
+    time.sleep(0.25)
+    assert health.allow_request() and not health.allow_request()  # one trial at a time
+    health.record_failure()
+    assert health.state == EndpointHealth.OPEN
+
+
+def load_stub():
+    spec = importlib.util.spec_from_file_location("stub_llm_server", STUB_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class PortTransport(httpx.AsyncBaseTransport):
+    """Sends each request to the in-process stub app listening on its URL's port."""
+
+    def __init__(self, apps):
+        self.transports = {port: httpx.ASGITransport(app=app) for port, app in apps.items()}
+
+    async def handle_async_request(self, request):
+        return await self.transports[request.url.port].handle_async_request(request)
+
+
+def test_failover_against_stub_servers(monkeypatch):
+    stub = load_stub()
+    apps = {9001: stub.build_app(0, 1.0, 6, "a"), 9002: stub.build_app(0, 0.0, 6, "b")}
+    monkeypatch.setenv("STUB_KEY", "stub")
+    monkeypatch.setattr(routing, "get_async_http_client", lambda: httpx.AsyncClient(transport=PortTransport(apps)))
+    router = LLMRouter("gpt-test", 0.0, endpoints=[
+        Endpoint(name="a", base_url="http://127.0.0.1:9001/v1", api_key_env="STUB_KEY"),
+        Endpoint(name="b", base_url="http://127.0.0.1:9002/v1", api_key_env="STUB_KEY", fallback=True),
+    ])
+
+    async def two_calls():
+        return [await router.ainvoke([("user", "[user_1]: привет")]) for _ in range(2)]
+
+    first, second = asyncio.run(two_calls())
+    assert "[b]" in first.content and "[b]" in second.content
+    assert routing.get_endpoint_health("a").state == EndpointHealth.OPEN
@@ -0,0 +1,57 @@
+from src.observability.memory import ARCHIVE_NOTE, SessionCaps, enforce_history_cap
+from src.observability.metrics import metrics
+
+
+def history(n):
+    return [{"role": "user", "content": f"[user_1]: сообщение {i} " + "x" * 200} for i in range(n)]
+
+
+def test_history_archived_over_cap(tmp_path):
+    messages = history(50)
+    caps = SessionCaps(max_bytes=2000, keep_messages=5, archive_dir=str(tmp_path))
+    assert enforce_history_cap("s1", messages, caps=caps)
+    assert messages[0]["content"] == ARCHIVE_NOTE.format(count=45)
+    assert len(messages) == 6
+    assert (tmp_path / "s1.jsonl").read_text(encoding="utf-8").count("\n") == 45
+
+
+def test_history_kept_when_archive_fails(tmp_path):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    messages = history(50)
+    before = list(messages)
+    caps = SessionCaps(max_bytes=2000, keep_messages=5, archive_dir=str(blocker))
+    failures = metrics.snapshot()["counters"].get("session_archive_failures_total", 0)
+    assert not enforce_history_cap("s1", messages, caps=caps)
+    assert messages == before
+    assert metrics.snapshot()["counters"]["session_archive_failures_total"] == failures + 1
+
+
+def test_web_session_trim_moves_the_history_cursor(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import app as mediator_app
+
+    monkeypatch.setenv("SESSION_MAX_BYTES", "2000")
+    monkeypatch.setenv("SESSION_KEEP_MESSAGES", "5")
+    monkeypatch.setenv("SESSION_ARCHIVE_DIR", str(tmp_path))
+    session = mediator_app.create_session("web-cap")
+    monkeypatch.setitem(mediator_app.sessions, "web-cap", session)
+    for msg in history(20):
+        session["messages"].append(msg)
+        mediator_app.add_ui_message(session, "user_1", {"role": "user", "content": msg["content"]})
+    client = TestClient(mediator_app.app)
+    before = client.get("/api/history/web-cap")
+    dropped = [m["seq"] for m in session["ui_messages"]["user_1"][:15]]
+
+    mediator_app.enforce_session_cap(session)
+
+    assert len(session["ui_messages"]["user_1"]) == 5
+    assert '"kind":"ui_user_1"' in (tmp_path / "web-cap.jsonl").read_text(encoding="utf-8")
+    after = client.get(
+        "/api/history/web-cap", params={"since": before.json()["cursor"]},
+        headers={"If-None-Match": before.headers["etag"]},
+    )
+    assert after.status_code == 200
+    assert after.json()["removed"] == dropped
+    assert after.json()["cursor"] != before.json()["cursor"]
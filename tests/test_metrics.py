@@ -0,0 +1,46 @@
+"""Prometheus text rendering of the in-memory metrics registry."""
+from fastapi.testclient import TestClient
+
+import app as mediator_app
+from src.observability.metrics import MetricsRegistry, metrics
+
+
+def test_render_counters_and_histograms():
+    registry = MetricsRegistry()
+    registry.inc("turns_total", agent="therapy")
+    registry.inc("turns_total", 2, agent="onboarding")
+    registry.observe("stage_seconds", 0.3, buckets=(0.1, 0.5), stage="llm")
+
+    assert registry.render_prometheus() == (
+        "# TYPE turns_total counter\n"
+        'turns_total{agent="onboarding"} 2\n'
+        'turns_total{agent="therapy"} 1\n'
+        "# TYPE stage_seconds histogram\n"
+        'stage_seconds_bucket{stage="llm",le="0.1"} 0\n'
+        'stage_seconds_bucket{stage="llm",le="0.5"} 1\n'
+        'stage_seconds_bucket{stage="llm",le="+Inf"} 1\n'
+        'stage_seconds_count{stage="llm"} 1\n'
+        'stage_seconds_sum{stage="llm"} 0.3\n'
+    )
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.inc("errors_total", error='bad "json"\nat C:\\prompts')
+
+    assert registry.render_prometheus() == (
+        "# TYPE errors_total counter\n"
+        'errors_total{error="bad \\"json\\"\\nat C:\\\\prompts"} 1\n'
+    )
+
+
+def test_metrics_endpoint(monkeypatch):
+    monkeypatch.setattr(metrics, "_counters", type(metrics._counters)(float))
+    monkeypatch.setattr(metrics, "_histograms", {})
+    metrics.inc("prompt_turns_total", prompt="therapy.md", version="abc")
+
+    response = TestClient(mediator_app.app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'prompt_turns_total{prompt="therapy.md",version="abc"} 1\n' in response.text
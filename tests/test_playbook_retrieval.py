@@ -0,0 +1,73 @@
+import pytest
+
+import src.playbooks.retrieval as retrieval
+from src.models.schemas import ConflictClassification
+from src.playbooks.retrieval import PlaybookIndex, chunk_playbook, load_relevant_playbook_sections
+
+PLAYBOOK = """# Тестовый подход
+
+## Core Principles
+Слушать партнёра до конца.
+
+---
+
+## Key Techniques
+
+### Бюджет
+Обсуждайте деньги и общий бюджет раз в неделю, расходы записывайте вместе.
+
+### Ревность
+Ревность снижается, когда партнёр заранее рассказывает о встречах.
+
+### Родители
+Договоритесь, как часто вы навещаете родителей.
+
+## Red Flags
+Угрозы и насилие: остановить сессию.
+"""
+
+CLASSIFICATION = ConflictClassification(
+    resolvability="resolvable", domain="money", nature="rational", form="open", threat_level="surface", confidence=0.9,
+)
+
+MESSAGES = [{"role": "user", "content": "[user_1]: Мы опять спорим про деньги и бюджет"}]
+
+
+@pytest.fixture(autouse=True)
+def fixture_index(monkeypatch):
+    monkeypatch.setattr(retrieval, "_index", PlaybookIndex(chunk_playbook("test.md", PLAYBOOK)))
+    monkeypatch.setattr(retrieval, "select_playbooks", lambda classification: ["test.md"])
+
+
+def test_sections_split_at_headings():
+    sections = chunk_playbook("test.md", PLAYBOOK)
+    assert [s.heading for s in sections] == [
+        "Core Principles", "Key Techniques > Бюджет", "Key Techniques > Ревность",
+        "Key Techniques > Родители", "Red Flags",
+    ]
+    assert all(s.title == "Тестовый подход" for s in sections)
+    assert "---" not in sections[0].text
+
+
+def test_pinned_and_relevant_sections_are_injected():
+    text = load_relevant_playbook_sections(CLASSIFICATION, MESSAGES, top_k=1, token_budget=10_000)
+    assert "Слушать партнёра" in text and "Угрозы и насилие" in text  # pinned
+    assert "общий бюджет" in text
+    assert "Ревность" not in text and "родителей" not in text
+    # Document order is kept: pinned Red Flags comes after the retrieved technique
+    assert text.index("общий бюджет") < text.index("Угрозы и насилие")
+
+
+def test_token_budget_is_respected():
+    sections = {s.heading: s for s in retrieval._index.sections}
+    budget = sections["Core Principles"].tokens + sections["Red Flags"].tokens
+    text = load_relevant_playbook_sections(CLASSIFICATION, MESSAGES, top_k=3, token_budget=budget)
+    assert "общий бюджет" not in text  # does not fit after the pinned sections
+    assert "Слушать партнёра" in text and "Угрозы и насилие" in text
+
+
+def test_no_match_keeps_only_pinned_sections():
+    text = load_relevant_playbook_sections(
+        CLASSIFICATION, [{"role": "user", "content": "[user_2]: Привет"}], top_k=3, token_budget=10_000,
+    )
+    assert "Слушать партнёра" in text and "бюджет" not in text
@@ -0,0 +1,25 @@
+from src.classification.preclassifier import build_training_examples
+
+LABELS = {"resolvability": "resolvable", "domain": "household", "nature": "emotional", "form": "open", "threat_level": "surface"}
+
+
+def _turn(text, **extra):
+    return {"user_text": text, **extra}
+
+
+def test_labels_from_parsed_classification():
+    record = {"turns": [_turn("a"), _turn("b", classification=LABELS), _turn("c")]}
+    examples = build_training_examples([record])
+    assert [text for text, _ in examples] == ["a", "a\nb"]
+    assert examples[0][1] == LABELS
+
+
+def test_labels_from_raw_response():
+    record = {"turns": [_turn("a", raw_response={"classification": None}), _turn("b", raw_response={"classification": LABELS})]}
+    examples = build_training_examples([record])
+    assert len(examples) == 2 and examples[-1][1] == LABELS
+
+
+def test_unlabeled_transcript_yields_nothing():
+    record = {"turns": [_turn("a", raw_response={"classification": None}), _turn("b")]}
+    assert build_training_examples([record]) == []
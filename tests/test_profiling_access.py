@@ -0,0 +1,33 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app as mediator_app
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setenv("PROFILE_DUMP_DIR", str(tmp_path))
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    monkeypatch.delenv("PROFILE_ALLOW_REQUESTS", raising=False)
+    # No lifespan: an invalid body is rejected (422) without running a turn,
+    # but still passes through the profiling middleware
+    return TestClient(mediator_app.app)
+
+
+def test_profile_flag_ignored_without_admin_token(client, tmp_path):
+    r = client.post("/api/chat?profile=1", json={})
+    assert r.status_code == 422
+    r = client.post("/api/chat", json={}, headers={"X-Profile": "sampling", "X-Admin-Token": "wrong"})
+    assert r.status_code == 422
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_profile_flag_honoured_with_admin_token(client, tmp_path):
+    client.post("/api/chat?profile=1", json={}, headers={"X-Admin-Token": "secret"})
+    assert any(p.suffix == ".prof" for p in tmp_path.iterdir())
+
+
+def test_profile_flag_needs_configured_token(client, monkeypatch, tmp_path):
+    monkeypatch.setenv("ADMIN_TOKEN", "")
+    client.post("/api/chat?profile=1", json={}, headers={"X-Admin-Token": ""})
+    assert list(tmp_path.iterdir()) == []
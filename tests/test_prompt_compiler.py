@@ -0,0 +1,70 @@
+"""Prompt minification (opt-in) and playbook line dedupe."""
+from src.prompts.compiler import compile_prompt, dedupe_lines, minify_enabled
+from src.prompts.registry import PromptRegistry
+
+PROMPT = """# Роль
+
+<!-- заметка для редакторов -->
+Ты **медиатор** для пары.   
+
+---
+
+
+
+- пункт **один**
+  - вложенный пункт
+
+```json
+{"text": "**как есть**"}
+```
+***
+"""
+
+LONG_A = "Отражайте чувства обоих партнёров, не вставая на сторону одного из них."
+LONG_B = "Предложите паре короткое упражнение на активное слушание до следующей встречи."
+
+
+def test_compile_strips_formatting_but_keeps_structure():
+    assert compile_prompt(PROMPT) == (
+        "# Роль\n"
+        "\n"
+        "Ты медиатор для пары.\n"
+        "\n"
+        "- пункт один\n"
+        "  - вложенный пункт\n"
+        "\n"
+        "```json\n"
+        '{"text": "**как есть**"}\n'
+        "```"
+    )
+
+
+def test_compile_keeps_lone_asterisks():
+    assert compile_prompt("2 * 3 = 6, ** не жирный") == "2 * 3 = 6, ** не жирный"
+
+
+def test_minify_is_opt_in(monkeypatch, tmp_path):
+    (tmp_path / "therapy.md").write_text(PROMPT, encoding="utf-8")
+
+    monkeypatch.delenv("PROMPT_MINIFY", raising=False)
+    assert not minify_enabled()
+    assert PromptRegistry(prompts_dir=tmp_path).get("therapy.md").compiled == PROMPT
+
+    monkeypatch.setenv("PROMPT_MINIFY", "1")
+    assert minify_enabled()
+    assert PromptRegistry(prompts_dir=tmp_path).get("therapy.md").compiled == compile_prompt(PROMPT)
+
+
+def test_dedupe_drops_lines_already_in_context():
+    playbook = f"## Техники\n{LONG_A}\n{LONG_B}"
+    assert dedupe_lines(playbook, f"# Промпт\n  {LONG_A.upper()}  ") == f"## Техники\n{LONG_B}"
+
+
+def test_dedupe_drops_repeats_within_text():
+    text = f"## EFT\n{LONG_B}\n\n## Gottman\n{LONG_B}\n"
+    assert dedupe_lines(text) == f"## EFT\n{LONG_B}\n\n## Gottman"
+
+
+def test_dedupe_keeps_headings_and_short_lines():
+    text = "## Пример\nЕсли видите:\n## Пример\nЕсли видите:"
+    assert dedupe_lines(text, text) == text
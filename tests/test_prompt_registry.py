@@ -0,0 +1,63 @@
+"""Hot reload of prompt files: atomic writes, polling and subscribers."""
+import asyncio
+import os
+
+from src.prompts.registry import PromptRegistry, content_version
+
+
+def make_registry(tmp_path, text="Версия 1"):
+    (tmp_path / "therapy.md").write_text(text, encoding="utf-8")
+    return PromptRegistry(prompts_dir=tmp_path, poll_interval=0.01)
+
+
+def test_write_swaps_version_and_notifies(tmp_path):
+    registry = make_registry(tmp_path)
+    before = registry.get("therapy.md")
+    seen = []
+    registry.subscribe(seen.append)
+
+    after = asyncio.run(registry.write("therapy.md", "Версия 2"))
+
+    assert after.version == content_version("Версия 2") != before.version
+    assert registry.get("therapy.md") is after
+    assert (tmp_path / "therapy.md").read_text(encoding="utf-8") == "Версия 2"
+    assert [p.version for p in seen] == [after.version]
+    # The temp file was renamed into place, nothing left behind
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["therapy.md"]
+    # Snapshots taken before the swap keep their content
+    assert before.content == "Версия 1"
+
+
+def test_watcher_picks_up_edits(tmp_path):
+    registry = make_registry(tmp_path)
+    before = registry.get("therapy.md")
+    seen = []
+    registry.subscribe(seen.append)
+
+    async def edit_and_poll():
+        registry.start_watching()
+        path = tmp_path / "therapy.md"
+        path.write_text("Версия 2", encoding="utf-8")
+        stat = path.stat()
+        os.utime(path, (stat.st_atime, stat.st_mtime + 1))
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if seen:
+                break
+        await registry.stop_watching()
+
+    asyncio.run(edit_and_poll())
+
+    assert registry.get("therapy.md").version == content_version("Версия 2") != before.version
+    assert [p.name for p in seen] == ["therapy.md"]
+    assert registry.versions() == {"therapy.md": content_version("Версия 2")}
+
+
+def test_unchanged_content_does_not_notify(tmp_path):
+    registry = make_registry(tmp_path)
+    before = registry.get("therapy.md")
+    seen = []
+    registry.subscribe(seen.append)
+
+    assert asyncio.run(registry.write("therapy.md", "Версия 1")) is before
+    assert seen == []
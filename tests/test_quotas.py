@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from src.llm.quotas import QuotaExceeded, QuotaScope, SpendQuotas, spending
+from src.llm.routing import Endpoint, LLMRouter
+
+SCOPE = QuotaScope(user="u1", partnership="p1")
+
+
+def quotas(**kwargs):
+    return SpendQuotas(user_tokens_per_hour=1000, soft_fraction=0.25, soft_model="gpt-cheap", soft_interval=0, **kwargs)
+
+
+def test_under_allowance_runs_normally():
+    spend = asyncio.run(quotas().admit(SCOPE))
+    assert not spend.soft and spend.model is None
+
+
+def test_soft_limit_downgrades_the_model():
+    q = quotas()
+    q.charge(SCOPE, "gpt-4.1", 800)
+    spend = asyncio.run(q.admit(SCOPE))
+    assert spend.soft and spend.model == "gpt-cheap"
+
+    router = LLMRouter("gpt-4.1", 0.0, endpoints=[Endpoint(name="main"), Endpoint(name="pinned", model="gpt-pinned")])
+    with spending(spend):
+        assert router._model(router.endpoints[0]) == "gpt-cheap"
+        assert router._model(router.endpoints[0], "gpt-light") == "gpt-cheap"
+        assert router._model(router.endpoints[1]) == "gpt-pinned"  # endpoints that pin a model keep it
+    assert router._model(router.endpoints[0]) == "gpt-4.1"
+
+
+def test_hard_limit_refuses_the_turn():
+    q = quotas()
+    q.charge(SCOPE, "gpt-4.1", 1200)
+    with pytest.raises(QuotaExceeded):
+        asyncio.run(q.admit(SCOPE))
+
+
+def test_model_cost_weights_the_charge():
+    q = quotas(model_costs={"gpt-cheap": 0.1})
+    assert q.charge(SCOPE, "gpt-cheap", 1000) == pytest.approx(100)
+    assert q.status(SCOPE) == "ok"
+
+
+def test_soft_limited_user_is_paced():
+    q = SpendQuotas(user_tokens_per_hour=1000, soft_interval=0.2)
+    q.charge(SCOPE, "m", 800)
+
+    async def two_turns():
+        await q.admit(SCOPE)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await q.admit(SCOPE)
+        return loop.time() - started
+
+    assert asyncio.run(two_turns()) >= 0.15
+
+
+def test_idle_full_buckets_are_pruned_without_persistence():
+    q = quotas(prune_interval=0)
+    for i in range(50):
+        asyncio.run(q.admit(QuotaScope(user=f"u{i}", partnership=f"p{i}")))
+    asyncio.run(q.admit(SCOPE))
+    assert q.stats()["buckets"] <= 1
+    assert len(q._last_turn) <= 1
+
+    q.charge(SCOPE, "m", 500)
+    asyncio.run(q.admit(QuotaScope(user="other", partnership="other")))
+    assert "user:u1" in q._buckets  # a bucket in debt is kept
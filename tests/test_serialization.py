@@ -0,0 +1,38 @@
+import pytest
+
+from src.agents.onboarding import OnboardingAgent
+from src.agents.therapy import TherapyAgent
+from src.models.serialization import dumps, loads
+from src.observability.tracing import JsonlSpanExporter, Span
+from src.playbooks.retrieval import _message_text
+
+
+def test_round_trip_keeps_non_ascii_compact():
+    text = dumps({"text": "привет", "n": [1, 2]})
+    assert text == '{"text":"привет","n":[1,2]}'
+    assert loads(text) == {"text": "привет", "n": [1, 2]}
+
+
+def test_unknown_objects_fail_unless_lenient():
+    with pytest.raises(TypeError):
+        dumps({"x": object()})
+    assert dumps({"x": 1j}, lenient=True) == '{"x":"1j"}'
+
+
+def test_span_export_writes_odd_attributes(tmp_path):
+    span = Span(name="s", trace_id="t", span_id="1", parent_id=None, start_ns=0, end_ns=1, attributes={"v": {1, 2}})
+    JsonlSpanExporter(tmp_path / "spans.jsonl").export([span])
+    assert loads((tmp_path / "spans.jsonl").read_text(encoding="utf-8"))["attributes"]["v"] == "{1, 2}"
+
+
+@pytest.mark.parametrize("agent_cls", [OnboardingAgent, TherapyAgent])
+def test_non_json_model_output_becomes_plain_text(agent_cls):
+    agent = agent_cls.__new__(agent_cls)
+    response = agent._parse_response("Просто текст")
+    assert [m.text for m in response.messages] == ["Просто текст"]
+
+
+def test_retrieval_reads_assistant_json_and_plain_text():
+    stored = {"role": "assistant", "content": dumps({"messages": [{"text": "a"}, {"text": "b"}]})}
+    assert _message_text(stored) == "a\nb"
+    assert _message_text({"role": "assistant", "content": "не JSON"}) == "не JSON"
@@ -0,0 +1,47 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import app as mediator_app
+from src.models.serialization import loads
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("MEDIATOR_WARMUP", "0")
+    monkeypatch.delenv("MEDIATOR_CHECKPOINTER", raising=False)
+
+    async def reply(**kwargs):
+        return {
+            "response": {"messages": [
+                {"recipient": "user_1", "type": "ack", "text": "Спасибо, что рассказали"},
+                {"recipient": "user_2", "type": "share_request", "text": "Как вы видите эту ситуацию?"},
+            ]},
+            "current_agent": "onboarding",
+            "classification": None,
+            "fallback": False,
+        }
+
+    monkeypatch.setattr(mediator_app, "process_message", reply)
+    with TestClient(mediator_app.app) as client:
+        yield client
+    mediator_app.sessions.pop("ws-session", None)
+
+
+def test_partner_pane_gets_its_reply_and_clear(client):
+    with client.websocket_connect("/ws/ws-session/user_2") as ws:
+        r = client.post("/api/chat", json={"session_id": "ws-session", "user_role": "user_1", "message": "Мы поссорились"})
+        assert r.status_code == 200
+        event = loads(ws.receive_text())
+        assert event["type"] == "message" and event["recipient"] == "user_2"
+        assert event["message"]["content"] == "Как вы видите эту ситуацию?"
+        assert event["cursor"] == r.json()["cursor"]
+
+        client.post("/api/clear", json={"session_id": "ws-session"})
+        assert loads(ws.receive_text()) == {"type": "cleared"}
+
+
+def test_unknown_role_is_refused(client):
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/ws/ws-session/admin") as ws:
+            ws.receive_text()
@@ -0,0 +1,76 @@
+import pytest
+
+from src.agents.turn_gate import defer_reason, turn_state
+from src.models.serialization import dumps
+
+
+def user(role, text):
+    return {"role": "user", "content": f"[{role}]: {text}"}
+
+
+def assistant(*messages):
+    return {"role": "assistant", "content": dumps({"messages": [
+        {"recipient": recipient, "type": kind, "text": text} for recipient, kind, text in messages
+    ]})}
+
+
+@pytest.fixture(autouse=True)
+def gate_on(monkeypatch):
+    monkeypatch.delenv("TURN_GATE", raising=False)
+    monkeypatch.delenv("TURN_GATE_MAX_DEFERRED", raising=False)
+
+
+ASKED_BOTH = [
+    user("user_1", "Мы постоянно ссоримся из-за денег"),
+    assistant(
+        ("user_1", "share_request", "Готовы ли вы обсудить бюджет вместе?"),
+        ("user_2", "share_request", "Как вы видите эту ситуацию?"),
+    ),
+]
+
+ANSWERED_SENDER = [
+    user("user_1", "Мы постоянно ссоримся из-за денег"),
+    assistant(
+        ("user_1", "ack", "Спасибо, я передам это партнёру."),
+        ("user_2", "share_request", "Как вы видите эту ситуацию?"),
+    ),
+]
+
+
+@pytest.mark.parametrize("text", ["да", "нет", "ок", "Да, конечно"])
+def test_answer_to_direct_question_reaches_llm(text):
+    assert defer_reason(ASKED_BOTH + [user("user_1", text)]) is None
+
+
+@pytest.mark.parametrize("text", ["ок", "спасибо!", "👍"])
+def test_bare_ack_waits_for_partner(text):
+    assert defer_reason(ANSWERED_SENDER + [user("user_1", text)]) == "awaiting_partner"
+
+
+@pytest.mark.parametrize("text", ["да", "нет", "привет", "конечно", "давай", "А что дальше?"])
+def test_non_ack_reaches_llm(text):
+    assert defer_reason(ANSWERED_SENDER + [user("user_1", text)]) is None
+
+
+def test_question_mark_counts_as_asked():
+    history = [
+        user("user_1", "Привет"),
+        assistant(("user_1", "other", "Что вас беспокоит?"), ("user_2", "share_request", "Как вы?")),
+    ]
+    assert turn_state(history).asked == frozenset({"user_1", "user_2"})
+    assert defer_reason(history + [user("user_1", "ок")]) is None
+
+
+def test_partner_reply_is_never_deferred():
+    assert defer_reason(ANSWERED_SENDER + [user("user_1", "ок"), user("user_2", "ок")]) is None
+
+
+def test_sender_who_keeps_writing_gets_answered(monkeypatch):
+    monkeypatch.setenv("TURN_GATE_MAX_DEFERRED", "2")
+    assert defer_reason(ANSWERED_SENDER + [user("user_1", "ок")] * 2) == "awaiting_partner"
+    assert defer_reason(ANSWERED_SENDER + [user("user_1", "ок")] * 3) is None
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setenv("TURN_GATE", "0")
+    assert defer_reason(ANSWERED_SENDER + [user("user_1", "ок")]) is None
@@ -0,0 +1,57 @@
+"""Light/full model choice per turn (LIGHT_TURN_MODEL)."""
+import pytest
+
+from src.llm.turn_routing import FULL, LIGHT, route_turn
+from src.models.schemas import ConflictClassification
+
+FOUNDATIONAL = ConflictClassification(
+    resolvability="resolvable", domain="household", nature="emotional", form="open",
+    threat_level="foundational", confidence=0.9,
+)
+
+
+def history(*texts):
+    """Alternating user turns ending with the incoming message."""
+    return [{"role": "user", "content": f"[user_{i % 2 + 1}]: {text}"} for i, text in enumerate(texts)]
+
+
+@pytest.fixture(autouse=True)
+def light_model(monkeypatch):
+    monkeypatch.setenv("LIGHT_TURN_MODEL", "gpt-4.1-mini")
+    monkeypatch.setenv("LIGHT_TURN_MAX_CHARS", "80")
+    monkeypatch.setenv("PRECLASSIFIER_MIN_TURNS", "4")
+
+
+@pytest.mark.parametrize("agent, messages, classification, tier, reason", [
+    ("onboarding", history("Ок, спасибо"), None, FULL, "first_turn"),
+    ("onboarding", history("Мы ссоримся из-за денег", "Спасибо!"), None, LIGHT, "ack"),
+    ("therapy", history("Мы ссоримся из-за денег", "👍"), None, LIGHT, "ack"),
+    ("onboarding", history("Мы ссоримся из-за денег", "Мне больно"), None, FULL, "emotional"),
+    ("onboarding", history("Мы ссоримся из-за денег", "Почему?"), None, FULL, "emotional"),
+    ("therapy", history("Мы ссоримся из-за денег", "ок"), FOUNDATIONAL, FULL, "foundational"),
+    ("therapy", history("Мы ссоримся", "Три года вместе"), None, FULL, "therapy"),
+    ("onboarding", history("Мы ссоримся", "Три года вместе"), None, LIGHT, "short_answer"),
+    ("onboarding", history("Мы ссоримся", "А что дальше?"), None, FULL, "default"),
+    ("onboarding", history("Мы ссоримся", "Три года вместе, " * 6), None, FULL, "default"),
+    ("onboarding", history("Мы ссоримся", "Давно", "Из-за денег", "Три года вместе"), None, FULL, "handoff_possible"),
+])
+def test_route(agent, messages, classification, tier, reason):
+    route = route_turn(messages, agent, classification)
+    assert (route.tier, route.reason) == (tier, reason)
+    assert route.model == ("gpt-4.1-mini" if tier == LIGHT else None)
+
+
+def test_foundational_from_stored_dict():
+    route = route_turn(history("Мы ссоримся", "ок"), "therapy", FOUNDATIONAL.model_dump(mode="json"))
+    assert route.reason == "foundational"
+
+
+def test_disabled_without_light_model(monkeypatch):
+    monkeypatch.setenv("LIGHT_TURN_MODEL", "")
+    route = route_turn(history("Мы ссоримся", "ок"), "onboarding")
+    assert (route.tier, route.reason, route.model) == (FULL, "disabled", None)
+
+
+def test_assistant_turns_are_not_user_turns():
+    messages = history("Мы ссоримся") + [{"role": "assistant", "content": "Спасибо"}]
+    assert route_turn(messages, "onboarding").reason == "first_turn"